@@ -1,15 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import json
-import math
 import socket
 import numpy as np
 import mss
 import time
-import cv2
-from PIL import ImageGrab
-from PIL import Image, ImageTk, ImageEnhance
-import platform
 import threading
 
 class AmbilightConfigGUI:
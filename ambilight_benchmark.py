@@ -0,0 +1,960 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from ambilight_config import ZONE_STATISTICS
+from ambilight_engine import AmbilightEngine, build_wled_packets, make_config_snapshot
+from config_watcher import ConfigWatcher
+from frame_ring import FrameRing, edge_strip_depths
+from layout_cache import LayoutCache, layout_key, unpack_samplers
+from quality_control import QUALITY_LEVELS, QualityController
+from wled_transport import BatchedUDPSender, SENDMMSG_AVAILABLE
+
+
+def time_per_call(func, iterations):
+    """Average wall time of func() in microseconds"""
+    func()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def make_config(num_leds, **settings):
+    """Configuration with num_leds spread evenly over the four edges"""
+    per_edge = num_leds // 4
+    config = {
+        'wled_ip': "127.0.0.1", 'wled_port': 21324, 'num_leds': num_leds, 'led_start_offset': 0,
+        'led_segments': [(edge, per_edge, edge, "normal") for edge in ("top", "right", "bottom", "left")],
+    }
+    config.update(settings)
+    return config
+
+
+def make_engine(num_leds, width, height, **settings):
+    """Engine with num_leds spread evenly over the four edges, ready to process frames"""
+    engine = AmbilightEngine(make_config_snapshot(make_config(num_leds, **settings)), (0, 0, width, height))
+    engine.open_targets(send=False)
+    return engine
+
+
+def random_frame(width, height, seed=0):
+    """Read-only BGRA test frame, like the one ScreenCapture returns"""
+    img = np.random.default_rng(seed).integers(0, 256, (height, width, 4), dtype=np.uint8)
+    img.flags.writeable = False
+    return img
+
+
+def bench_capture(iterations=50):
+    """Cost of copying an mss shot into a new array vs wrapping its buffer"""
+    print("\n== Capture buffer handoff ==")
+    print(f"{'region':<12}{'MB':>8}{'np.array copy us':>20}{'wrap us':>10}")
+    for width, height in ((1920, 1080), (3840, 2160)):
+        raw = bytearray(np.random.default_rng(0).integers(0, 256, width * height * 4, dtype=np.uint8).tobytes())
+        copy_us = time_per_call(
+            lambda: np.array(np.frombuffer(raw, dtype=np.uint8).reshape(height, width, 4)), iterations)
+        wrap_us = time_per_call(
+            lambda: np.ndarray((height, width, 4), dtype=np.uint8, buffer=raw, strides=(width * 4, 4, 1)),
+            iterations)
+        print(f"{f'{width}x{height}':<12}{len(raw) / 1e6:>8.1f}{copy_us:>20.1f}{wrap_us:>10.1f}")
+
+
+def bench_sampling(iterations=30):
+    """Sampling and full per-frame processing time for common layouts"""
+    print("\n== Sampling / processing ==")
+    print(f"{'case':<24}{'sample ms':>12}{'process ms':>12}")
+    for num_leds, (width, height) in ((240, (1920, 1080)), (240, (3840, 2160)), (1000, (3840, 2160))):
+        engine = make_engine(num_leds, width, height)
+        img = random_frame(width, height)
+        target = engine.config_snapshot['targets'][0]
+        sample_us = time_per_call(lambda: engine.get_led_colors_from_screen(img, target), iterations)
+        process_us = time_per_call(lambda: engine.process_frame(img), iterations)
+        name = f"{num_leds} LEDs {width}x{height}"
+        print(f"{name:<24}{sample_us / 1000:>12.2f}{process_us / 1000:>12.2f}")
+
+
+def bench_send(iterations=2000):
+    """Send-stage time and syscalls per frame: sendto loop vs sendmmsg"""
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    sink.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    address = sink.getsockname()
+
+    cases = [
+        ("drgb 240 LEDs, 1 target", "drgb", 240, 1),
+        ("dnrgb 1000 LEDs, 1 target", "dnrgb", 1000, 1),
+        ("ddp 4000 LEDs, 1 target", "ddp", 4000, 1),
+        ("dnrgb 600 LEDs, 3 targets", "dnrgb", 600, 3),
+    ]
+
+    print(f"\n== Send stage (sendmmsg available: {SENDMMSG_AVAILABLE}) ==")
+    print(f"{'case':<28}{'mode':<10}{'us/frame':>10}{'syscalls/frame':>16}")
+    for name, protocol, num_leds, num_targets in cases:
+        colors = np.random.randint(0, 256, (num_leds, 3), dtype=np.uint8)
+        datagrams = []
+        for _ in range(num_targets):
+            datagrams.extend((packet, address) for packet in build_wled_packets(protocol, colors))
+
+        modes = [("sendto", False)]
+        if SENDMMSG_AVAILABLE:
+            modes.append(("sendmmsg", True))
+        for mode, use_sendmmsg in modes:
+            sender = BatchedUDPSender(use_sendmmsg=use_sendmmsg)
+            us = time_per_call(lambda: sender.send(datagrams), iterations)
+            syscalls = sender.syscalls / (iterations + 1)
+            sender.close()
+            print(f"{name:<28}{mode:<10}{us:>10.1f}{syscalls:>16.1f}")
+
+            # Drain so the receive buffer does not start dropping
+            sink.setblocking(False)
+            try:
+                while True:
+                    sink.recv(65536)
+            except BlockingIOError:
+                pass
+
+    sink.close()
+
+
+def simulate_gui_load(stop_event, busy_ms=40, idle_ms=10):
+    """Hold the GIL with pure-Python work in bursts, like Tk handlers during a window drag"""
+    while not stop_event.is_set():
+        end = time.perf_counter() + busy_ms / 1000
+        while time.perf_counter() < end:
+            sum(i * i for i in range(1000))
+        time.sleep(idle_ms / 1000)
+
+
+def bench_gui_jitter(duration=4.0):
+    """Frame-time jitter with the engine in a GUI-side thread vs its own process, idle and under GUI load"""
+    from engine_process import EngineProcess
+    from wled_receiver_sim import SyntheticFrameSource
+
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    per_edge = 60
+    config = {
+        'wled_ip': "127.0.0.1", 'wled_port': sink.getsockname()[1], 'num_leds': 240, 'led_start_offset': 0,
+        'led_segments': [(edge, per_edge, edge, "normal") for edge in ("top", "right", "bottom", "left")],
+    }
+
+    print("\n== Frame timing with GUI load ==")
+    print(f"{'engine':<10}{'load':<8}{'fps':>8}{'interval ms':>13}{'jitter ms':>11}{'max ms':>9}")
+    for mode in ("thread", "process"):
+        for loaded in (False, True):
+            source = SyntheticFrameSource()
+            snapshot = make_config_snapshot(config)
+            if mode == "thread":
+                engine = AmbilightEngine(snapshot, (0, 0, source.width, source.height))
+                engine.frame_source = source
+            else:
+                engine = EngineProcess(snapshot, (0, 0, source.width, source.height), frame_source=source)
+            engine.start()
+            time.sleep(1.0)  # process start-up and first frames
+
+            stop_event = threading.Event()
+            load = threading.Thread(target=simulate_gui_load, args=(stop_event,), daemon=True)
+            if loaded:
+                load.start()
+            time.sleep(duration)
+            # The process engine answers a stats request on its next command poll
+            engine.get_stats()
+            time.sleep(0.2)
+            stats = engine.get_stats()
+            stop_event.set()
+            if loaded:
+                load.join()
+            engine.stop(timeout=2)
+
+            print(f"{mode:<10}{'gui' if loaded else 'idle':<8}{stats.get('fps', 0):>8.1f}"
+                  f"{stats.get('interval_ms', 0):>13.2f}{stats.get('jitter_ms', 0):>11.2f}"
+                  f"{stats.get('max_interval_ms', 0):>9.1f}")
+    sink.close()
+
+
+def ring_reader(ring_args, frames, conn):
+    """Read frames from a FrameRing in another process and report each handoff latency"""
+    frame_shape, edge_depths, name = ring_args
+    ring = FrameRing(frame_shape, edge_depths=edge_depths, name=name)
+    latencies = []
+    sequence = 0
+    conn.send("ready")
+    while len(latencies) < frames:
+        latest = ring.wait_latest(sequence, timeout=1.0)
+        if latest is None:
+            break
+        sequence, timestamp, _ = latest
+        latencies.append(time.perf_counter() - timestamp)
+    conn.send(latencies)
+    ring.close()
+
+
+def queue_reader(queue, frames, conn):
+    """Receive frames through a multiprocessing queue and report each handoff latency"""
+    latencies = []
+    conn.send("ready")
+    for _ in range(frames):
+        timestamp, frame = queue.get()
+        latencies.append(time.perf_counter() - timestamp)
+    conn.send(latencies)
+
+
+def write_to_ring(ring, img):
+    """Copy img into the ring's next slot, stamping it when the copy is complete"""
+    frame = ring.begin_write()
+    if ring.edge_depths is None:
+        np.copyto(frame, img)
+    else:
+        frame.copy_from(img)
+    ring.commit(time.perf_counter())
+
+
+def bench_handoff(frames=150, interval=1.0 / 30):
+    """Capture-to-processing frame handoff latency: frame ring vs pickling through a queue"""
+    context = multiprocessing.get_context("spawn")
+    width, height = 1920, 1080
+    img = random_frame(width, height)
+    depths = edge_strip_depths(10, height, width)
+
+    print("\n== Frame handoff (1920x1080 BGRA) ==")
+    print(f"{'channel':<30}{'MB':>7}{'write us':>10}{'latency us p50':>16}{'p99':>9}")
+
+    def report(name, megabytes, write_times, latencies):
+        write_us = np.mean(write_times) * 1e6 if write_times else 0.0
+        latencies = np.array(latencies) * 1e6
+        print(f"{name:<30}{megabytes:>7.2f}{write_us:>10.0f}"
+              f"{np.percentile(latencies, 50):>16.0f}{np.percentile(latencies, 99):>9.0f}")
+
+    for layout, edge_depths in (("full", None), ("edges", depths)):
+        # Same process, capture thread to worker thread
+        ring = FrameRing(img.shape, edge_depths=edge_depths, event=threading.Event())
+        latencies = []
+
+        def reader():
+            sequence = 0
+            while len(latencies) < frames:
+                latest = ring.wait_latest(sequence, timeout=1.0)
+                if latest is None:
+                    break
+                sequence, timestamp, _ = latest
+                latencies.append(time.perf_counter() - timestamp)
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        write_times = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            write_to_ring(ring, img)
+            write_times.append(time.perf_counter() - start)
+            time.sleep(interval)
+        thread.join()
+        report(f"ring {layout}, thread", ring.slot_bytes / 1e6, write_times, latencies)
+
+        # Across processes; the reader polls shared memory
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=ring_reader,
+                                  args=((img.shape, edge_depths, ring.name), frames, child_conn))
+        process.start()
+        parent_conn.recv()
+        write_times = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            write_to_ring(ring, img)
+            write_times.append(time.perf_counter() - start)
+            time.sleep(interval)
+        latencies = parent_conn.recv()
+        process.join()
+        report(f"ring {layout}, process", ring.slot_bytes / 1e6, write_times, latencies)
+        ring.close()
+
+    # Baseline: pickle the full frame through a queue
+    queue = context.Queue(maxsize=4)
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=queue_reader, args=(queue, frames, child_conn))
+    process.start()
+    parent_conn.recv()
+    write_times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        queue.put((time.perf_counter(), np.array(img)))
+        write_times.append(time.perf_counter() - start)
+        time.sleep(interval)
+    latencies = parent_conn.recv()
+    process.join()
+    report("queue full, process", img.nbytes / 1e6, write_times, latencies)
+
+    # A frame the capture thread lapped is dropped after processing; it must not leave a trace
+    import fused_kernel
+    modes = ("float", "numba") if fused_kernel.NUMBA_AVAILABLE else ("float",)
+    frames = [random_frame(640, 360, seed) for seed in range(4)]
+    restored = True
+    for mode in modes:
+        outputs = []
+        for dropped in (False, True):
+            engine = make_engine(240, 640, 360, sampling_mode=mode, adaptive_smoothing=True, scene_cut_percent=100)
+            for i in (0, 1):
+                engine.process_frame(frames[i], 1.0 + i / 30)
+            if dropped:
+                saved = engine.save_smoothing_state()
+                engine.process_frame(frames[3], 1.0 + 2 / 30)
+                engine.restore_smoothing_state(saved)
+            outputs.append(np.asarray(engine.process_frame(frames[2], 1.0 + 2 / 30)[0], dtype=int))
+        restored = restored and np.array_equal(*outputs)
+    check("a dropped frame leaves the smoothing state as it was", restored)
+
+
+# Child programs for the startup benchmark; each prints "ready" (or a reason it cannot run)
+STARTUP_WINDOW = """
+import tkinter as tk
+from ambilight_config_gui import AmbilightConfigGUI
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print("no display", flush=True)
+    raise SystemExit
+app = AmbilightConfigGUI(root)
+root.update()
+print("ready", flush=True)
+root.destroy()
+"""
+
+STARTUP_PACKET = """
+import sys, time
+from ambilight_engine import AmbilightEngine, make_config_snapshot
+from wled_receiver_sim import SyntheticFrameSource
+port = int(sys.argv[1])
+segments = [(edge, 60, edge, "normal") for edge in ("top", "right", "bottom", "left")]
+config = {'wled_ip': "127.0.0.1", 'wled_port': port, 'num_leds': 240, 'led_start_offset': 0, 'led_segments': segments}
+source = SyntheticFrameSource()
+engine = AmbilightEngine(make_config_snapshot(config), (0, 0, source.width, source.height))
+engine.frame_source = source
+engine.start()
+print("ready", flush=True)
+time.sleep(2)
+"""
+
+
+def time_child(code, args=(), until_packet=None, timeout=20):
+    """Milliseconds from launching a Python child until it prints ready (or a packet arrives)"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", code, *args], stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        line = process.stdout.readline().strip()
+        if line != "ready":
+            return None, line or "failed"
+        if until_packet is None:
+            return (time.perf_counter() - start) * 1000, None
+        until_packet.settimeout(timeout)
+        until_packet.recv(65536)
+        return (time.perf_counter() - start) * 1000, None
+    except socket.timeout:
+        return None, "no packet"
+    finally:
+        process.kill()
+        process.wait()
+
+
+def bench_startup(runs=5):
+    """Launch-to-window and launch-to-first-packet times of fresh Python processes"""
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    cases = [
+        ("import GUI module", "import ambilight_config_gui\nprint('ready', flush=True)", (), None),
+        ("launch to window", STARTUP_WINDOW, (), None),
+        ("launch to first packet", STARTUP_PACKET, (str(sink.getsockname()[1]),), sink),
+    ]
+
+    print("\n== Startup (median of fresh processes) ==")
+    print(f"{'case':<26}{'ms':>8}")
+    for name, code, args, until_packet in cases:
+        times = []
+        reason = None
+        for _ in range(runs):
+            elapsed, reason = time_child(code, args, until_packet)
+            if elapsed is None:
+                break
+            times.append(elapsed)
+            # Drain packets from the previous run
+            sink.setblocking(False)
+            try:
+                while True:
+                    sink.recv(65536)
+            except BlockingIOError:
+                pass
+            sink.setblocking(True)
+        if times:
+            print(f"{name:<26}{np.median(times):>8.0f}")
+        else:
+            print(f"{name:<26}{'-':>8}  ({reason})")
+    sink.close()
+
+
+# Names of the checks that failed in this run; any failure makes the run exit non-zero
+failed_checks = []
+
+
+def check(name, passed):
+    """Print a PASS/FAIL line for one correctness check and record failures"""
+    print(f"  {'PASS' if passed else 'FAIL'}  {name}")
+    if not passed:
+        failed_checks.append(name)
+    return passed
+
+
+def bench_layout_cache(iterations=20):
+    """Compile vs cached-load time of sampling layouts, and cache invalidation checks"""
+    directory = tempfile.mkdtemp(prefix="ambilight-layouts-")
+    try:
+        # Plain layouts compile faster than they load; layouts with excluded areas are where the cache pays
+        print("\n== Layout cache (memory-mapped load vs np.load) ==")
+        print(f"{'case':<32}{'compile ms':>12}{'load ms':>10}{'np.load ms':>12}{'file KB':>9}")
+        taskbar_and_overlay = ((0, 2000, 3840, 160), (100, 0, 300, 2160))
+        cases = [
+            ("1000 LEDs 4K", 1000, (3840, 2160), ()),
+            ("4000 LEDs 4K", 4000, (3840, 2160), ()),
+            ("4000 LEDs 4K, 2 exclusions", 4000, (3840, 2160), taskbar_and_overlay),
+        ]
+        for name, num_leds, (width, height), exclusions in cases:
+            engine = make_engine(num_leds, width, height, exclusion_rects=exclusions)
+            target = engine.config_snapshot['targets'][0]
+            depth = engine.config_snapshot['color_depth_percent']
+            cache = LayoutCache(directory)
+            key = layout_key(target, height, width, depth, exclusions=exclusions)
+
+            def compile_all():
+                return [engine.compile_edge_sampler(edge, count, height, width)
+                        for edge, count, _, _ in target['led_segments']]
+
+            def np_load():
+                with np.load(cache.path(key)) as arrays:
+                    return unpack_samplers({field: arrays[field] for field in arrays.files})
+
+            cache.store(key, compile_all())
+            compile_ms = time_per_call(compile_all, iterations) / 1000
+            load_ms = time_per_call(lambda: cache.load(key), iterations) / 1000
+            np_load_ms = time_per_call(np_load, iterations) / 1000
+            size_kb = os.path.getsize(cache.path(key)) / 1024
+            print(f"{name:<32}{compile_ms:>12.2f}{load_ms:>10.2f}{np_load_ms:>12.2f}{size_kb:>9.0f}")
+            if exclusions:
+                check("cached layout with exclusions loads faster than it compiles", load_ms < compile_ms)
+
+        print("Invalidation:")
+        width, height = 1920, 1080
+        engine = make_engine(240, width, height)
+        snapshot = engine.config_snapshot
+        target = snapshot['targets'][0]
+        depth = snapshot['color_depth_percent']
+        key = layout_key(target, height, width, depth)
+        changed_segments = dict(target, led_segments=[(edge, count + 1, name, direction)
+                                                      for edge, count, name, direction in target['led_segments']])
+        check("changed segments give a new key", layout_key(changed_segments, height, width, depth) != key)
+        check("changed offset gives a new key",
+              layout_key(dict(target, led_start_offset=5), height, width, depth) != key)
+        check("changed depth gives a new key", layout_key(target, height, width, depth + 1) != key)
+        check("changed resolution gives a new key", layout_key(target, 1440, 2560, depth) != key)
+        check("content rect gives a new key", layout_key(target, height, width, depth, (0, 140, 1920, 940)) != key)
+        check("changed stride gives a new key", layout_key(target, height, width, depth, stride=2) != key)
+        check("exclusion rects give a new key",
+              layout_key(target, height, width, depth, exclusions=((0, 1000, 1920, 80),)) != key)
+        check("changed exclusion rects give a new key",
+              layout_key(target, height, width, depth, exclusions=((0, 1000, 1920, 80),))
+              != layout_key(target, height, width, depth, exclusions=((0, 1000, 1920, 40),)))
+        check("same layout gives the same key", layout_key(dict(target), height, width, depth) == key)
+
+        # Engine round trip: a second engine loads what the first one compiled
+        img = random_frame(width, height)
+        snapshot['layout_cache_mb'] = 64
+        cold = AmbilightEngine(snapshot, (0, 0, width, height))
+        cold.layout_cache = LayoutCache(directory)
+        cold_colors = cold.get_led_colors_from_screen(img, target)
+        warm = AmbilightEngine(snapshot, (0, 0, width, height))
+        warm.layout_cache = LayoutCache(directory)
+        warm_colors = warm.get_led_colors_from_screen(img, target)
+        check("first engine misses, second hits", cold.layout_cache.misses == 1 and warm.layout_cache.hits == 1)
+        check("cached layout gives identical colors", warm_colors == cold_colors)
+
+        cache = LayoutCache(directory)
+        with open(cache.path(key), 'wb') as f:
+            f.write(b"not a layout")
+        check("corrupt file is a miss and is removed",
+              cache.load(key) is None and not os.path.exists(cache.path(key)))
+
+        small = LayoutCache(os.path.join(directory, "small"), max_bytes=1)
+        samplers = [engine.compile_edge_sampler(edge, count, height, width)
+                    for edge, count, _, _ in target['led_segments']]
+        small.store(key, samplers)
+        check("eviction keeps the cache within max_bytes", sum(size for _, size, _ in small.entries()) <= 1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class StaticFrameSource:
+    """frame_source that returns the same test frame on every grab()"""
+
+    def __init__(self, img):
+        self.img = img
+
+    def grab(self):
+        return self.img
+
+
+def write_config(path, config):
+    """Replace path atomically, like a configuration deployment tool"""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(config, f)
+    os.replace(temp_path, path)
+
+
+def bench_hot_reload(reloads=5):
+    """Configuration reload: change detection latency, swap cost, and the send gap while streaming"""
+    directory = tempfile.mkdtemp(prefix="ambilight-config-")
+    path = os.path.join(directory, "ambilight.json")
+    try:
+        print("\n== Configuration hot reload ==")
+        for use_inotify in (True, False):
+            changed = threading.Event()
+            write_config(path, make_config(240))
+            watcher = ConfigWatcher(path, lambda config: changed.set(), poll_interval=0.1, use_inotify=use_inotify)
+            watcher.start()
+            time.sleep(0.2)
+            latencies = []
+            for i in range(reloads):
+                changed.clear()
+                start = time.perf_counter()
+                write_config(path, make_config(240, brightness_percent=50 + i))
+                if changed.wait(2):
+                    latencies.append((time.perf_counter() - start) * 1000)
+            watcher.stop()
+            detected = f"{np.median(latencies):.0f} ms" if latencies else "-"
+            print(f"{watcher.mode:<9} change detected after {detected} ({len(latencies)}/{reloads} changes seen)")
+
+        # Swap cost between two frames; only the changed segment is compiled again
+        width, height = 3840, 2160
+        img = random_frame(width, height)
+        engine = make_engine(1000, width, height)
+        engine.process_frame(img)
+        before = dict(engine.edge_samplers)
+        config = make_config(1000, brightness_percent=40)
+        config['led_segments'][0] = ("top", 260, "top", "normal")
+        engine.reload_config(make_config_snapshot(config))
+        start = time.perf_counter()
+        engine.apply_pending_config()
+        swap_ms = (time.perf_counter() - start) * 1000
+        kept = sum(1 for key, sampler in engine.edge_samplers.items() if before.get(key) is sampler)
+        print(f"swap after a layout change: {swap_ms:.2f} ms (1000 LEDs, 4K), "
+              f"{kept} of {len(engine.edge_samplers)} samplers kept")
+
+        # Streaming engine: the gap between packets around a reload stays one frame interval
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.bind(("127.0.0.1", 0))
+        sink.settimeout(1.0)
+        config = make_config(240, wled_port=sink.getsockname()[1])
+        engine = AmbilightEngine(make_config_snapshot(config), (0, 0, 1920, 1080))
+        engine.frame_source = StaticFrameSource(random_frame(1920, 1080))
+        engine.start()
+        arrivals = []
+        reload_times = []
+        deadline = time.perf_counter() + 3.0
+        next_reload = time.perf_counter() + 0.5
+        try:
+            while time.perf_counter() < deadline:
+                if time.perf_counter() >= next_reload:
+                    config['led_segments'][0] = ("top", 60 + len(reload_times) % 2, "top", "normal")
+                    config['brightness_percent'] = 60 + len(reload_times)
+                    engine.reload_config(make_config_snapshot(config))
+                    reload_times.append(time.perf_counter())
+                    next_reload += 0.5
+                try:
+                    sink.recv(65536)
+                    arrivals.append(time.perf_counter())
+                except socket.timeout:
+                    break
+        finally:
+            engine.stop()
+            sink.close()
+        gaps = np.diff(arrivals) * 1000
+        if len(gaps):
+            # First packet gap after each reload, against all gaps of the run
+            arrivals = np.array(arrivals)
+            after_reload = [gaps[i - 1] for i in np.searchsorted(arrivals, reload_times) if 0 < i < len(arrivals)]
+            print(f"\nstreaming through {len(reload_times)} reloads: packet gap median {np.median(gaps):.1f} ms, "
+                  f"max {gaps.max():.1f} ms; first gap after a reload max {max(after_reload, default=0):.1f} ms")
+        else:
+            print("streaming: no packets received")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_fixed_point(iterations=20):
+    """Float vs fixed-point edge sampling: time per frame and agreement within 1 level"""
+    print("\n== Fixed-point sampling ==")
+    print(f"{'case':<24}{'float ms':>10}{'fixed ms':>10}{'max diff':>10}")
+    results = []
+    for num_leds, (width, height) in ((240, (1920, 1080)), (1000, (3840, 2160)), (400, (7680, 4320))):
+        # Neutral effects, so the output is the sampled zone color itself
+        engine = make_engine(num_leds, width, height, brightness_percent=100, color_intensity_percent=100)
+        target = engine.config_snapshot['targets'][0]
+        times = {}
+        colors = {}
+        for mode in ("float", "fixed"):
+            engine.config_snapshot['sampling_mode'] = mode
+            img = random_frame(width, height)
+            times[mode] = time_per_call(lambda: engine.get_led_colors_from_screen(img, target), iterations)
+            colors[mode] = [np.array(engine.get_led_colors_from_screen(random_frame(width, height, seed), target))
+                            for seed in range(3)]
+        max_diff = max(np.abs(a - b).max() for a, b in zip(colors['float'], colors['fixed']))
+        results.append(max_diff)
+        name = f"{num_leds} LEDs {width}x{height}"
+        print(f"{name:<24}{times['float'] / 1000:>10.2f}{times['fixed'] / 1000:>10.2f}{max_diff:>10}")
+
+    engine = make_engine(400, 7680, 4320, brightness_percent=100, color_intensity_percent=100, sampling_mode="fixed")
+    target = engine.config_snapshot['targets'][0]
+    flat_ok = True
+    for level in (0, 1, 128, 254, 255):
+        img = np.full((4320, 7680, 4), level, dtype=np.uint8)
+        flat_ok &= bool(np.all(np.array(engine.get_led_colors_from_screen(img, target)) == level))
+    check("fixed point within 1 level of float", max(results) <= 1)
+    check("flat colors sample back exactly (no overflow at 8K)", flat_ok)
+
+
+def bench_fused(iterations=20):
+    """Per-frame processing with the numpy paths vs the compiled Numba kernels"""
+    import fused_kernel
+    print("\n== Fused Numba kernel (process_frame: sample + enhance + smooth) ==")
+    if not fused_kernel.NUMBA_AVAILABLE:
+        print("Numba is not installed; skipped")
+        return
+    print(f"{'case':<26}{'float ms':>10}{'fixed ms':>10}{'numba ms':>10}{'speedup':>9}")
+    max_diff = 0
+    for num_leds, (width, height) in ((240, (1920, 1080)), (240, (3840, 2160)),
+                                      (4000, (1920, 1080)), (4000, (3840, 2160))):
+        times = {}
+        outputs = {}
+        for mode in ("float", "fixed", "numba"):
+            engine = make_engine(num_leds, width, height, sampling_mode=mode, adaptive_smoothing=True)
+            frames = [random_frame(width, height, seed) for seed in range(3)]
+            outputs[mode] = [np.asarray(engine.process_frame(img, 1.0 + i / 30)[0], dtype=int)
+                             for i, img in enumerate(frames)]
+            times[mode] = time_per_call(lambda: engine.process_frame(frames[0]), iterations)
+        max_diff = max(max_diff, max(np.abs(a - b).max() for a, b in zip(outputs['float'], outputs['numba'])))
+        name = f"{num_leds} LEDs {width}x{height}"
+        print(f"{name:<26}{times['float'] / 1000:>10.2f}{times['fixed'] / 1000:>10.2f}"
+              f"{times['numba'] / 1000:>10.2f}{times['float'] / times['numba']:>8.1f}x")
+    check("numba output within 1 level of the numpy reference", max_diff <= 1)
+
+
+def bench_parallel(iterations=10):
+    """Sequential vs thread-pool segment sampling on large captures"""
+    import fused_kernel
+    modes = ["float", "fixed"] + (["numba"] if fused_kernel.NUMBA_AVAILABLE else [])
+    print(f"\n== Parallel edge sampling ({os.cpu_count()} CPUs; process_frame ms) ==")
+    print(f"{'case':<26}" + "".join(f"{mode + ' ' + str(threads) + 't':>12}" for mode in modes for threads in (0, 4)))
+    identical = True
+    for num_leds, (width, height) in ((1000, (3840, 2160)), (1000, (7680, 4320))):
+        img = random_frame(width, height)
+        row = ""
+        for mode in modes:
+            outputs = []
+            for threads in (0, 4):
+                engine = make_engine(num_leds, width, height, sampling_mode=mode, sampling_threads=threads)
+                outputs.append(np.asarray(engine.process_frame(img, 1.0)[0], dtype=int))
+                row += f"{time_per_call(lambda: engine.process_frame(img), iterations) / 1000:>12.2f}"
+                engine.close_sampling_pool()
+            identical &= bool(np.array_equal(outputs[0], outputs[1]))
+        print(f"{f'{num_leds} LEDs {width}x{height}':<26}{row}")
+    check("parallel sampling gives the same colors as sequential", identical)
+
+    # A second target on the same segments (mirrored) reuses the first target's sampling pass
+    width, height = 1920, 1080
+    img = random_frame(width, height)
+    single = {}
+    for mode in modes:
+        for threads in (0, 4):
+            settings = dict(sampling_mode=mode, sampling_threads=threads, smoothness_percent=0)
+            engine = make_engine(240, width, height, **settings)
+            mirrored = make_engine(240, width, height, targets=[{
+                'wled_ip': "127.0.0.1", 'num_leds': 240,
+                'led_segments': [(edge, count, name, "reversed") for edge, count, name, _ in
+                                 engine.config_snapshot['targets'][0]['led_segments']]}], **settings)
+            segments = len(mirrored.config_snapshot['targets'][0]['led_segments'])
+            # Count segment samplings; the kernels are compiled (and warmed up) before counting starts
+            mirrored.get_fused_kernels()
+            calls = []
+            sample_zones = mirrored.sample_zones
+            mirrored.sample_zones = lambda *args: calls.append(1) or sample_zones(*args)
+            if fused_kernel.NUMBA_AVAILABLE:
+                kernel = fused_kernel.sample_segment
+                fused_kernel.sample_segment = lambda *args: calls.append(1) or kernel(*args)
+            try:
+                first, second = [np.asarray(colors, dtype=int) for colors in mirrored.process_frame(img, 1.0)]
+            finally:
+                if fused_kernel.NUMBA_AVAILABLE:
+                    fused_kernel.sample_segment = kernel
+            reference = np.asarray(engine.process_frame(img, 1.0)[0], dtype=int)
+            # Each segment of the second target runs the other way
+            mirrored_reference = np.concatenate([block[::-1] for block in np.split(reference, segments)])
+            single[(mode, threads)] = (len(calls) == segments, np.array_equal(first, reference),
+                                       np.array_equal(second, mirrored_reference))
+            engine.close_sampling_pool()
+            mirrored.close_sampling_pool()
+    check("targets sharing segments sample them once per frame", all(once for once, _, _ in single.values()))
+    check("shared segments give every target the same colors",
+          all(same_first and same_second for _, same_first, same_second in single.values()))
+
+
+def gradient_frame(width, height):
+    """Read-only BGRA frame with smooth color ramps, so reduced sampling is comparable to full sampling"""
+    y, x = np.mgrid[0:height, 0:width]
+    img = np.stack([x * 255 // (width - 1), y * 255 // (height - 1), (x + y) * 255 // (width + height - 2),
+                    np.full_like(x, 255)], axis=-1).astype(np.uint8)
+    img.flags.writeable = False
+    return img
+
+
+def bench_qos(iterations=10):
+    """Frame cost at each quality level, and the controller stepping down under load and back up"""
+    print("\n== Quality levels (1000 LEDs, 3840x2160; process_frame ms) ==")
+    print(f"{'level':<8}{'settings':<84}{'ms':>8}{'max diff':>10}")
+    width, height = 3840, 2160
+    img = gradient_frame(width, height)
+    reference = None
+    for level, settings in enumerate(QUALITY_LEVELS):
+        engine = make_engine(1000, width, height, brightness_percent=100, color_intensity_percent=100,
+                             smoothness_percent=0)
+        engine.set_quality(settings)
+        colors = np.asarray(engine.process_frame(img, 1.0)[0], dtype=int)
+        if reference is None:
+            reference = colors
+        ms = time_per_call(lambda: engine.process_frame(img), iterations) / 1000
+        print(f"{level:<8}{str(settings):<84}{ms:>8.2f}{np.abs(colors - reference).max():>10}")
+
+    print("\n== QoS controller (simulated 30 Hz load) ==")
+    # Simulated busy time per frame at each level while overloaded, as a fraction of the budget
+    overload = [1.6, 1.1, 0.8, 0.45, 0.3]
+    budget = 1.0 / 30
+    controller = QualityController()
+    now = 0.0
+    levels = []
+    for phase, duration in (("overload", 10.0), ("idle", 40.0)):
+        end = now + duration
+        while now < end:
+            load = overload[controller.level] if phase == "overload" else 0.2
+            controller.record(load * budget, budget, now)
+            levels.append(controller.level)
+            now += budget
+        if phase == "overload":
+            worst = max(levels)
+            settled = controller.level
+    for when, old_level, new_level, load in controller.log:
+        print(f"  t={when:5.1f} s  level {old_level} -> {new_level}  (load {load:.0%})")
+    stats = controller.get_stats(now)
+    # The log itself is printed above
+    print(f"  { {key: value for key, value in stats.items() if key != 'quality_log'} }")
+    check("controller steps down until the load fits the frame budget", settled == 2 and worst == 2)
+    check("controller returns to full quality once the load drops", controller.level == 0)
+
+    engine = make_engine(1000, width, height, quality_control=True)
+    for _ in range(30):
+        engine.update_quality(2 * engine.frame_interval())
+    stats = engine.get_stats()
+    degraded = engine.quality == QUALITY_LEVELS[1] and stats.get('quality_level') == 1
+    check("engine reports the level change in its statistics",
+          [change[1:3] for change in stats.get('quality_log', [])] == [(0, 1)])
+    frames = engine.process_frame(img, 1.0)
+    check("engine applies the reduced level and keeps producing frames", degraded and len(frames[0]) == 1000)
+
+    # Level and depth changes must not pile up samplers of earlier parameters
+    for depth in (10, 20, 30):
+        engine.config_snapshot['color_depth_percent'] = depth
+        for settings in QUALITY_LEVELS[:3]:
+            engine.set_quality(settings)
+            engine.process_frame(img)
+    check("sampler cache holds only the current layout after level and depth changes", len(engine.edge_samplers) == 4)
+
+
+def subtitle_frame(width, height, background=(90, 40, 20), text=(255, 255, 255)):
+    """Read-only BGRA frame of one background color with a line of white "letters" in the bottom strip"""
+    img = np.empty((height, width, 4), dtype=np.uint8)
+    img[:, :, :3] = background
+    img[:, :, 3] = 255
+    # Letters 12 px wide with 6 px gaps, a fifth of the strip deep, over the middle of the width
+    strip = height // 10
+    rows = slice(height - strip * 7 // 10, height - strip // 2)
+    letters = (np.arange(width) % 18 < 12) & (np.arange(width) >= width // 5) & (np.arange(width) < width * 4 // 5)
+    img[rows, letters, :3] = text
+    img.flags.writeable = False
+    return img
+
+
+def bench_zone_statistics(iterations=20):
+    """Per-frame cost of each zone statistic, and how far small bright details pull the zone color"""
+    print("\n== Zone statistics (sampling ms per frame; bottom zone error under a line of subtitles) ==")
+    print(f"{'statistic':<14}{'240 @1080p':>12}{'1000 @1080p':>13}{'1000 @4K':>10}{'text error':>12}")
+    background = (90, 40, 20)
+    errors = {}
+    flat_ok = True
+    for statistic in ZONE_STATISTICS:
+        row = ""
+        for num_leds, (width, height) in ((240, (1920, 1080)), (1000, (1920, 1080)), (1000, (3840, 2160))):
+            engine = make_engine(num_leds, width, height, zone_statistic=statistic)
+            img = random_frame(width, height)
+            samplers = [engine.get_sampler(edge, count, height, width)
+                        for edge, count, _, _ in engine.config_snapshot['targets'][0]['led_segments']]
+
+            def sample_frame():
+                for sampler in samplers:
+                    engine.sample_zones(img, sampler)
+
+            column = 12 if num_leds == 240 else 13 if width == 1920 else 10
+            row += f"{time_per_call(sample_frame, iterations) / 1000:>{column}.2f}"
+
+        # Neutral effects and no smoothing, so the output is the zone statistic itself
+        engine = make_engine(240, 1920, 1080, zone_statistic=statistic, brightness_percent=100,
+                             color_intensity_percent=100, smoothness_percent=0)
+        target = engine.config_snapshot['targets'][0]
+        bottom = [i for i, (edge, _, _, _) in enumerate(target['led_segments']) if edge == "bottom"][0]
+        colors = np.array(engine.get_led_colors_from_screen(subtitle_frame(1920, 1080), target))
+        bottom_colors = colors[bottom * 60:(bottom + 1) * 60]
+        errors[statistic] = float(np.abs(bottom_colors - background).max(axis=1).mean())
+        flat = np.full((1080, 1920, 4), 173, dtype=np.uint8)
+        if statistic != "mean":
+            flat_ok &= bool(np.all(np.array(engine.get_led_colors_from_screen(flat, target)) == 173))
+        print(f"{statistic:<14}{row}{errors[statistic]:>12.1f}")
+    check("robust statistics sample a flat color back exactly", flat_ok)
+    check("robust statistics stay closer to the background than the mean",
+          all(errors[statistic] < errors['mean'] / 2 for statistic in ZONE_STATISTICS if statistic != "mean"))
+
+
+def bench_exclusions(iterations=20):
+    """Sampling cost with exclusion rectangles folded into the weights, and that excluded pixels are ignored"""
+    print("\n== Exclusion rectangles (taskbar + corner overlay; process_frame ms) ==")
+    print(f"{'case':<26}{'none':>8}{'excluded':>10}")
+    for num_leds, (width, height) in ((240, (1920, 1080)), (1000, (3840, 2160))):
+        rects = [(0, height * 24 // 25, width, height // 25), (width * 7 // 8, 0, width // 8, height // 5)]
+        img = random_frame(width, height)
+        times = []
+        for exclusions in ([], rects):
+            engine = make_engine(num_leds, width, height, exclusion_rects=exclusions)
+            times.append(time_per_call(lambda: engine.process_frame(img), iterations) / 1000)
+        print(f"{f'{num_leds} LEDs {width}x{height}':<26}{times[0]:>8.2f}{times[1]:>10.2f}")
+
+    # Painting over the excluded areas must not change any LED in any sampling path
+    width, height = 1920, 1080
+    rects = [(0, 1040, width, 40), (1700, 0, 220, 200)]
+    plain = gradient_frame(width, height)
+    covered = plain.copy()
+    covered[1040:, :, :3] = 255
+    covered[:200, 1700:, :3] = (0, 0, 255)
+    ignored = True
+    for settings in ({}, {'sampling_mode': "fixed"}, {'sampling_mode': "numba"}, {'sampling_threads': 3},
+                     {'zone_statistic': "trimmed_mean"}, {'zone_statistic': "median"}, {'zone_statistic': "dominant"}):
+        outputs = []
+        for img in (plain, covered):
+            engine = make_engine(240, width, height, exclusion_rects=rects, smoothness_percent=0, **settings)
+            outputs.append(np.asarray(engine.process_frame(img, 1.0)[0], dtype=int))
+            engine.close_sampling_pool()
+        ignored &= bool(np.array_equal(*outputs))
+    check("excluded pixels never reach the LEDs (every sampling mode and statistic)", ignored)
+
+    engine = make_engine(240, width, height, exclusion_rects=[(0, 900, width, 180)])
+    bottom = np.asarray(engine.process_frame(plain, 1.0)[0])[120:180]
+    check("a fully excluded zone samples black", not bottom.any())
+
+    directory = tempfile.mkdtemp(prefix="ambilight-layouts-")
+    try:
+        engine = make_engine(240, width, height, exclusion_rects=rects, layout_cache_mb=1)
+        engine.layout_cache = LayoutCache(directory)
+        compiled = np.asarray(engine.process_frame(covered, 1.0)[0])
+        cached_engine = make_engine(240, width, height, exclusion_rects=rects, layout_cache_mb=1)
+        cached_engine.layout_cache = LayoutCache(directory)
+        cached = np.asarray(cached_engine.process_frame(covered, 1.0)[0])
+        check("cached layouts keep their exclusions", cached_engine.layout_cache.hits > 0
+              and np.array_equal(compiled, cached))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_spatial(iterations=5000):
+    """Cost of the spatial filter along the strip, and its wraparound at the start position"""
+    print("\n== Spatial smoothing (1000 LEDs; us per frame) ==")
+    print(f"{'radius':<8}{'us':>8}")
+    colors = np.random.default_rng(0).integers(0, 256, (1000, 3)).astype(np.uint8)
+    costs = {}
+    for radius in (1, 2, 3, 5, 10):
+        engine = make_engine(1000, 1920, 1080, spatial_smoothing=radius)
+        target, state = engine.config_snapshot['targets'][0], engine.target_states[0]
+        costs[radius] = time_per_call(lambda: engine.spatial_filter(colors.copy(), target, state), iterations) \
+            - time_per_call(colors.copy, iterations)
+        print(f"{radius:<8}{costs[radius]:>8.1f}")
+    check("radius 2 filters 1000 LEDs in under 50 us", costs[2] < 50)
+
+    # One lit LED at the start of the strip: a closed loop spreads it onto the last LEDs, an open strip does not
+    closed = make_engine(240, 1920, 1080, spatial_smoothing=2)
+    open_strip = make_engine(180, 1920, 1080, spatial_smoothing=2,
+                             led_segments=[("top", 60, "top", "normal"), ("right", 60, "right", "reversed"),
+                                           ("bottom", 60, "bottom", "normal")])
+    spread = []
+    for engine in (closed, open_strip):
+        num_leds = engine.config_snapshot['targets'][0]['num_leds']
+        colors = np.zeros((num_leds, 3), dtype=np.uint8)
+        colors[0] = 255
+        filtered = engine.spatial_filter(colors, engine.config_snapshot['targets'][0], engine.target_states[0])
+        spread.append(filtered[-2:].any())
+    check("a strip around the whole frame wraps from its last LED to its first", spread[0])
+    check("an open strip does not wrap", not spread[1])
+
+    engine = make_engine(240, 1920, 1080, spatial_smoothing=3)
+    flat = np.full((240, 3), 200, dtype=np.uint8)
+    check("flat colors pass unchanged",
+          np.array_equal(engine.spatial_filter(flat.copy(), engine.config_snapshot['targets'][0],
+                                               engine.target_states[0]), flat))
+
+
+BENCHMARKS = {
+    "capture": bench_capture,
+    "sampling": bench_sampling,
+    "send": bench_send,
+    "gui_jitter": bench_gui_jitter,
+    "handoff": bench_handoff,
+    "startup": bench_startup,
+    "layout_cache": bench_layout_cache,
+    "hot_reload": bench_hot_reload,
+    "fixed_point": bench_fixed_point,
+    "fused": bench_fused,
+    "parallel": bench_parallel,
+    "qos": bench_qos,
+    "zone_statistics": bench_zone_statistics,
+    "exclusions": bench_exclusions,
+    "spatial": bench_spatial,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ambilight pipeline benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    for name in args.benchmarks or BENCHMARKS:
+        BENCHMARKS[name]()
+
+    if failed_checks:
+        print(f"\n{len(failed_checks)} check(s) failed: {', '.join(failed_checks)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
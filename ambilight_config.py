@@ -0,0 +1,139 @@
+import math
+
+# WLED realtime UDP protocols, and the ports WLED listens on for them
+WLED_PROTOCOLS = ["drgb", "dnrgb", "ddp"]
+WLED_UDP_PORT = 21324
+DDP_PORT = 4048
+
+# Effect settings and their defaults, as stored in saved configurations
+EFFECT_DEFAULTS = {
+    'brightness_percent': 100,
+    'color_intensity_percent': 80,
+    'smoothness_percent': 60,
+    'responsiveness_percent': 70,
+    'color_depth_percent': 10,
+    'scene_cut_percent': 50,
+    'adaptive_smoothing': False,
+    'letterbox_detection': False,
+    'zone_statistic': "mean",
+    'spatial_smoothing': 0,
+    # Smoothing time constant in ms; 0 derives it from the smoothness and responsiveness sliders
+    'smoothing_time_ms': 0,
+}
+
+# Capture pipeline modes: capture in the worker thread itself, or in a separate capture
+# thread handing full frames or edge strips only to the worker through a FrameRing
+CAPTURE_PIPELINES = ["off", "full", "edges"]
+
+# Edge sampling arithmetic: float64 weights, 16.16 fixed-point weights accumulated in uint32
+# (no float copy of the strips; zone colors within 1 level of the float path), or compiled
+# loops fusing sampling, enhancement and smoothing (needs Numba; float otherwise)
+SAMPLING_MODES = ["float", "fixed", "numba"]
+
+# Per-zone color statistic: the weighted mean of every pixel, or a robust statistic of a fixed
+# grid of pixels per zone that small bright details (UI elements, subtitles) do not pull along:
+# the mean of the middle half, the median of block means, or the most common 15-bit color
+ZONE_STATISTICS = ["mean", "trimmed_mean", "median", "dominant"]
+
+# Frame rates: capture/processing rate, and an optional independent output rate
+# (0 sends each processed frame as soon as it is ready)
+DEFAULT_CAPTURE_RATE = 30
+DEFAULT_OUTPUT_RATE = 0
+
+# Size limit of the on-disk cache of compiled sampling layouts in MB (0 disables it).
+# Off by default: a plain layout compiles in a millisecond or two, faster than it loads. Layouts
+# with excluded areas take ~100 ms to compile at 4K and load in a few ms, so enable it for those.
+DEFAULT_LAYOUT_CACHE_MB = 0
+
+# The smoothing sliders were tuned at 30 fps; their look is preserved at any frame rate
+REFERENCE_FRAME_TIME = 1.0 / 30.0
+
+
+def default_port(protocol):
+    """UDP port WLED listens on for a realtime protocol"""
+    return DDP_PORT if protocol == "ddp" else WLED_UDP_PORT
+
+
+def make_target(config, name="main"):
+    """Build an output target dict from a configuration dict"""
+    protocol = config.get('protocol', config.get('wled_protocol', 'drgb'))
+    return {
+        'name': config.get('name', name),
+        'wled_ip': config['wled_ip'],
+        'wled_port': int(config.get('wled_port') or default_port(protocol)),
+        'protocol': protocol,
+        'num_leds': int(config['num_leds']),
+        'led_start_offset': int(config.get('led_start_offset', 0)),
+        'led_segments': [tuple(segment) for segment in config['led_segments']],
+    }
+
+
+def make_source(config):
+    """Build a capture source dict: LEDs of one target sampled from another monitor region"""
+    return {
+        'monitor_region': tuple(int(v) for v in config['monitor_region']),
+        'target': int(config.get('target', 0)),
+        'led_start_offset': int(config.get('led_start_offset', 0)),
+        'led_segments': [tuple(segment) for segment in config['led_segments']],
+    }
+
+
+def validate_monitor_region(monitors, monitor_index, region):
+    """Return region if it still lies on monitor monitor_index (mss order, without the combined entry), else None"""
+    if region is None or monitor_index is None or not 0 <= monitor_index < len(monitors):
+        return None
+    left, top, width, height = (int(v) for v in region)
+    monitor = monitors[monitor_index]
+    if width <= 0 or height <= 0:
+        return None
+    if (left < monitor['left'] or top < monitor['top'] or left + width > monitor['left'] + monitor['width']
+            or top + height > monitor['top'] + monitor['height']):
+        return None
+    return (left, top, width, height)
+
+
+def smoothing_time_constant(smoothness_percent, responsiveness_percent):
+    """Smoothing time constant in seconds for the given slider settings"""
+    # Convert percentage to smoothing factor (0-95% max for stability)
+    smoothness = min(smoothness_percent / 100.0 * 0.95, 0.95)
+
+    # Responsiveness affects how much smoothing is applied
+    responsiveness = responsiveness_percent / 100.0
+    effective_smoothness = smoothness * (1 - responsiveness * 0.3)  # Higher responsiveness = less smoothing
+
+    # The per-frame factor at the reference rate, expressed as an exponential time constant
+    if effective_smoothness <= 0:
+        return 0.0
+    return -REFERENCE_FRAME_TIME / math.log(effective_smoothness)
+
+
+def make_config_snapshot(config):
+    """Build the engine's config snapshot from a saved configuration dict"""
+    snapshot = {
+        'wled_ip': config['wled_ip'],
+        'wled_port': config['wled_port'],
+        'num_leds': config['num_leds'],
+        'led_start_offset': config['led_start_offset'],
+        'traversal_direction': config.get('traversal_direction', 'clockwise'),
+    }
+    for key, default in EFFECT_DEFAULTS.items():
+        snapshot[key] = config.get(key, default)
+    snapshot['capture_rate_hz'] = config.get('capture_rate_hz', DEFAULT_CAPTURE_RATE)
+    snapshot['output_rate_hz'] = config.get('output_rate_hz', DEFAULT_OUTPUT_RATE)
+    snapshot['capture_pipeline'] = config.get('capture_pipeline', "off")
+    snapshot['sampling_mode'] = config.get('sampling_mode', "float")
+    snapshot['sampling_threads'] = config.get('sampling_threads', 0)
+    snapshot['quality_control'] = config.get('quality_control', False)
+    snapshot['batched_send'] = config.get('batched_send', False)
+    snapshot['layout_cache_mb'] = config.get('layout_cache_mb', DEFAULT_LAYOUT_CACHE_MB)
+
+    # Areas of the capture region never sampled (taskbars, overlays): (x, y, width, height) in region pixels
+    snapshot['exclusion_rects'] = tuple(tuple(int(v) for v in rect) for rect in config.get('exclusion_rects', []))
+
+    # The main strip plus any additional controllers share one capture
+    snapshot['targets'] = [make_target(config)] + [
+        make_target(target, name=f"target{i + 2}") for i, target in enumerate(config.get('targets', []))]
+
+    # Extra monitors feeding LEDs of the targets above (see multi_monitor.py)
+    snapshot['sources'] = [make_source(source) for source in config.get('sources', [])]
+    return snapshot
@@ -1,12 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
+import argparse
 import json
-import socket
-import numpy as np
-import mss
 import time
-import cv2
-import threading
+from ambilight_config import CAPTURE_PIPELINES, DDP_PORT, SAMPLING_MODES, WLED_PROTOCOLS, WLED_UDP_PORT, ZONE_STATISTICS, default_port, make_config_snapshot, make_source, make_target, smoothing_time_constant, validate_monitor_region
 
 class AmbilightConfigGUI:
     def __init__(self, root):
@@ -17,9 +14,19 @@ class AmbilightConfigGUI:
         # Configuration variables
         self.wled_ip = tk.StringVar(value="192.168.29.4")
         self.wled_port = tk.IntVar(value=21324)
+        self.wled_protocol = tk.StringVar(value="drgb")
         self.num_leds = tk.IntVar(value=240)
         self.led_start_offset = tk.IntVar(value=106)
         self.traversal_direction = tk.StringVar(value="clockwise")
+        self.capture_rate_hz = tk.IntVar(value=30)
+        self.output_rate_hz = tk.IntVar(value=0)  # 0 = send each captured frame
+        self.engine_in_process = tk.BooleanVar(value=False)
+        self.capture_pipeline = tk.StringVar(value="off")
+        self.sampling_mode = tk.StringVar(value="float")
+        self.sampling_threads = tk.IntVar(value=0)  # 0 = sample segments one after another
+        self.quality_control = tk.BooleanVar(value=False)
+        self.batched_send = tk.BooleanVar(value=False)
+        self.auto_start = tk.BooleanVar(value=False)
         
         # User preferences
         self.show_configure_dialog = True  # Don't show again preference
@@ -28,19 +35,37 @@ class AmbilightConfigGUI:
         self.starting_position = None
         self.led_segments = []
         self.is_configuring = False
-        self.ambilight_running = False
-        self.ambilight_thread = None
+        self.engine = None
+        self.stats_updates = 0
+        
+        # Configuration file watched for changes while streaming
+        self.config_path = None
+        self.config_watcher = None
+        self.reloaded_config = None
+        
+        # Additional output targets (loaded from configuration file)
+        self.extra_targets = []
+        
+        # Additional monitor regions feeding LEDs (loaded from configuration file)
+        self.extra_sources = []
         
         # Effect settings - User-friendly percentage-based controls
         self.brightness_percent = tk.IntVar(value=100)  # 0-100%
         self.color_intensity_percent = tk.IntVar(value=80)  # 0-100%
         self.smoothness_percent = tk.IntVar(value=60)  # 0-100%
         self.responsiveness_percent = tk.IntVar(value=70)  # 0-100%
+        self.scene_cut_percent = tk.IntVar(value=50)  # 0-100%
+        self.adaptive_smoothing = tk.BooleanVar(value=False)
+        self.letterbox_detection = tk.BooleanVar(value=False)
+        self.zone_statistic = tk.StringVar(value="mean")
         self.color_depth_percent = tk.IntVar(value=10)  # 0-100%
+        self.spatial_smoothing = tk.IntVar(value=0)  # LEDs blended on each side, 0 = off
+        self.smoothing_time_ms = 0  # set in the configuration file only; overrides the two sliders above
         
-        # Runtime variables
+        # Capture region, saved with the configuration (monitor index in mss order, without the combined entry)
+        self.monitor_index = None
         self.monitor_region = None
-        self.prev_led_colors = None
+        self.exclusion_rects = []  # (x, y, width, height) inside the capture region, never sampled
         
         # GUI state - larger canvas, smaller rectangle
         self.canvas_width = 600
@@ -71,6 +96,11 @@ class AmbilightConfigGUI:
         file_menu.add_command(label="Save Configuration", command=self.save_configuration)
         file_menu.add_command(label="Load Configuration", command=self.load_configuration)
         file_menu.add_separator()
+        file_menu.add_command(label="Select Capture Region...", command=self.select_capture_region)
+        file_menu.add_separator()
+        file_menu.add_command(label="Record LED Output...", command=self.start_recording)
+        file_menu.add_command(label="Stop Recording", command=self.stop_recording)
+        file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         
         # Main container
@@ -134,6 +164,51 @@ class AmbilightConfigGUI:
                                      values=["clockwise", "counter-clockwise"], state="readonly", width=12)
         direction_combo.grid(row=2, column=1, padx=5, pady=5)
         
+        ttk.Label(settings_frame, text="Protocol:").grid(row=2, column=2, sticky=tk.W, padx=5, pady=5)
+        protocol_combo = ttk.Combobox(settings_frame, textvariable=self.wled_protocol, 
+                                     values=WLED_PROTOCOLS, state="readonly", width=10)
+        protocol_combo.grid(row=2, column=3, padx=5, pady=5)
+        
+        def on_protocol_selected(event):
+            # WLED listens for DDP on its own port; a default port follows the protocol, a custom one stays
+            if self.wled_port.get() in (WLED_UDP_PORT, DDP_PORT):
+                self.wled_port.set(default_port(self.wled_protocol.get()))
+        protocol_combo.bind("<<ComboboxSelected>>", on_protocol_selected)
+        
+        ttk.Label(settings_frame, text="Capture FPS:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(settings_frame, textvariable=self.capture_rate_hz, width=10).grid(row=3, column=1, padx=5, pady=5)
+        
+        ttk.Label(settings_frame, text="Output Hz (0 = capture):").grid(row=3, column=2, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(settings_frame, textvariable=self.output_rate_hz, width=10).grid(row=3, column=3, padx=5, pady=5)
+        
+        ttk.Checkbutton(settings_frame, text="Run engine in a separate process (GUI activity cannot stall the LEDs)",
+                       variable=self.engine_in_process).grid(row=4, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Label(settings_frame, text="Capture Thread:").grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
+        pipeline_combo = ttk.Combobox(settings_frame, textvariable=self.capture_pipeline,
+                                     values=CAPTURE_PIPELINES, state="readonly", width=12)
+        pipeline_combo.grid(row=5, column=1, padx=5, pady=5)
+        ttk.Label(settings_frame, text="(full = whole frames, edges = border strips only)").grid(row=5, column=2, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Checkbutton(settings_frame, text="Start streaming on launch (with --config; uses the saved capture region)",
+                       variable=self.auto_start).grid(row=6, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Label(settings_frame, text="Sampling:").grid(row=7, column=0, sticky=tk.W, padx=5, pady=5)
+        sampling_combo = ttk.Combobox(settings_frame, textvariable=self.sampling_mode,
+                                     values=SAMPLING_MODES, state="readonly", width=12)
+        sampling_combo.grid(row=7, column=1, padx=5, pady=5)
+        ttk.Label(settings_frame, text="(fixed = integer arithmetic; numba = compiled loops, needs Numba)").grid(row=7, column=2, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Label(settings_frame, text="Sampling threads:").grid(row=8, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(settings_frame, textvariable=self.sampling_threads, width=10).grid(row=8, column=1, padx=5, pady=5)
+        ttk.Label(settings_frame, text="(0 = off; sample edges in parallel for 4K/8K regions)").grid(row=8, column=2, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Checkbutton(settings_frame, text="Reduce sampling quality when frames take longer than the capture rate allows",
+                       variable=self.quality_control).grid(row=9, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Checkbutton(settings_frame, text="Send each frame's packets in one sendmmsg call (Linux; applies on the next start)",
+                       variable=self.batched_send).grid(row=10, column=0, columnspan=4, sticky=tk.W, padx=5, pady=5)
+        
         # Configuration frame
         config_frame = ttk.LabelFrame(scrollable_frame, text="LED Strip Configuration")
         config_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 20), padx=10)
@@ -235,12 +310,40 @@ class AmbilightConfigGUI:
         responsiveness_label = ttk.Label(effects_frame, text="")
         responsiveness_label.grid(row=4, column=2, padx=5)
         
+        # Scene Cut Detection
+        ttk.Label(effects_frame, text="Scene Cut Detection:").grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
+        scene_cut_scale = ttk.Scale(effects_frame, from_=0, to=100, variable=self.scene_cut_percent, orient=tk.HORIZONTAL, length=200)
+        scene_cut_scale.grid(row=5, column=1, padx=5, pady=5)
+        scene_cut_label = ttk.Label(effects_frame, text="")
+        scene_cut_label.grid(row=5, column=2, padx=5)
+        
         # Color Depth
-        ttk.Label(effects_frame, text="Color Sampling Area:").grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(effects_frame, text="Color Sampling Area:").grid(row=6, column=0, sticky=tk.W, padx=5, pady=5)
         color_depth_scale = ttk.Scale(effects_frame, from_=5, to=50, variable=self.color_depth_percent, orient=tk.HORIZONTAL, length=200)
-        color_depth_scale.grid(row=5, column=1, padx=5, pady=5)
+        color_depth_scale.grid(row=6, column=1, padx=5, pady=5)
         color_depth_label = ttk.Label(effects_frame, text="")
-        color_depth_label.grid(row=5, column=2, padx=5)
+        color_depth_label.grid(row=6, column=2, padx=5)
+        
+        # Motion-adaptive smoothing
+        ttk.Checkbutton(effects_frame, text="Motion-adaptive smoothing (smooth static areas, follow moving ones)",
+                       variable=self.adaptive_smoothing).grid(row=7, column=0, columnspan=3, sticky=tk.W, padx=5, pady=5)
+        
+        # Black bar detection
+        ttk.Checkbutton(effects_frame, text="Ignore letterbox/pillarbox black bars (sample the picture edges)",
+                       variable=self.letterbox_detection).grid(row=8, column=0, columnspan=3, sticky=tk.W, padx=5, pady=5)
+        
+        # Zone color statistic
+        ttk.Label(effects_frame, text="Zone Color:").grid(row=9, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Combobox(effects_frame, textvariable=self.zone_statistic, values=ZONE_STATISTICS,
+                    state="readonly", width=12).grid(row=9, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(effects_frame, text="(robust statistics ignore subtitles and small UI elements)").grid(row=9, column=2, sticky=tk.W, padx=5)
+        
+        # Spatial smoothing along the strip
+        ttk.Label(effects_frame, text="Spatial Smoothing:").grid(row=10, column=0, sticky=tk.W, padx=5, pady=5)
+        spatial_scale = ttk.Scale(effects_frame, from_=0, to=5, variable=self.spatial_smoothing, orient=tk.HORIZONTAL, length=200)
+        spatial_scale.grid(row=10, column=1, padx=5, pady=5)
+        spatial_label = ttk.Label(effects_frame, text="")
+        spatial_label.grid(row=10, column=2, padx=5)
         
         # Real-time update functions
         def update_brightness_label(*args):
@@ -253,29 +356,43 @@ class AmbilightConfigGUI:
         
         def update_smoothness_label(*args):
             value = self.smoothness_percent.get()
-            smoothness_label.config(text=f"{value}% - {'Instant' if value < 30 else 'Balanced' if value < 80 else 'Smooth'}")
+            time_ms = smoothing_time_constant(value, self.responsiveness_percent.get()) * 1000
+            smoothness_label.config(text=f"{value}% - {'Instant' if value < 30 else 'Balanced' if value < 80 else 'Smooth'} (~{time_ms:.0f} ms)")
         
         def update_responsiveness_label(*args):
             value = self.responsiveness_percent.get()
             responsiveness_label.config(text=f"{value}% - {'Slow' if value < 30 else 'Medium' if value < 80 else 'Fast'}")
         
+        def update_scene_cut_label(*args):
+            value = self.scene_cut_percent.get()
+            scene_cut_label.config(text=f"{value}% - {'Off' if value == 0 else 'Hard cuts only' if value < 50 else 'Sensitive'}")
+        
         def update_color_depth_label(*args):
             value = self.color_depth_percent.get()
             color_depth_label.config(text=f"{value}% - {'Precise' if value < 20 else 'Balanced' if value < 35 else 'Wide'}")
         
+        def update_spatial_label(*args):
+            value = self.spatial_smoothing.get()
+            spatial_label.config(text="Off" if value == 0 else f"{value} LED{'s' if value > 1 else ''} each side")
+        
         # Bind real-time updates
         self.brightness_percent.trace('w', update_brightness_label)
         self.color_intensity_percent.trace('w', update_color_intensity_label)
         self.smoothness_percent.trace('w', update_smoothness_label)
         self.responsiveness_percent.trace('w', update_responsiveness_label)
+        self.responsiveness_percent.trace('w', update_smoothness_label)
+        self.scene_cut_percent.trace('w', update_scene_cut_label)
         self.color_depth_percent.trace('w', update_color_depth_label)
+        self.spatial_smoothing.trace('w', update_spatial_label)
         
         # Initialize labels
         update_brightness_label()
         update_color_intensity_label()
         update_smoothness_label()
         update_responsiveness_label()
+        update_scene_cut_label()
         update_color_depth_label()
+        update_spatial_label()
         
         # Help text frame
         help_frame = ttk.LabelFrame(parent, text="Settings Guide")
@@ -285,7 +402,10 @@ class AmbilightConfigGUI:
 • Color Vibrancy: How intense and saturated colors are
 • Transition Smoothness: How gradually colors change (higher = less flicker)
 • Response Speed: How quickly lights react to screen changes
-• Color Sampling Area: How much of screen edge to analyze for colors"""
+• Scene Cut Detection: Skip smoothing on hard scene changes (0 = off)
+• Color Sampling Area: How much of screen edge to analyze for colors
+• Black Bars: Detected about once a second; the picture edges are sampled instead
+• Spatial Smoothing: Blend each LED with its neighbours along the strip (softens zone edges and corners)"""
         
         ttk.Label(help_frame, text=help_text, justify=tk.LEFT, 
                  font=("Arial", 9)).pack(padx=10, pady=10, anchor=tk.W)
@@ -296,6 +416,9 @@ class AmbilightConfigGUI:
         
         self.status_label = ttk.Label(status_frame, text="Status: Ready", font=("Arial", 10))
         self.status_label.pack(pady=10)
+        
+        self.stats_label = ttk.Label(status_frame, text="", font=("Arial", 9))
+        self.stats_label.pack(pady=(0, 10))
 
     def draw_rectangle(self):
         self.canvas.delete("all")
@@ -863,6 +986,20 @@ class AmbilightConfigGUI:
         config_text += f"\nTotal active LEDs: {total_used}\n"
         config_text += f"Remaining LEDs: {self.num_leds.get() - self.led_start_offset.get() - total_used}"
         
+        for target in self.extra_targets:
+            config_text += f"\nAdditional target: {target.get('name', 'unnamed')} ({target['wled_ip']}, {target['num_leds']} LEDs)"
+        
+        for source in self.extra_sources:
+            left, top, width, height = source['monitor_region']
+            config_text += (f"\nAdditional monitor: {width}x{height} at ({left}, {top}) -> target {source['target'] + 1}, "
+                            f"LEDs from {source['led_start_offset']}")
+        
+        if self.monitor_region and self.monitor_index is not None:
+            left, top, width, height = self.monitor_region
+            config_text += f"\nCapture region: monitor {self.monitor_index + 1}, {width}x{height} at ({left}, {top})"
+            for x, y, width, height in self.exclusion_rects:
+                config_text += f"\nExcluded area: {width}x{height} at ({x}, {y}) in the region"
+        
         self.config_text.insert(tk.END, config_text)
     
     def generate_configuration(self):
@@ -906,6 +1043,44 @@ LED_STRIP_FLOW = [
         code += "]\n"
         return code
     
+    def get_configuration(self):
+        """Collect the current settings as a configuration dict"""
+        return {
+            "wled_ip": self.wled_ip.get(),
+            "wled_port": self.wled_port.get(),
+            "wled_protocol": self.wled_protocol.get(),
+            "num_leds": self.num_leds.get(),
+            "led_start_offset": self.led_start_offset.get(),
+            "traversal_direction": self.traversal_direction.get(),
+            "capture_rate_hz": self.capture_rate_hz.get(),
+            "output_rate_hz": self.output_rate_hz.get(),
+            "engine_process": self.engine_in_process.get(),
+            "capture_pipeline": self.capture_pipeline.get(),
+            "sampling_mode": self.sampling_mode.get(),
+            "sampling_threads": self.sampling_threads.get(),
+            "quality_control": self.quality_control.get(),
+            "batched_send": self.batched_send.get(),
+            "auto_start": self.auto_start.get(),
+            "monitor_index": self.monitor_index,
+            "monitor_region": list(self.monitor_region) if self.monitor_region else None,
+            "exclusion_rects": [list(rect) for rect in self.exclusion_rects],
+            "starting_position": self.starting_position,
+            "led_segments": self.led_segments,
+            "brightness_percent": self.brightness_percent.get(),
+            "color_intensity_percent": self.color_intensity_percent.get(),
+            "smoothness_percent": self.smoothness_percent.get(),
+            "responsiveness_percent": self.responsiveness_percent.get(),
+            "scene_cut_percent": self.scene_cut_percent.get(),
+            "adaptive_smoothing": self.adaptive_smoothing.get(),
+            "letterbox_detection": self.letterbox_detection.get(),
+            "zone_statistic": self.zone_statistic.get(),
+            "color_depth_percent": self.color_depth_percent.get(),
+            "spatial_smoothing": self.spatial_smoothing.get(),
+            "smoothing_time_ms": self.smoothing_time_ms,
+            "targets": self.extra_targets,
+            "sources": self.extra_sources
+        }
+    
     def save_configuration(self):
         """Save configuration to JSON file"""
         if not self.led_segments:
@@ -918,26 +1093,66 @@ LED_STRIP_FLOW = [
         )
         
         if filename:
-            config = {
-                "wled_ip": self.wled_ip.get(),
-                "wled_port": self.wled_port.get(),
-                "num_leds": self.num_leds.get(),
-                "led_start_offset": self.led_start_offset.get(),
-                "traversal_direction": self.traversal_direction.get(),
-                "starting_position": self.starting_position,
-                "led_segments": self.led_segments,
-                "brightness_percent": self.brightness_percent.get(),
-                "color_intensity_percent": self.color_intensity_percent.get(),
-                "smoothness_percent": self.smoothness_percent.get(),
-                "responsiveness_percent": self.responsiveness_percent.get(),
-                "color_depth_percent": self.color_depth_percent.get()
-            }
+            config = self.get_configuration()
             
             with open(filename, 'w') as f:
                 json.dump(config, f, indent=2)
             
             messagebox.showinfo("Success", f"Configuration saved to {filename}")
     
+    def apply_configuration(self, config):
+        """Apply a configuration dict to the GUI"""
+        # Load basic settings
+        self.wled_ip.set(config["wled_ip"])
+        self.wled_port.set(config["wled_port"])
+        self.wled_protocol.set(config.get("wled_protocol", "drgb"))
+        self.num_leds.set(config["num_leds"])
+        self.led_start_offset.set(config["led_start_offset"])
+        self.traversal_direction.set(config.get("traversal_direction", "clockwise"))
+        self.capture_rate_hz.set(config.get("capture_rate_hz", 30))
+        self.output_rate_hz.set(config.get("output_rate_hz", 0))
+        self.engine_in_process.set(config.get("engine_process", False))
+        self.capture_pipeline.set(config.get("capture_pipeline", "off"))
+        self.sampling_mode.set(config.get("sampling_mode", "float"))
+        self.sampling_threads.set(config.get("sampling_threads", 0))
+        self.quality_control.set(config.get("quality_control", False))
+        self.batched_send.set(config.get("batched_send", False))
+        self.auto_start.set(config.get("auto_start", False))
+        self.starting_position = config["starting_position"]
+        self.led_segments = config["led_segments"]
+        self.extra_targets = [make_target(target, name=f"target{i + 2}")
+                              for i, target in enumerate(config.get("targets", []))]
+        self.extra_sources = [make_source(source) for source in config.get("sources", [])]
+        
+        # Saved capture region; checked against the connected monitors when streaming starts
+        self.monitor_index = config.get("monitor_index")
+        self.monitor_region = tuple(config["monitor_region"]) if config.get("monitor_region") else None
+        self.exclusion_rects = [tuple(rect) for rect in config.get("exclusion_rects", [])]
+        
+        # Load effect settings if available
+        self.brightness_percent.set(config.get("brightness_percent", 100))
+        self.color_intensity_percent.set(config.get("color_intensity_percent", 80))
+        self.smoothness_percent.set(config.get("smoothness_percent", 60))
+        self.responsiveness_percent.set(config.get("responsiveness_percent", 70))
+        self.scene_cut_percent.set(config.get("scene_cut_percent", 50))
+        self.adaptive_smoothing.set(config.get("adaptive_smoothing", False))
+        self.letterbox_detection.set(config.get("letterbox_detection", False))
+        self.zone_statistic.set(config.get("zone_statistic", "mean"))
+        self.color_depth_percent.set(config.get("color_depth_percent", 10))
+        self.spatial_smoothing.set(config.get("spatial_smoothing", 0))
+        self.smoothing_time_ms = config.get("smoothing_time_ms", 0)
+        
+        # Update the configuration display
+        self.update_config_display()
+        
+        # Update the canvas to show the starting position
+        if self.starting_position:
+            # Find the position on canvas based on starting_position string
+            self.current_pointer_pos = self.get_canvas_position_from_description(self.starting_position)
+            self.draw_rectangle()
+            # Update button text since we now have a configuration
+            self.configure_button.config(text="Reconfigure LED Segments")
+    
     def load_configuration(self):
         """Load configuration from JSON file"""
         filename = filedialog.askopenfilename(
@@ -949,32 +1164,8 @@ LED_STRIP_FLOW = [
                 with open(filename, 'r') as f:
                     config = json.load(f)
                 
-                # Load basic settings
-                self.wled_ip.set(config["wled_ip"])
-                self.wled_port.set(config["wled_port"])
-                self.num_leds.set(config["num_leds"])
-                self.led_start_offset.set(config["led_start_offset"])
-                self.traversal_direction.set(config.get("traversal_direction", "clockwise"))
-                self.starting_position = config["starting_position"]
-                self.led_segments = config["led_segments"]
-                
-                # Load effect settings if available
-                self.brightness_percent.set(config.get("brightness_percent", 100))
-                self.color_intensity_percent.set(config.get("color_intensity_percent", 80))
-                self.smoothness_percent.set(config.get("smoothness_percent", 60))
-                self.responsiveness_percent.set(config.get("responsiveness_percent", 70))
-                self.color_depth_percent.set(config.get("color_depth_percent", 10))
-                
-                # Update the configuration display
-                self.update_config_display()
-                
-                # Update the canvas to show the starting position
-                if self.starting_position:
-                    # Find the position on canvas based on starting_position string
-                    self.current_pointer_pos = self.get_canvas_position_from_description(self.starting_position)
-                    self.draw_rectangle()
-                    # Update button text since we now have a configuration
-                    self.configure_button.config(text="Reconfigure LED Segments")
+                self.apply_configuration(config)
+                self.config_path = filename
                 
                 messagebox.showinfo("Success", f"Configuration loaded from {filename}")
                 
@@ -1025,6 +1216,7 @@ LED_STRIP_FLOW = [
     
     def select_monitor_and_region(self):
         """Select monitor and capture region"""
+        import mss  # only needed once Start is pressed; keeps GUI startup light
         try:
             with mss.mss() as sct:
                 monitors = sct.monitors[1:]  # Skip the "all monitors" entry
@@ -1068,14 +1260,19 @@ LED_STRIP_FLOW = [
                 selected_monitor = monitors[monitor_idx]
                 
                 # Create region selection window
-                return self.select_region_on_monitor(selected_monitor)
+                selection = self.select_region_on_monitor(selected_monitor)
+                if not selection:
+                    return None
+                region, self.exclusion_rects = selection
+                self.monitor_index = monitor_idx
+                return region
                 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to select monitor: {str(e)}")
             return None
     
     def select_region_on_monitor(self, monitor):
-        """Select capture region on the specified monitor"""
+        """Select capture region on the specified monitor, then areas inside it to exclude from sampling"""
         top = tk.Toplevel(self.root)
         top.geometry(f"{monitor['width']}x{monitor['height']}+{monitor['left']}+{monitor['top']}")
         top.overrideredirect(True)
@@ -1090,27 +1287,52 @@ LED_STRIP_FLOW = [
         
         start_x = start_y = rect = None
         region = {}
+        exclusions = []  # (canvas rectangle, region-relative (x, y, width, height))
         selection_made = False
         
         def on_button_press(event):
             nonlocal start_x, start_y, rect
             start_x, start_y = event.x, event.y
-            rect = canvas.create_rectangle(start_x, start_y, start_x, start_y, outline='white', width=2)
+            color = 'red' if 'coords' in region else 'white'
+            rect = canvas.create_rectangle(start_x, start_y, start_x, start_y, outline=color, width=2)
         
         def on_mouse_drag(event):
             if rect:
                 canvas.coords(rect, start_x, start_y, event.x, event.y)
         
         def on_button_release(event):
-            nonlocal selection_made
+            nonlocal rect
             x1 = min(start_x, event.x)
             y1 = min(start_y, event.y)
             x2 = max(start_x, event.x)
             y2 = max(start_y, event.y)
-            canvas.delete(rect)
-            region['coords'] = (x1 + monitor['left'], y1 + monitor['top'], x2 - x1, y2 - y1)
-            selection_made = True
-            top.quit()
+            if 'coords' not in region:
+                # Keep the capture region outlined while exclusions are drawn inside it
+                region['coords'] = (x1 + monitor['left'], y1 + monitor['top'], x2 - x1, y2 - y1)
+                region['canvas'] = (x1, y1, x2, y2)
+                canvas.itemconfig(prompt, text="Drag over taskbars or overlays to exclude them "
+                                               "(Enter to finish, Backspace to undo, ESC to cancel)")
+                rect = None
+                return
+            # Exclusions are clipped to the capture region and stored relative to it
+            left, upper, right, lower = region['canvas']
+            x1, y1, x2, y2 = max(x1, left), max(y1, upper), min(x2, right), min(y2, lower)
+            if x2 > x1 and y2 > y1:
+                canvas.coords(rect, x1, y1, x2, y2)
+                exclusions.append((rect, (x1 - left, y1 - upper, x2 - x1, y2 - y1)))
+            else:
+                canvas.delete(rect)
+            rect = None
+        
+        def on_backspace(event):
+            if exclusions:
+                canvas.delete(exclusions.pop()[0])
+        
+        def on_return(event):
+            nonlocal selection_made
+            selection_made = 'coords' in region
+            if selection_made:
+                top.quit()
         
         def on_escape(event):
             nonlocal selection_made
@@ -1120,32 +1342,145 @@ LED_STRIP_FLOW = [
         canvas.bind("<Button-1>", on_button_press)
         canvas.bind("<B1-Motion>", on_mouse_drag)
         canvas.bind("<ButtonRelease-1>", on_button_release)
+        top.bind("<BackSpace>", on_backspace)
+        top.bind("<Return>", on_return)
         top.bind("<Escape>", on_escape)
         canvas.focus_set()
         
-        canvas.create_text(monitor['width']//2, 50, text="Drag to select capture region (ESC to cancel)", 
-                          fill='white', font=("Arial", 16, "bold"))
+        prompt = canvas.create_text(monitor['width']//2, 50, text="Drag to select capture region (ESC to cancel)", 
+                                   fill='white', font=("Arial", 16, "bold"))
         
         top.mainloop()
         top.destroy()
         
         if selection_made and 'coords' in region:
-            return region['coords']
+            return region['coords'], [area for _, area in exclusions]
         else:
             return None
     
+    def saved_capture_region(self):
+        """The saved capture region if it still fits the monitor it was selected on, else None"""
+        if self.monitor_region is None:
+            return None
+        import mss
+        try:
+            with mss.mss() as sct:
+                monitors = sct.monitors[1:]
+        except Exception as e:
+            return None
+        return validate_monitor_region(monitors, self.monitor_index, self.monitor_region)
+    
+    def select_capture_region(self):
+        """Pick the monitor and capture region interactively and keep it for saving"""
+        region = self.select_monitor_and_region()
+        if region:
+            self.monitor_region = region
+            self.update_config_display()
+    
+    @property
+    def ambilight_running(self):
+        """Whether the ambilight engine is currently streaming"""
+        return self.engine is not None and self.engine.running
+    
     def update_config_snapshot_if_running(self):
         """Update config snapshot with current effect values if ambilight is running"""
         if self.ambilight_running and hasattr(self, 'config_snapshot'):
-            self.config_snapshot['brightness_percent'] = self.brightness_percent.get()
-            self.config_snapshot['color_intensity_percent'] = self.color_intensity_percent.get()
-            self.config_snapshot['smoothness_percent'] = self.smoothness_percent.get()
-            self.config_snapshot['responsiveness_percent'] = self.responsiveness_percent.get()
-            self.config_snapshot['color_depth_percent'] = self.color_depth_percent.get()
+            # Changes to the watched configuration file; applied here on the Tk thread
+            config, self.reloaded_config = self.reloaded_config, None
+            if config is not None:
+                if self.reload_configuration(config):
+                    # The restarted engine runs its own update loop
+                    return
+            
+            self.engine.update_settings({
+                'brightness_percent': self.brightness_percent.get(),
+                'color_intensity_percent': self.color_intensity_percent.get(),
+                'smoothness_percent': self.smoothness_percent.get(),
+                'responsiveness_percent': self.responsiveness_percent.get(),
+                'scene_cut_percent': self.scene_cut_percent.get(),
+                'adaptive_smoothing': self.adaptive_smoothing.get(),
+                'letterbox_detection': self.letterbox_detection.get(),
+                'zone_statistic': self.zone_statistic.get(),
+                'color_depth_percent': self.color_depth_percent.get(),
+                'spatial_smoothing': self.spatial_smoothing.get(),
+                'sampling_mode': self.sampling_mode.get(),
+                'sampling_threads': self.sampling_threads.get(),
+                'quality_control': self.quality_control.get(),
+            })
+            
+            # Frame statistics about once a second
+            self.stats_updates += 1
+            if self.stats_updates % 10 == 0:
+                self.update_stats_display()
         
         # Schedule next update in 100ms for real-time responsiveness
         if self.ambilight_running:
             self.root.after(100, self.update_config_snapshot_if_running)
+    
+    def reload_configuration(self, config):
+        """Apply a changed configuration file to the GUI and the running engine; returns whether the engine was restarted"""
+        running_index, running_region = self.monitor_index, tuple(self.monitor_region)
+        running_engine = self.engine_type()
+        try:
+            self.apply_configuration(config)
+            self.config_snapshot = make_config_snapshot(self.get_configuration())
+        except Exception as e:
+            # Incomplete configuration: keep streaming with the current one
+            self.monitor_index, self.monitor_region = running_index, running_region
+            try:
+                self.status_label.config(text=f"Status: Ambilight running (ignored invalid configuration: {e})")
+            except tk.TclError:
+                pass
+            return False
+        
+        # A running engine cannot switch between the engine types, and it captures a fixed region
+        restart = self.engine_type() != running_engine
+        status = f"configuration reloaded at {time.strftime('%H:%M:%S')}"
+        if (self.monitor_index, self.monitor_region) != (running_index, running_region):
+            region = self.saved_capture_region()
+            if region is None:
+                # Keep capturing the current region rather than stopping
+                self.monitor_index, self.monitor_region = running_index, running_region
+                self.config_snapshot = make_config_snapshot(self.get_configuration())
+                status = "ignored capture region that does not match the connected monitors"
+            else:
+                self.monitor_region = region
+                restart = True
+        
+        if restart:
+            self.engine.stop(timeout=1)
+            self.launch_engine()
+            try:
+                self.status_label.config(text=f"Status: Ambilight running (restarted for the new configuration at {time.strftime('%H:%M:%S')})")
+            except tk.TclError:
+                pass
+            return True
+        
+        self.engine.reload_config(self.config_snapshot)
+        try:
+            self.status_label.config(text=f"Status: Ambilight running ({status})")
+        except tk.TclError:
+            pass
+        return False
+    
+    def on_config_file_changed(self, config):
+        """Called by the configuration watcher thread; hands the new configuration to the Tk thread"""
+        self.reloaded_config = config
+    
+    def update_stats_display(self):
+        """Show the engine's frame rate and frame-time jitter"""
+        stats = self.engine.get_stats()
+        try:
+            if 'fps' in stats:
+                self.stats_label.config(text=f"{stats['fps']:.1f} FPS, frame interval {stats['interval_ms']:.1f} ms "
+                                             f"(jitter {stats['jitter_ms']:.2f} ms, max {stats['max_interval_ms']:.1f} ms), "
+                                             f"send {stats['send_us']:.0f} us"
+                                             + (f", quality level {stats['quality_level']}" if stats.get('quality_level') else "")
+                                             + (", Numba not installed (sampling with numpy)" if stats.get('numba_missing') else ""))
+            else:
+                self.stats_label.config(text="")
+        except tk.TclError:
+            pass
 
     def start_ambilight(self):
         """Start the ambilight effect"""
@@ -1166,32 +1501,47 @@ LED_STRIP_FLOW = [
         except tk.TclError:
             return
         
-        self.monitor_region = self.select_monitor_and_region()
+        # A saved region that still matches the connected monitors skips the selection dialogs
+        region = self.saved_capture_region()
+        if region is None:
+            region = self.select_monitor_and_region()
         
-        if not self.monitor_region:
+        if not region:
             try:
                 self.status_label.config(text="Status: Ready")
             except tk.TclError:
                 pass
             return
         
-        self.config_snapshot = {
-            'wled_ip': self.wled_ip.get(),
-            'wled_port': self.wled_port.get(),
-            'num_leds': self.num_leds.get(),
-            'led_start_offset': self.led_start_offset.get(),
-            'traversal_direction': self.traversal_direction.get(),
-            'brightness_percent': self.brightness_percent.get(),
-            'color_intensity_percent': self.color_intensity_percent.get(),
-            'smoothness_percent': self.smoothness_percent.get(),
-            'responsiveness_percent': self.responsiveness_percent.get(),
-            'color_depth_percent': self.color_depth_percent.get()
-        }
+        self.monitor_region = region
+        self.launch_engine()
+    
+    def engine_type(self):
+        """(in a separate process, with extra monitor sources): what decides the engine launch_engine() creates"""
+        return self.engine_in_process.get(), bool(self.extra_sources)
+    
+    def launch_engine(self):
+        """Create and start the engine for the current configuration and capture region"""
+        self.config_snapshot = make_config_snapshot(self.get_configuration())
+        
+        if self.engine_in_process.get():
+            # Capture, processing and sending run in a child process controlled over a pipe
+            from engine_process import EngineProcess
+            self.engine = EngineProcess(self.config_snapshot, self.monitor_region)
+        elif self.extra_sources:
+            # Other monitors are captured in parallel by worker processes
+            from multi_monitor import MultiMonitorEngine
+            self.engine = MultiMonitorEngine(self.config_snapshot, self.monitor_region)
+        else:
+            from ambilight_engine import AmbilightEngine
+            self.engine = AmbilightEngine(self.config_snapshot, self.monitor_region)
+        self.engine.start()
         
-        self.ambilight_running = True
-        self.prev_led_colors = None
-        self.ambilight_thread = threading.Thread(target=self.ambilight_worker, daemon=True)
-        self.ambilight_thread.start()
+        # Apply edits of the configuration file to the running session
+        if self.config_path and self.config_watcher is None:
+            from config_watcher import ConfigWatcher
+            self.config_watcher = ConfigWatcher(self.config_path, self.on_config_file_changed)
+            self.config_watcher.start()
         
         # Start periodic effect updates from GUI thread
         self.root.after(100, self.update_config_snapshot_if_running)
@@ -1205,13 +1555,31 @@ LED_STRIP_FLOW = [
         except tk.TclError:
             pass
     
+    def auto_start_ambilight(self):
+        """Start streaming without any dialogs, using the saved capture region"""
+        if not self.led_segments or self.ambilight_running:
+            return
+        region = self.saved_capture_region()
+        if region is None:
+            # Unattended start cannot ask for a region; leave it to the user
+            try:
+                self.status_label.config(text="Status: Saved capture region does not match the connected monitors - press Start to select one")
+            except tk.TclError:
+                pass
+            return
+        self.monitor_region = region
+        self.launch_engine()
+    
     def stop_ambilight(self):
         """Stop the ambilight effect"""
-        self.ambilight_running = False
-        if self.ambilight_thread:
-            self.ambilight_thread.join(timeout=1)
+        if self.config_watcher:
+            self.config_watcher.stop()
+            self.config_watcher = None
+        if self.engine:
+            self.engine.stop(timeout=1)
         try:
             self.status_label.config(text="Status: Stopped")
+            self.stats_label.config(text="")
             self.start_stop_button.config(text="Start Ambilight", bg="#4CAF50", fg="white")
             self.start_stop_button.config(activebackground="#45a049", activeforeground="white")
             self.start_stop_button.config(relief="raised", bd=3)
@@ -1219,269 +1587,33 @@ LED_STRIP_FLOW = [
         except tk.TclError:
             pass  # Widget was destroyed
     
-    def enhance_color(self, rgb):
-        """Apply brightness and color intensity adjustments"""
-        brightness = self.config_snapshot['brightness_percent'] / 100.0
-        color_intensity = self.config_snapshot['color_intensity_percent'] / 100.0
-        
-        rgb = np.array(rgb, dtype=float)
-        
-        # Apply color intensity (saturation boost)
-        if color_intensity != 1.0:
-            # Convert to HSV for saturation adjustment
-            hsv = cv2.cvtColor(rgb.reshape(1, 1, 3).astype(np.uint8), cv2.COLOR_RGB2HSV).astype(float)
-            hsv[0, 0, 1] = np.clip(hsv[0, 0, 1] * color_intensity, 0, 255)
-            rgb = cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2RGB)[0, 0]
-        
-        # Apply brightness
-        rgb = np.clip(rgb * brightness, 0, 255)
-        
-        return tuple(rgb.astype(int))
-    
-    def extract_edge_colors(self, img, edge_type, count):
-        """Extract colors from screen edges - EXACT copy from working version"""
-        h, w = img.shape[:2]
-        edge_colors = []
-        
-        # Use color_depth_percent for sampling area size
-        if edge_type in ('top', 'bottom'):
-            avg_size = max(1, int((self.config_snapshot['color_depth_percent'] / 100.0) * h))
-        else:
-            avg_size = max(1, int((self.config_snapshot['color_depth_percent'] / 100.0) * w))
-            
-        # For falloff, create weights (closer to edge = higher weight)
-        falloff_exp = 0.01 + (0 / 10) * (0.25 - 0.01)  # Use same as working version
-        
-        if edge_type == 'top':
-            strip = img[0:avg_size, :, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size)[::-1])  # 0=furthest, avg_size-1=closest
-            weights = weights / np.sum(weights)
-            cols = np.linspace(0, w, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[:, cols[i]:cols[i + 1], :]
-                avg = np.tensordot(weights, zone, axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        elif edge_type == 'right':
-            strip = img[:, w-avg_size:w, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size)[::-1])
-            weights = weights / np.sum(weights)
-            rows = np.linspace(0, h, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[rows[i]:rows[i + 1], :, :]
-                avg = np.tensordot(weights, zone.transpose(1,0,2), axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        elif edge_type == 'bottom':
-            strip = img[-avg_size:, :, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size))  # bottom: 0=closest, -1=furthest
-            weights = weights / np.sum(weights)
-            cols = np.linspace(0, w, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[:, cols[i]:cols[i + 1], :]
-                avg = np.tensordot(weights, zone, axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        elif edge_type == 'left':
-            strip = img[:, 0:avg_size, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size))
-            weights = weights / np.sum(weights)
-            rows = np.linspace(0, h, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[rows[i]:rows[i + 1], :, :]
-                avg = np.tensordot(weights, zone.transpose(1,0,2), axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        # Handle partial edges (for GUI flexibility)
-        elif edge_type == 'bottom_left':
-            strip = img[-avg_size:, :, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size))
-            weights = weights / np.sum(weights)
-            cols = np.linspace(0, w//2, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[:, cols[i]:cols[i + 1], :]
-                avg = np.tensordot(weights, zone, axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        elif edge_type == 'bottom_right':
-            strip = img[-avg_size:, :, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size))
-            weights = weights / np.sum(weights)
-            cols = np.linspace(w//2, w, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[:, cols[i]:cols[i + 1], :]
-                avg = np.tensordot(weights, zone, axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        elif edge_type == 'top_left':
-            strip = img[0:avg_size, :, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size)[::-1])
-            weights = weights / np.sum(weights)
-            cols = np.linspace(0, w//2, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[:, cols[i]:cols[i + 1], :]
-                avg = np.tensordot(weights, zone, axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        elif edge_type == 'top_right':
-            strip = img[0:avg_size, :, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size)[::-1])
-            weights = weights / np.sum(weights)
-            cols = np.linspace(w//2, w, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[:, cols[i]:cols[i + 1], :]
-                avg = np.tensordot(weights, zone, axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        elif edge_type == 'left_top':
-            strip = img[:, 0:avg_size, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size))
-            weights = weights / np.sum(weights)
-            rows = np.linspace(0, h//2, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[rows[i]:rows[i + 1], :, :]
-                avg = np.tensordot(weights, zone.transpose(1,0,2), axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        elif edge_type == 'left_bottom':
-            strip = img[:, 0:avg_size, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size))
-            weights = weights / np.sum(weights)
-            rows = np.linspace(h//2, h, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[rows[i]:rows[i + 1], :, :]
-                avg = np.tensordot(weights, zone.transpose(1,0,2), axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        elif edge_type == 'right_top':
-            strip = img[:, w-avg_size:w, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size)[::-1])
-            weights = weights / np.sum(weights)
-            rows = np.linspace(0, h//2, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[rows[i]:rows[i + 1], :, :]
-                avg = np.tensordot(weights, zone.transpose(1,0,2), axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        elif edge_type == 'right_bottom':
-            strip = img[:, w-avg_size:w, :3]
-            weights = np.exp(-falloff_exp * np.arange(avg_size)[::-1])
-            weights = weights / np.sum(weights)
-            rows = np.linspace(h//2, h, count + 1, dtype=int)
-            for i in range(count):
-                zone = strip[rows[i]:rows[i + 1], :, :]
-                avg = np.tensordot(weights, zone.transpose(1,0,2), axes=([0], [0])).mean(axis=0)
-                edge_colors.append(self.enhance_color(avg))
-        
-        return edge_colors
-    
-    def get_led_colors_from_screen(self, img):
-        """Map screen colors to LED positions"""
-        led_colors = [(0, 0, 0)] * self.config_snapshot['num_leds']
-        current_led = self.config_snapshot['led_start_offset']
+    def start_recording(self):
+        """Record the transmitted LED stream of the running session"""
+        if not self.ambilight_running:
+            messagebox.showerror("Error", "Start Ambilight before recording.")
+            return
         
-        for edge_name, count, description, direction in self.led_segments:
-            edge_colors = self.extract_edge_colors(img, edge_name, count)
-            
-            if direction == "reversed":
-                edge_colors = edge_colors[::-1]
-            
-            for i in range(count):
-                if current_led < self.config_snapshot['num_leds']:
-                    led_colors[current_led] = edge_colors[i]
-                    current_led += 1
-                else:
-                    break
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".ledrec",
+            filetypes=[("LED recordings", "*.ledrec"), ("All files", "*.*")]
+        )
         
-        return led_colors
-    
-    def smooth_colors(self, prev, curr):
-        """Apply color smoothing based on user settings"""
-        if prev is None:
-            return curr
-        
-        # Convert percentage to smoothing factor (0-95% max for stability)
-        smoothness = min(self.config_snapshot['smoothness_percent'] / 100.0 * 0.95, 0.95)
-        
-        # Responsiveness affects how much smoothing is applied
-        responsiveness = self.config_snapshot['responsiveness_percent'] / 100.0
-        effective_smoothness = smoothness * (1 - responsiveness * 0.3)  # Higher responsiveness = less smoothing
-        
-        arr_prev = np.array(prev, dtype=float)
-        arr_curr = np.array(curr, dtype=float)
-        smoothed = arr_prev * effective_smoothness + arr_curr * (1 - effective_smoothness)
-        return [tuple(map(int, c)) for c in smoothed]
+        if filename:
+            try:
+                self.engine.start_recording(filename)
+                self.status_label.config(text=f"Status: Ambilight running (recording to {filename})")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to start recording: {str(e)}")
     
-    def send_wled_drgb(self, led_colors):
-        """Send colors to WLED via UDP"""
-        try:
-            packet = bytearray()
-            packet.append(2)
-            packet.append(2)
-            
-            for r, g, b in led_colors:
-                packet.extend([b, g, r])
-            
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.sendto(packet, (self.config_snapshot['wled_ip'], self.config_snapshot['wled_port']))
-            sock.close()
-            
-        except Exception as e:
-            pass
+    def stop_recording(self):
+        """Stop recording the LED stream"""
+        if self.engine:
+            self.engine.stop_recording()
+            try:
+                self.status_label.config(text="Status: Ambilight running..." if self.ambilight_running else "Status: Stopped")
+            except tk.TclError:
+                pass
     
-    def ambilight_worker(self):
-        """Main ambilight processing loop"""
-        if not self.led_segments:
-            return
-        
-        try:
-            frame_count = 0
-            start_time = time.time()
-            last_fps_print = start_time
-            
-            while self.ambilight_running:
-                try:
-                    frame_start = time.time()
-                    
-                    with mss.mss() as sct:
-                        monitor = {
-                            'top': self.monitor_region[1],
-                            'left': self.monitor_region[0],
-                            'width': self.monitor_region[2],
-                            'height': self.monitor_region[3]
-                        }
-                        img = np.array(sct.grab(monitor))
-                    
-                    led_colors = self.get_led_colors_from_screen(img)
-                    led_colors = self.smooth_colors(self.prev_led_colors, led_colors)
-                    self.prev_led_colors = led_colors
-                    
-                    self.send_wled_drgb(led_colors)
-                    
-                    frame_count += 1
-                    
-                    now = time.time()
-                    if now - last_fps_print >= 3.0:
-                        elapsed = now - start_time
-                        fps = frame_count / elapsed
-                        print(f"\rFPS: {fps:.1f}, Frame: {frame_count}", end="")
-                        last_fps_print = now
-                    
-                    frame_time = time.time() - frame_start
-                    target_frame_time = 1.0 / 30.0
-                    sleep_time = max(0, target_frame_time - frame_time)
-                    
-                    if sleep_time > 0:
-                        time.sleep(sleep_time)
-                    
-                except Exception as e:
-                    time.sleep(0.1)
-                    
-        except Exception as e:
-            pass
-        finally:
-            self.ambilight_running = False
-
     def toggle_ambilight(self):
         """Toggle ambilight on/off"""
         if self.ambilight_running:
@@ -1490,8 +1622,24 @@ LED_STRIP_FLOW = [
             self.start_ambilight()
 
 def main():
+    parser = argparse.ArgumentParser(description="Ambilight LED strip configurator")
+    parser.add_argument("--config", help="configuration JSON to load at startup")
+    parser.add_argument("--auto-start", action="store_true",
+                        help="start streaming immediately (also enabled by auto_start in the configuration)")
+    args = parser.parse_args()
+    
     root = tk.Tk()
     app = AmbilightConfigGUI(root)
+    
+    if args.config:
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+        app.apply_configuration(config)
+        app.config_path = args.config
+        if args.auto_start or config.get("auto_start"):
+            # Start as soon as the main loop runs; the engine compiles its sampling layout before the first frame
+            root.after_idle(app.auto_start_ambilight)
+    
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,1399 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+import mss
+from ambilight_config import (WLED_PROTOCOLS, EFFECT_DEFAULTS, CAPTURE_PIPELINES, SAMPLING_MODES, DEFAULT_CAPTURE_RATE,
+                              DEFAULT_OUTPUT_RATE, REFERENCE_FRAME_TIME, make_target, make_source,
+                              smoothing_time_constant, make_config_snapshot)
+from frame_ring import EdgeStripFrame, FrameRing, edge_strip_depths
+from layout_cache import LayoutCache, layout_key
+from quality_control import QualityController
+from wled_transport import BatchedUDPSender, SENDMMSG_AVAILABLE
+
+# Target settings that determine the LED layout; changing them resets that target's smoothing state
+TARGET_LAYOUT_KEYS = ['num_leds', 'led_start_offset', 'led_segments']
+
+# Settings a running session keeps from its start; a reloaded configuration applies them on the next start
+RESTART_SETTINGS = ['capture_pipeline', 'batched_send']
+
+# WLED realtime UDP protocol parameters
+WLED_TIMEOUT_SECONDS = 2
+DNRGB_MAX_LEDS = 489
+DDP_MAX_LEDS = 480
+
+# Number of recent frame times kept for frame-interval and jitter statistics
+FRAME_TIME_WINDOW = 300
+
+# Per-target state a processed frame advances; restored when a torn pipelined frame is dropped
+SMOOTHING_STATE_KEYS = ['prev_led_colors', 'prev_sampled', 'cut_recovery', 'motion', 'last_time']
+
+# Seconds over which smoothing ramps back in after a detected scene cut (4 frames at the reference rate)
+SCENE_CUT_RECOVERY_TIME = 4 * REFERENCE_FRAME_TIME
+
+# Longest gap smoothing blends over; longer gaps (e.g. after a stall) are treated as this many seconds
+MAX_SMOOTHING_STEP = 1.0
+
+# Motion-adaptive smoothing: an LED whose color moves by this many levels per frame
+# (at the reference frame rate) keeps 1/e of the configured smoothing; static LEDs keep all of it.
+# The per-LED motion estimate averages changes with this half-life in seconds.
+ADAPTIVE_MOTION_SCALE = 24.0
+MOTION_HALF_LIFE = REFERENCE_FRAME_TIME
+
+# Letterbox/pillarbox detection: runs on a subsampled frame at a low rate. A row or column
+# is picture if enough of its pixels are brighter than the bar threshold. A new content
+# rectangle is only adopted after it has been seen on consecutive checks and differs from
+# the current one by more than the tolerance (fraction of the frame dimension).
+LETTERBOX_CHECK_INTERVAL = 1.0
+LETTERBOX_SUBSAMPLE = 8
+LETTERBOX_BLACK_LEVEL = 24
+LETTERBOX_MIN_CONTENT_FRACTION = 0.05
+LETTERBOX_MAX_BAR_FRACTION = 0.35
+LETTERBOX_CONFIRM_CHECKS = 3
+LETTERBOX_TOLERANCE = 0.01
+
+# Edge segment geometry: strip side, span along the edge in halves, and whether
+# the falloff weights are reversed (highest weight on the strip's last row/column)
+EDGE_GEOMETRY = {
+    'top': ('top', (0, 2), True),
+    'bottom': ('bottom', (0, 2), False),
+    'left': ('left', (0, 2), False),
+    'right': ('right', (0, 2), True),
+    'top_left': ('top', (0, 1), True),
+    'top_right': ('top', (1, 2), True),
+    'bottom_left': ('bottom', (0, 1), False),
+    'bottom_right': ('bottom', (1, 2), False),
+    'left_top': ('left', (0, 1), False),
+    'left_bottom': ('left', (1, 2), False),
+    'right_top': ('right', (0, 1), True),
+    'right_bottom': ('right', (1, 2), True),
+}
+
+# Robust zone statistics read a grid of pixels per zone: this many positions along the zone
+# times this many rows (columns) across the strip depth. The trimmed mean drops this fraction
+# at each end of every channel; the median is taken over block means of ZONE_BLOCK x ZONE_BLOCK
+# grid pixels; the dominant color averages the pixels of the most common 5-bit-per-channel code.
+ZONE_GRID_ALONG = 8
+ZONE_GRID_DEPTH = 8
+ZONE_TRIM_FRACTION = 0.25
+ZONE_BLOCK = 2
+DOMINANT_COLOR_BITS = 5
+
+# Fraction bits of the fixed-point depth weights; 255 * (1 << 16) still fits in uint32
+FIXED_POINT_BITS = 16
+
+
+def fixed_point_weights(weights):
+    """Depth weights as integers summing to exactly 1 << FIXED_POINT_BITS"""
+    fixed = np.rint(np.asarray(weights) * (1 << FIXED_POINT_BITS)).astype(np.int64)
+    # Put the rounding residue on the largest weight so a flat color samples back exactly
+    fixed[np.argmax(fixed)] += (1 << FIXED_POINT_BITS) - fixed.sum()
+    return fixed.astype(np.uint32)
+
+
+def strip_is_closed(target):
+    """Whether the target's segments run all the way around the frame, so its last LED sits next to its first"""
+    halves = sum(EDGE_GEOMETRY[edge][1][1] - EDGE_GEOMETRY[edge][1][0]
+                 for edge, count, _, _ in target['led_segments'] if count > 0 and edge in EDGE_GEOMETRY)
+    return halves >= 8
+
+
+def build_wled_packets(protocol, led_colors, timeout=WLED_TIMEOUT_SECONDS, sequence=0):
+    """Build the UDP datagrams that carry one frame of LED colors"""
+    # LED colors are kept in capture (BGR) order, the wire wants RGB
+    rgb = np.asarray(led_colors, dtype=np.uint8).reshape(-1, 3)[:, ::-1].tobytes()
+    num_leds = len(rgb) // 3
+    packets = []
+
+    if protocol == "dnrgb":
+        for start in range(0, num_leds, DNRGB_MAX_LEDS):
+            chunk = rgb[start * 3:(start + DNRGB_MAX_LEDS) * 3]
+            packets.append(bytes([4, timeout, start >> 8, start & 0xFF]) + chunk)
+
+    elif protocol == "ddp":
+        for start in range(0, num_leds, DDP_MAX_LEDS):
+            chunk = rgb[start * 3:(start + DDP_MAX_LEDS) * 3]
+            flags = 0x40  # version 1
+            if start + DDP_MAX_LEDS >= num_leds:
+                flags |= 0x01  # push on the last packet of the frame
+            # Sequence numbers run 1-15 per packet; 0 would mean "not used"
+            header = bytes([flags, (sequence + start // DDP_MAX_LEDS) % 15 + 1, 0x01, 0x01])
+            header += (start * 3).to_bytes(4, 'big') + len(chunk).to_bytes(2, 'big')
+            packets.append(header + chunk)
+
+    else:
+        packets.append(bytes([2, timeout]) + rgb)
+
+    return packets
+
+
+class ScreenCapture:
+    """Grab a screen region with mss, exposing each shot without copying it"""
+
+    def __init__(self, monitor_region):
+        self.monitor = {
+            'top': monitor_region[1],
+            'left': monitor_region[0],
+            'width': monitor_region[2],
+            'height': monitor_region[3]
+        }
+        self.sct = mss.mss()
+
+    def grab(self):
+        """Return the region as a read-only BGRA array backed by mss's own buffer"""
+        shot = self.sct.grab(self.monitor)
+        raw = shot.raw
+        img = np.ndarray((shot.height, shot.width, 4), dtype=np.uint8, buffer=raw,
+                         strides=(len(raw) // shot.height, 4, 1))
+        img.flags.writeable = False
+        return img
+
+    def grab_edges(self, frame):
+        """Grab only the four border strips of the region into an EdgeStripFrame"""
+        h, w = frame.shape[:2]
+        left, top = self.monitor['left'], self.monitor['top']
+        rects = {
+            'top': (left, top, w, frame.row_depth),
+            'bottom': (left, top + h - frame.row_depth, w, frame.row_depth),
+            'left': (left, top, frame.col_depth, h),
+            'right': (left + w - frame.col_depth, top, frame.col_depth, h),
+        }
+        for side, (x, y, width, height) in rects.items():
+            shot = self.sct.grab({'left': x, 'top': y, 'width': width, 'height': height})
+            raw = shot.raw
+            strip = np.ndarray((shot.height, shot.width, 4), dtype=np.uint8, buffer=raw,
+                               strides=(len(raw) // shot.height, 4, 1))
+            np.copyto(frame.strips[side], strip)
+
+    def close(self):
+        """Release the mss handle"""
+        self.sct.close()
+
+
+class AmbilightEngine:
+    """Capture the screen once per frame and drive one or more WLED targets"""
+
+    def __init__(self, config_snapshot, monitor_region):
+        self.config_snapshot = config_snapshot
+        self.monitor_region = monitor_region
+        self.running = False
+        self.thread = None
+
+        # Per-target runtime state, parallel to config_snapshot['targets']
+        self.target_states = []
+        self.send_pool = None
+        self.frame_sender = None
+
+        # Send-stage statistics
+        self.stats = {'frames': 0, 'send_time': 0.0, 'send_syscalls': 0, 'scene_cuts': 0}
+        self.frame_times = deque(maxlen=FRAME_TIME_WINDOW)
+
+        # Optional LED output recorder (see led_recording.py)
+        self.recorder = None
+
+        # Reloaded configuration waiting to be swapped in between frames
+        self.pending_config = None
+
+        # Precompiled edge samplers keyed by segment, frame size, content rectangle and sampling depth
+        self.edge_samplers = {}
+        self.layout_cache = None
+
+        # Compiled per-LED kernels (fused_kernel.py) for sampling_mode "numba"; False if Numba is missing
+        self.fused_kernels = None
+
+        # Quality-of-service controller (quality_control) and the overrides of its current level
+        self.quality_controller = None
+        self.quality = {}
+        self.edge_frame = None
+
+        # Thread pool sampling segments concurrently (sampling_threads); numpy and Numba release the GIL
+        self.sampling_pool = None
+        self.sampling_pool_size = 0
+
+        # Detected picture area (x0, y0, x1, y1) inside black bars; None samples the full frame
+        self.content_rect = None
+        self.letterbox = {'last_check': None, 'candidate': None, 'confirmations': 0, 'frame_shape': None}
+
+        # Optional replacement for screen capture; any object with grab() returning a BGR(A) image
+        self.frame_source = None
+
+        # Capture thread and frame ring of the pipelined capture modes
+        self.capture_thread = None
+        self.capture_ring = None
+
+        # Output thread for interpolated sending at output_rate_hz
+        self.output_thread = None
+        self.output_lock = threading.Lock()
+
+    def start(self):
+        """Start the processing loop in a background thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.ambilight_worker, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=1):
+        """Stop the processing loop"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=timeout)
+
+    def update_settings(self, settings):
+        """Apply changed settings (effect sliders etc.) to the running engine"""
+        self.config_snapshot.update(settings)
+
+    def reload_config(self, config_snapshot):
+        """Queue a complete new configuration; the processing loop swaps it in between frames"""
+        self.pending_config = config_snapshot
+
+    def target_layout_changed(self, old_targets, new_targets):
+        """Indices of targets whose LED layout differs, or None if targets were added or removed"""
+        if len(old_targets) != len(new_targets):
+            return None
+        return [i for i, (old, new) in enumerate(zip(old_targets, new_targets))
+                if any(old.get(key) != new.get(key) for key in TARGET_LAYOUT_KEYS)]
+
+    def apply_pending_config(self):
+        """Swap in a reloaded configuration; returns whether the LED layout changed"""
+        snapshot, self.pending_config = self.pending_config, None
+        if snapshot is None:
+            return False
+
+        snapshot = dict(snapshot)
+        for key in RESTART_SETTINGS:
+            snapshot.pop(key, None)
+        # Sending moves to or from the output thread only at start; the rate itself can change
+        if bool(snapshot.get('output_rate_hz')) != bool(self.config_snapshot.get('output_rate_hz')):
+            snapshot.pop('output_rate_hz', None)
+
+        changed = self.target_layout_changed(self.config_snapshot['targets'], snapshot['targets'])
+        sources_changed = snapshot.get('sources') != self.config_snapshot.get('sources')
+        with self.output_lock:
+            self.config_snapshot.update(snapshot)
+            if changed is None:
+                # Targets added or removed: new senders and state for all of them
+                send = self.frame_sender is not None or any(state['sender'] for state in self.target_states)
+                self.close_targets()
+                self.open_targets(send)
+            else:
+                # Targets that only changed address, protocol or effects keep their state
+                for i in changed:
+                    old_state = self.target_states[i]
+                    self.target_states[i] = self.make_target_state(snapshot['targets'][i], old_state['sender'])
+                    self.target_states[i]['sequence'] = old_state['sequence']
+
+        # Keep compiled samplers of unchanged segments; the rest are compiled for the next frame
+        used = {(edge_type, count) for target in snapshot['targets'] for edge_type, count, _, _ in target['led_segments']}
+        self.edge_samplers = {key: sampler for key, sampler in self.edge_samplers.items() if key[:2] in used}
+        if not self.frame_source:
+            self.compile_layout(self.monitor_region[3], self.monitor_region[2])
+        return changed != [] or sources_changed
+
+    def get_stats(self):
+        """Frame rate, frame-interval jitter and send-stage statistics"""
+        frame_times = np.array(self.frame_times)
+        sent_frames = max(1, self.stats['frames'])
+        stats = {
+            'frames': self.stats['frames'],
+            'scene_cuts': self.stats['scene_cuts'],
+            'send_us': self.stats['send_time'] / sent_frames * 1e6,
+            'syscalls_per_frame': self.stats['send_syscalls'] / sent_frames,
+        }
+        if len(frame_times) > 2:
+            intervals = np.diff(frame_times) * 1000
+            stats['fps'] = 1000.0 / float(np.mean(intervals))
+            stats['interval_ms'] = float(np.mean(intervals))
+            stats['max_interval_ms'] = float(np.max(intervals))
+            # Mean absolute change between consecutive intervals, as measured by wled_receiver_sim
+            stats['jitter_ms'] = float(np.mean(np.abs(np.diff(intervals))))
+        if self.quality_controller:
+            stats.update(self.quality_controller.get_stats(time.perf_counter()))
+        if self.numba_missing():
+            stats['numba_missing'] = True
+        return stats
+
+    def start_recording(self, path):
+        """Record every transmitted frame to path"""
+        from led_recording import LEDRecorder
+        self.stop_recording()
+        led_counts = [target['num_leds'] for target in self.config_snapshot['targets']]
+        self.recorder = LEDRecorder(path, led_counts)
+
+    def stop_recording(self):
+        """Stop recording and finalize the file"""
+        recorder, self.recorder = self.recorder, None
+        if recorder:
+            recorder.close()
+
+    def open_targets(self, send=True):
+        """Create senders and smoothing state for every output target"""
+        targets = self.config_snapshot['targets']
+        # Opt-in: all datagrams of a frame, for every target, go out in one sendmmsg call.
+        # On loopback it is slower than a sendto loop, so it stays off until it wins on a real NIC.
+        batched = send and self.config_snapshot.get('batched_send') and SENDMMSG_AVAILABLE
+        self.target_states = [self.make_target_state(target, BatchedUDPSender() if send and not batched else None)
+                              for target in targets]
+
+        if not send:
+            return
+        if batched:
+            self.frame_sender = BatchedUDPSender(use_sendmmsg=True)
+        elif len(targets) > 1:
+            # Send to several controllers at once so one slow target does not delay the rest
+            self.send_pool = ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="wled-send")
+
+    def make_target_state(self, target, sender):
+        """Fresh smoothing and output state for one target"""
+        used_leds = sum(count for _, count, _, _ in target['led_segments'])
+        return {
+            'prev_led_colors': None,
+            'prev_sampled': None,
+            'cut_recovery': 0,
+            'motion': None,
+            # Spatial smoothing: (radius, gather indices, kernel) for the current radius
+            'spatial': None,
+            # Interpolation buffers: the two most recent processed frames and the output scratch
+            'interp_frames': None,
+            'interp_times': [None, None],
+            'interp_work': None,
+            'interp_out': None,
+            # LEDs driven by segments; skipped LEDs stay black and would dilute cut detection
+            'active': slice(target['led_start_offset'],
+                            min(target['num_leds'], target['led_start_offset'] + used_leds)),
+            'sequence': 0,
+            'sender': sender,
+        }
+
+    def save_smoothing_state(self):
+        """Copy of every target's smoothing state, to undo a frame that is dropped after processing"""
+        # Arrays are copied because the compiled kernels update the motion estimate in place
+        return [{key: state[key].copy() if isinstance(state.get(key), np.ndarray) else state.get(key)
+                 for key in SMOOTHING_STATE_KEYS} for state in self.target_states]
+
+    def restore_smoothing_state(self, saved):
+        for state, values in zip(self.target_states, saved):
+            state.update(values)
+
+    def close_targets(self):
+        """Release senders and the send pool"""
+        if self.send_pool:
+            self.send_pool.shutdown(wait=False)
+            self.send_pool = None
+        if self.frame_sender:
+            self.frame_sender.close()
+            self.frame_sender = None
+        for state in self.target_states:
+            if state['sender']:
+                state['sender'].close()
+        self.target_states = []
+
+    def get_send_syscalls(self):
+        """Total number of send syscalls issued so far"""
+        total = sum(state['sender'].syscalls for state in self.target_states if state['sender'])
+        if self.frame_sender:
+            total += self.frame_sender.syscalls
+        return total
+
+    def enhance_colors(self, colors):
+        """Apply brightness and color intensity adjustments to an (N, 3) array of zone colors"""
+        brightness = self.config_snapshot['brightness_percent'] / 100.0
+        color_intensity = self.config_snapshot['color_intensity_percent'] / 100.0
+
+        colors = np.asarray(colors, dtype=float)
+
+        # Apply color intensity (saturation scaling at constant hue and value). In HSV terms every
+        # channel sits (V - c) below the maximum V, and that distance is proportional to S, so
+        # scaling S moves each channel towards or away from V; S is capped at 1 as before.
+        if color_intensity != 1.0:
+            colors = np.floor(colors)
+            value = colors.max(axis=1, keepdims=True)
+            spread = value - colors.min(axis=1, keepdims=True)
+            max_scale = np.divide(value, spread, out=np.full_like(value, color_intensity), where=spread > 0)
+            colors = np.rint(value - (value - colors) * np.minimum(color_intensity, max_scale))
+
+        # Apply brightness
+        colors = np.clip(colors * brightness, 0, 255)
+
+        return colors.astype(int)
+
+    def compile_edge_sampler(self, edge_type, count, h, w, content_rect=None):
+        """Precompute strip slices, weights and zone boundaries for one edge segment"""
+        geometry = EDGE_GEOMETRY.get(edge_type)
+        if geometry is None:
+            return None
+        side, (half_start, half_end), weights_reversed = geometry
+
+        # Sample the edges of the picture area rather than the black bars around it
+        x0, y0 = 0, 0
+        if content_rect is not None:
+            x0, y0, x1, y1 = content_rect
+            h, w = y1 - y0, x1 - x0
+
+        # Use color_depth_percent for sampling area size (partial top/bottom edges have always used the width)
+        depth = self.sampling_depth_percent() / 100.0
+        if edge_type in ('top', 'bottom'):
+            avg_size = max(1, int(depth * h))
+        else:
+            avg_size = max(1, int(depth * w))
+
+        # For falloff, create weights (closer to edge = higher weight)
+        falloff_exp = 0.01 + (0 / 10) * (0.25 - 0.01)  # Use same as working version
+        weights = np.exp(-falloff_exp * np.arange(avg_size))
+        if weights_reversed:
+            weights = weights[::-1]
+
+        # Reduced quality levels sample every stride-th row and column of the strip
+        stride = self.sample_stride()
+        weights = weights[::stride]
+        weights = weights / np.sum(weights)
+
+        # Zones run along the edge; the strip is cut to just the span this segment covers
+        length = w if side in ('top', 'bottom') else h
+        start = length * half_start // 2
+        end = length * half_end // 2
+        bounds = np.linspace(start, end, count + 1, dtype=int)
+        # Zone boundaries as indices into the (strided) strip
+        bounds = -((start - bounds) // stride)
+        span = bounds[-1]
+
+        depth_slice = {'top': slice(y0, y0 + avg_size, stride), 'bottom': slice(y0 + h - avg_size, y0 + h, stride),
+                       'left': slice(x0, x0 + avg_size, stride), 'right': slice(x0 + w - avg_size, x0 + w, stride)}[side]
+        if side in ('top', 'bottom'):
+            strip_index = (depth_slice, slice(x0 + start, x0 + end, stride))
+        else:
+            strip_index = (slice(y0 + start, y0 + end, stride), depth_slice)
+
+        widths = np.diff(bounds)
+        zone_starts = np.minimum(bounds[:-1], max(0, span - 1))
+        zone_widths = np.maximum(widths, 1)[:, None]
+
+        # Pixel grid of the robust zone statistics, spread evenly over each zone and the depth
+        along = zone_starts[:, None] + (np.arange(ZONE_GRID_ALONG) + 0.5) * zone_widths // ZONE_GRID_ALONG
+        across = (np.arange(ZONE_GRID_DEPTH) + 0.5) * len(weights) // ZONE_GRID_DEPTH
+        sampler = {
+            'side': side,
+            'strip_index': strip_index,
+            'weights': weights,
+            'weights_fixed': fixed_point_weights(weights),
+            'zone_starts': zone_starts,
+            'zone_widths': zone_widths,
+            'zone_grid': np.minimum(along, max(0, span - 1)).astype(np.intp),
+            'depth_grid': across.astype(np.intp),
+            'count': count,
+        }
+        excluded = self.exclusion_mask(strip_index)
+        if excluded is not None:
+            self.apply_exclusions(sampler, excluded)
+        return sampler
+
+    def exclusion_mask(self, strip_index):
+        """Which pixels of a strip lie in an exclusion rectangle, or None if none do"""
+        rects = self.config_snapshot.get('exclusion_rects')
+        if not rects:
+            return None
+        rows, cols = strip_index
+        ys = np.arange(rows.start, rows.stop, rows.step or 1)
+        xs = np.arange(cols.start, cols.stop, cols.step or 1)
+        excluded = np.zeros((len(ys), len(xs)), dtype=bool)
+        for x, y, width, height in rects:
+            excluded |= ((ys >= y) & (ys < y + height))[:, None] & ((xs >= x) & (xs < x + width))[None, :]
+        return excluded if excluded.any() else None
+
+    def apply_exclusions(self, sampler, excluded):
+        """Fold excluded pixels (a mask in strip layout) into the sampler as zero weights"""
+        # Exclusions are rectangles, so the mask only changes at a few positions along the edge:
+        # within each run of equal columns (rows) the weights stay separable, with the excluded
+        # depth positions zeroed. Zone sums are renormalized by the weight left in the zone;
+        # zones left without any pixel sample black.
+        valid = ~excluded if sampler['side'] in ('left', 'right') else ~excluded.T
+        run_starts = np.flatnonzero(np.concatenate(([True], np.any(valid[1:] != valid[:-1], axis=1))))
+        run_weights = valid[run_starts] * sampler['weights']
+        run_lengths = np.diff(np.append(run_starts, len(valid)))
+        line_weights = np.repeat(run_weights.sum(axis=1), run_lengths)
+        zone_starts = sampler['zone_starts']
+        zone_weights = np.add.reduceat(line_weights, zone_starts)
+        depth = np.arange(valid.shape[1])
+        sampler['run_starts'] = run_starts
+        sampler['run_weights'] = run_weights
+        sampler['run_depths'] = np.stack([np.where(valid[run_starts], depth, len(depth)).min(axis=1),
+                                          np.where(valid[run_starts], depth + 1, 0).max(axis=1)], axis=1)
+        sampler['zone_scale'] = np.divide(1.0, zone_weights, out=np.zeros(len(zone_weights)),
+                                          where=zone_weights > 0)[:, None]
+        sampler['zone_valid'] = zone_weights > 0
+
+        # Robust statistics: zones whose grid touches an excluded pixel take their grid evenly
+        # from the zone's remaining pixels instead
+        count = len(zone_starts)
+        along = np.repeat(sampler['zone_grid'][:, :, None], ZONE_GRID_DEPTH, axis=2)
+        across = np.repeat(sampler['depth_grid'][None, None, :], count, axis=0).repeat(ZONE_GRID_ALONG, axis=1)
+        zone_ends = np.maximum(np.append(zone_starts[1:], len(valid)), zone_starts + 1)
+        for zone in np.flatnonzero(~valid[along, across].all(axis=(1, 2))):
+            pixels = np.argwhere(valid[zone_starts[zone]:zone_ends[zone]])
+            if len(pixels) == 0:
+                continue
+            picked = pixels[np.arange(along[zone].size) * len(pixels) // along[zone].size]
+            along[zone] = (picked[:, 0] + zone_starts[zone]).reshape(along[zone].shape)
+            across[zone] = picked[:, 1].reshape(across[zone].shape)
+        sampler['zone_grid'] = along
+        sampler['depth_grid'] = across
+
+    def sampler_key(self, edge_type, count, h, w):
+        """Cache key of the compiled sampler for one segment at the current geometry, depth and stride"""
+        return (edge_type, count, h, w, self.content_rect, self.sampling_depth_percent(), self.sample_stride(),
+                self.config_snapshot.get('exclusion_rects'))
+
+    def sampling_depth_percent(self):
+        """Configured sampling depth, reduced at lower quality levels"""
+        return self.config_snapshot['color_depth_percent'] * self.quality.get('depth_scale', 1.0)
+
+    def sample_stride(self):
+        return self.quality.get('sample_stride', 1)
+
+    def frame_interval(self):
+        """Target time per captured frame, stretched at the lowest quality levels"""
+        rate = (self.config_snapshot.get('capture_rate_hz') or DEFAULT_CAPTURE_RATE) * self.quality.get('rate_scale', 1.0)
+        return 1.0 / rate
+
+    def get_layout_cache(self):
+        """On-disk cache of compiled layouts, or None if disabled"""
+        cache_mb = self.config_snapshot.get('layout_cache_mb', 0)
+        if not cache_mb:
+            return None
+        if self.layout_cache is None:
+            self.layout_cache = LayoutCache(max_bytes=int(cache_mb * 1024 * 1024))
+        return self.layout_cache
+
+    def compile_layout(self, h, w):
+        """Compile, or load from the layout cache, every target's edge samplers for an h x w capture"""
+        depth_percent = self.sampling_depth_percent()
+        cache = self.get_layout_cache()
+        for target in self.config_snapshot['targets']:
+            segments = [(edge_type, count) for edge_type, count, _, _ in target['led_segments']]
+            keys = [self.sampler_key(edge_type, count, h, w) for edge_type, count in segments]
+            if all(key in self.edge_samplers for key in keys):
+                continue
+
+            cache_key = layout_key(target, h, w, depth_percent, self.content_rect, self.sample_stride(),
+                                   self.config_snapshot.get('exclusion_rects')) if cache else None
+            samplers = cache.load(cache_key) if cache else None
+            if samplers is None or len(samplers) != len(segments):
+                samplers = [self.edge_samplers[key] if key in self.edge_samplers
+                            else self.compile_edge_sampler(edge_type, count, h, w, self.content_rect)
+                            for key, (edge_type, count) in zip(keys, segments)]
+                if cache:
+                    cache.store(cache_key, samplers)
+            self.edge_samplers.update(zip(keys, samplers))
+
+    def get_sampler(self, edge_type, count, h, w):
+        """Compiled sampler of one segment for an h x w frame (None for unknown edges)"""
+        key = self.sampler_key(edge_type, count, h, w)
+        sampler = self.edge_samplers.get(key)
+        if sampler is None and key not in self.edge_samplers:
+            # Samplers for another depth, stride, picture area or exclusions will not be used again
+            self.edge_samplers = {old: sampler for old, sampler in self.edge_samplers.items() if old[4:] == key[4:]}
+            # New geometry or depth: bring in the whole layout at once (usually from the cache)
+            self.compile_layout(h, w)
+            if key not in self.edge_samplers:
+                self.edge_samplers[key] = self.compile_edge_sampler(edge_type, count, h, w, self.content_rect)
+            sampler = self.edge_samplers[key]
+        return sampler
+
+    def extract_edge_colors(self, img, edge_type, count):
+        """Extract colors from screen edges using a precompiled sampler"""
+        h, w = img.shape[:2]
+        sampler = self.get_sampler(edge_type, count, h, w)
+        if sampler is None or count == 0:
+            return []
+        return [tuple(color) for color in self.sample_zones(img, sampler).tolist()]
+
+    def sample_zones(self, img, sampler):
+        """Enhanced (count, 3) zone colors of one compiled segment"""
+        # Reduce the strip across its depth with the falloff weights, then average each zone.
+        # BGRA input is consumed as-is; the alpha column is dropped from the small result.
+        strip = img[sampler['strip_index']]
+        statistic = self.config_snapshot.get('zone_statistic', "mean")
+        if statistic != "mean":
+            colors = self.robust_zone_colors(strip, sampler, statistic)
+            if 'zone_valid' in sampler:
+                colors = colors * sampler['zone_valid'][:, None]
+            return self.enhance_colors(colors)
+        if 'run_starts' in sampler:
+            # Strips with excluded areas: one weighted reduction per run (float in every sampling mode)
+            top_bottom = sampler['side'] in ('top', 'bottom')
+            bounds = np.append(sampler['run_starts'], strip.shape[1] if top_bottom else strip.shape[0])
+            profile = np.empty((bounds[-1], 4))
+            for weights, (first, last), start, end in zip(sampler['run_weights'], sampler['run_depths'],
+                                                         bounds[:-1], bounds[1:]):
+                # Only the depth range that still has weight is read
+                if top_bottom:
+                    profile[start:end] = np.tensordot(weights[first:last], strip[first:last, start:end], axes=([0], [0]))
+                else:
+                    profile[start:end] = np.tensordot(strip[start:end, first:last], weights[first:last], axes=([1], [0]))
+            profile = profile[:, :3]
+            return self.enhance_colors(np.add.reduceat(profile, sampler['zone_starts'], axis=0) * sampler['zone_scale'])
+        if self.config_snapshot.get('sampling_mode') == "fixed":
+            return self.enhance_colors(self.sample_zones_fixed(strip, sampler))
+        if sampler['side'] in ('top', 'bottom'):
+            profile = np.tensordot(sampler['weights'], strip, axes=([0], [0]))
+        else:
+            profile = np.tensordot(strip, sampler['weights'], axes=([1], [0]))
+        zone_avgs = np.add.reduceat(profile[:, :3], sampler['zone_starts'], axis=0) / sampler['zone_widths']
+        return self.enhance_colors(zone_avgs)
+
+    def zone_pixels(self, strip, sampler):
+        """(count, ZONE_GRID_ALONG * ZONE_GRID_DEPTH, 3) grid pixels of every zone, along-major"""
+        along, across = sampler['zone_grid'], sampler['depth_grid']
+        if along.ndim == 2:
+            # The same depth positions for every zone (no exclusions)
+            along, across = along[:, :, None], across[None, None, :]
+        if sampler['side'] in ('top', 'bottom'):
+            pixels = strip[across, along]
+        else:
+            pixels = strip[along, across]
+        return pixels[..., :3].reshape(len(along), -1, 3)
+
+    def robust_zone_colors(self, strip, sampler, statistic):
+        """(count, 3) zone colors by a robust statistic, computed for all zones at once"""
+        pixels = self.zone_pixels(strip, sampler)
+        count, samples = pixels.shape[:2]
+
+        if statistic == "trimmed_mean":
+            # Per-channel rows of uint8 values sort with a radix sort (kind='stable')
+            channels = np.sort(np.ascontiguousarray(pixels.transpose(0, 2, 1)), axis=-1, kind='stable')
+            trim = int(samples * ZONE_TRIM_FRACTION)
+            return channels[:, :, trim:samples - trim].sum(axis=-1, dtype=np.uint32) / (samples - 2 * trim)
+
+        if statistic == "median":
+            # Sums of ZONE_BLOCK x ZONE_BLOCK neighbouring grid pixels, then the median block
+            grid = pixels.reshape(count, ZONE_GRID_ALONG // ZONE_BLOCK, ZONE_BLOCK,
+                                  ZONE_GRID_DEPTH // ZONE_BLOCK, ZONE_BLOCK, 3)
+            blocks = sum(grid[:, :, i, :, j].astype(np.uint16) for i in range(ZONE_BLOCK) for j in range(ZONE_BLOCK))
+            blocks = np.ascontiguousarray(blocks.reshape(count, -1, 3).transpose(0, 2, 1))
+            return np.median(blocks, axis=-1) / ZONE_BLOCK ** 2
+
+        # Dominant color: pack each pixel into a 15-bit code and count codes per zone. The histogram
+        # is kept sparse (run lengths of the sorted zone-tagged codes); a dense one would need
+        # 32768 bins per zone. The zone color is the mean of the pixels sharing the winning code.
+        shift = 8 - DOMINANT_COLOR_BITS
+        quantized = (pixels >> shift).astype(np.int64)
+        codes = (quantized[..., 0] << (2 * DOMINANT_COLOR_BITS)) | (quantized[..., 1] << DOMINANT_COLOR_BITS) \
+            | quantized[..., 2]
+        keys = codes + (np.arange(count) << (3 * DOMINANT_COLOR_BITS))[:, None]
+        ordered = np.sort(keys.ravel())
+        run_starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1])))
+        run_keys = ordered[run_starts]
+        run_lengths = np.diff(np.append(run_starts, len(ordered)))
+        # Runs are sorted by zone; on ties the lowest code (first run reaching the maximum) wins
+        run_zones = run_keys >> (3 * DOMINANT_COLOR_BITS)
+        best = np.maximum.reduceat(run_lengths, np.searchsorted(run_zones, np.arange(count)))
+        candidates = np.flatnonzero(run_lengths == best[run_zones])
+        first = np.ones(len(candidates), dtype=bool)
+        first[1:] = run_zones[candidates[1:]] != run_zones[candidates[:-1]]
+        selected = (keys == run_keys[candidates[first]][:, None]).astype(np.float32)
+        return np.matmul(selected[:, None, :], pixels.astype(np.float32))[:, 0] / best[:, None]
+
+    def sample_segment_into(self, img, sampler, out, reverse):
+        """Sample one segment into its slice of a target's LED array (runs on the sampling pool); returns its zone colors"""
+        colors = self.sample_zones(img, sampler)
+        self.place_segment(colors, out, reverse)
+        return colors
+
+    def place_segment(self, colors, out, reverse):
+        """Write a segment's zone colors into its slice of a target's LED array"""
+        if reverse:
+            colors = colors[::-1]
+        out[:] = colors[:len(out)]
+
+    def get_sampling_pool(self):
+        """Persistent thread pool for concurrent segment sampling, or None if sampling_threads < 2"""
+        threads = int(self.config_snapshot.get('sampling_threads') or 0)
+        if threads < 2:
+            return None
+        if self.sampling_pool is None or self.sampling_pool_size != threads:
+            self.close_sampling_pool()
+            self.sampling_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="edge-sample")
+            self.sampling_pool_size = threads
+        return self.sampling_pool
+
+    def close_sampling_pool(self):
+        if self.sampling_pool:
+            self.sampling_pool.shutdown(wait=False)
+            self.sampling_pool = None
+
+    def get_led_colors_parallel(self, img, target, pool, zone_cache=None):
+        """Sample a target's segments concurrently; each task fills its own slice of the LED array"""
+        h, w = img.shape[:2]
+        num_leds = target['num_leds']
+        led_colors = np.zeros((num_leds, 3), dtype=int)
+        if zone_cache is None:
+            zone_cache = {}
+        futures = []
+        current_led = target['led_start_offset']
+        for edge_name, count, description, direction in target['led_segments']:
+            if current_led >= num_leds:
+                break
+            # Samplers are looked up (and compiled) here, so the pool threads only read them
+            sampler = self.get_sampler(edge_name, count, h, w)
+            if sampler is None or count == 0:
+                continue
+            out = led_colors[current_led:current_led + count]
+            # Segments shared between targets are only sampled once per frame
+            colors = zone_cache.get((edge_name, count))
+            if colors is not None:
+                self.place_segment(colors, out, direction == "reversed")
+            else:
+                futures.append(((edge_name, count),
+                                pool.submit(self.sample_segment_into, img, sampler, out, direction == "reversed")))
+            current_led += count
+        for key, future in futures:
+            zone_cache[key] = future.result()
+        return led_colors
+
+    def sample_zones_fixed(self, strip, sampler):
+        """Zone colors of one strip in fixed point: uint32 accumulation, uint8 (N, 3) result"""
+        weights = sampler['weights_fixed']
+        if sampler['side'] in ('top', 'bottom'):
+            profile = np.einsum('i,ijk->jk', weights, strip, dtype=np.uint32, casting='unsafe')
+        else:
+            profile = np.matmul(strip.transpose(0, 2, 1), weights, dtype=np.uint32, casting='unsafe')
+
+        # Drop 8 of the 16 fraction bits so zone sums along even an 8K edge stay within 32 bits
+        profile = profile[:, :3] >> (FIXED_POINT_BITS - 8)
+        zone_sums = np.add.reduceat(profile, sampler['zone_starts'], axis=0, dtype=np.uint32)
+        return (zone_sums // (sampler['zone_widths'].astype(np.uint32) << 8)).astype(np.uint8)
+
+    def detect_content_rect(self, img):
+        """Find the picture area inside black bars on a subsampled frame, or None if it is all dark"""
+        h, w = img.shape[:2]
+        small = img[::LETTERBOX_SUBSAMPLE, ::LETTERBOX_SUBSAMPLE, :3].max(axis=2) > LETTERBOX_BLACK_LEVEL
+        rows = np.flatnonzero(small.mean(axis=1) > LETTERBOX_MIN_CONTENT_FRACTION)
+        cols = np.flatnonzero(small.mean(axis=0) > LETTERBOX_MIN_CONTENT_FRACTION)
+        if len(rows) == 0 or len(cols) == 0:
+            return None
+
+        # Bars are symmetric; the thicker side wins so subtitles drawn into one bar are ignored
+        bar_y = int(max(rows[0], small.shape[0] - 1 - rows[-1])) * LETTERBOX_SUBSAMPLE
+        bar_x = int(max(cols[0], small.shape[1] - 1 - cols[-1])) * LETTERBOX_SUBSAMPLE
+        bar_y = min(bar_y, int(h * LETTERBOX_MAX_BAR_FRACTION))
+        bar_x = min(bar_x, int(w * LETTERBOX_MAX_BAR_FRACTION))
+        return (bar_x, bar_y, w - bar_x, h - bar_y)
+
+    def update_content_rect(self, img, timestamp):
+        """Periodically re-detect black bars and adopt a new content rectangle once it is stable"""
+        letterbox = self.letterbox
+        if not self.config_snapshot.get('letterbox_detection'):
+            self.content_rect = None
+            letterbox['last_check'] = None
+            return
+
+        # Edge-strip frames do not contain the picture area the detector needs
+        if not isinstance(img, np.ndarray):
+            self.content_rect = None
+            return
+
+        h, w = img.shape[:2]
+        if letterbox['frame_shape'] != (h, w):
+            letterbox['frame_shape'] = (h, w)
+            letterbox['last_check'] = None
+            letterbox['candidate'] = None
+            self.content_rect = None
+        if letterbox['last_check'] is not None and timestamp - letterbox['last_check'] < LETTERBOX_CHECK_INTERVAL:
+            return
+        letterbox['last_check'] = timestamp
+
+        # Dark scenes say nothing about the bars; keep the current rectangle
+        detected = self.detect_content_rect(img)
+        if detected is None:
+            return
+        if detected == (0, 0, w, h):
+            detected = None
+
+        # Ignore changes within the tolerance, then require agreement over several checks
+        current = self.content_rect or (0, 0, w, h)
+        candidate = detected or (0, 0, w, h)
+        tolerance = (w * LETTERBOX_TOLERANCE, h * LETTERBOX_TOLERANCE, w * LETTERBOX_TOLERANCE, h * LETTERBOX_TOLERANCE)
+        if all(abs(a - b) <= t for a, b, t in zip(candidate, current, tolerance)):
+            letterbox['candidate'] = None
+            letterbox['confirmations'] = 0
+            return
+        if letterbox['candidate'] != candidate:
+            letterbox['candidate'] = candidate
+            letterbox['confirmations'] = 1
+        else:
+            letterbox['confirmations'] += 1
+        if letterbox['confirmations'] >= LETTERBOX_CONFIRM_CHECKS:
+            # Samplers for the old rectangle will not be used again
+            self.content_rect = detected
+            self.edge_samplers.clear()
+            letterbox['candidate'] = None
+            letterbox['confirmations'] = 0
+
+    def get_led_colors_from_screen(self, img, target, zone_cache=None):
+        """Map screen colors to LED positions for one target"""
+        led_colors = [(0, 0, 0)] * target['num_leds']
+        current_led = target['led_start_offset']
+
+        # Segments shared between targets are only sampled once per frame
+        if zone_cache is None:
+            zone_cache = {}
+
+        for edge_name, count, description, direction in target['led_segments']:
+            edge_colors = zone_cache.get((edge_name, count))
+            if edge_colors is None:
+                edge_colors = self.extract_edge_colors(img, edge_name, count)
+                zone_cache[(edge_name, count)] = edge_colors
+
+            if direction == "reversed":
+                edge_colors = edge_colors[::-1]
+
+            for i in range(count):
+                if current_led < target['num_leds']:
+                    led_colors[current_led] = edge_colors[i]
+                    current_led += 1
+                else:
+                    break
+
+        return led_colors
+
+    def scene_cut_factor(self, state, arr_curr, dt):
+        """Scale for the smoothing factor: 0 right after a hard cut, ramping back to 1"""
+        prev_sampled = state['prev_sampled']
+        state['prev_sampled'] = arr_curr
+
+        delta = None
+        if self.config_snapshot.get('scene_cut_percent', 0) > 0 and prev_sampled is not None \
+                and prev_sampled.shape == arr_curr.shape:
+            active = state['active']
+            delta = np.abs(arr_curr[active] - prev_sampled[active]).mean() if arr_curr[active].size else 0.0
+        return self.cut_recovery_factor(state, delta, dt)
+
+    def cut_recovery_factor(self, state, delta, dt):
+        """Start a cut recovery if the mean sampled change delta is a hard cut; returns the smoothing scale"""
+        # Sensitivity 0 disables detection; 100 triggers on a mean change of 8 levels
+        sensitivity = self.config_snapshot.get('scene_cut_percent', 0)
+        if sensitivity > 0 and delta is not None:
+            threshold = 8 + (100 - sensitivity) * 0.72
+            if delta > threshold:
+                state['cut_recovery'] = SCENE_CUT_RECOVERY_TIME
+                self.stats['scene_cuts'] += 1
+
+        # cut_recovery is the remaining recovery time in seconds
+        if state['cut_recovery'] <= 0:
+            return 1.0
+        factor = 1.0 - state['cut_recovery'] / SCENE_CUT_RECOVERY_TIME
+        # Rounding must not leave a sliver of recovery time for one more frame
+        remaining = state['cut_recovery'] - dt
+        state['cut_recovery'] = remaining if remaining > 1e-6 else 0.0
+        return factor
+
+    def get_smoothing_time_constant(self):
+        """Smoothing time constant in seconds; 'smoothing_time_ms' overrides the sliders"""
+        time_ms = self.config_snapshot.get('smoothing_time_ms')
+        if time_ms:
+            return time_ms / 1000.0
+        return smoothing_time_constant(self.config_snapshot['smoothness_percent'],
+                                       self.config_snapshot['responsiveness_percent'])
+
+    def frame_dt(self, state, timestamp):
+        """Time since the target's previous frame, capped for smoothing"""
+        # Blend by elapsed time rather than per frame so the look does not depend on the frame rate
+        dt = REFERENCE_FRAME_TIME
+        if state is not None and timestamp is not None:
+            if state.get('last_time') is not None:
+                dt = min(max(timestamp - state['last_time'], 0.0), MAX_SMOOTHING_STEP)
+            state['last_time'] = timestamp
+        return dt
+
+    def frame_smoothness(self, dt):
+        """Weight of the previous output after dt seconds"""
+        time_constant = self.get_smoothing_time_constant()
+        return math.exp(-dt / time_constant) if time_constant > 0 else 0.0
+
+    def spatial_filter(self, colors, target, state):
+        """Blur LED colors along the physical strip with a triangular kernel of spatial_smoothing LEDs per side"""
+        radius = int(self.config_snapshot.get('spatial_smoothing') or 0)
+        active = state['active']
+        num_active = active.stop - active.start
+        if radius <= 0 or num_active < 2:
+            return colors
+
+        # LED order is strip order (reversed segments are already flipped), so the neighbours of an
+        # LED are the adjacent indices. A strip that runs all the way around the frame wraps from its
+        # last LED to its first; an open one repeats its end LEDs.
+        spatial = state['spatial']
+        if spatial is None or spatial[0] != radius:
+            offsets = np.arange(-radius, num_active + radius)
+            closed = strip_is_closed(target) and \
+                num_active == sum(count for _, count, _, _ in target['led_segments'])
+            leds = active.start + (offsets % num_active if closed else np.clip(offsets, 0, num_active - 1))
+            # Gather into channel-major order: three padded rows, filtered by one 1D convolution
+            indices = (leds[None, :] * 3 + np.arange(3)[:, None]).ravel()
+            kernel = radius + 1 - np.abs(np.arange(-radius, radius + 1))
+            spatial = state['spatial'] = (radius, indices, kernel / kernel.sum())
+        _, indices, kernel = spatial
+
+        colors = np.asarray(colors)
+        filtered = np.convolve(colors.reshape(-1)[indices], kernel, 'same').reshape(3, -1)
+        colors[active] = np.rint(filtered[:, radius:radius + num_active].T)
+        return colors
+
+    def smooth_colors(self, prev, curr, state=None, timestamp=None):
+        """Apply color smoothing based on user settings and the time since the last frame"""
+        arr_curr = np.array(curr, dtype=float)
+        dt = self.frame_dt(state, timestamp)
+        cut_factor = self.scene_cut_factor(state, arr_curr, dt) if state is not None else 1.0
+        if prev is None:
+            return curr
+
+        effective_smoothness = self.frame_smoothness(dt)
+
+        # Hard scene cuts bypass smoothing so the LEDs do not lag behind the new scene
+        effective_smoothness *= cut_factor
+
+        arr_prev = np.array(prev, dtype=float)
+        if state is not None and self.config_snapshot.get('adaptive_smoothing'):
+            effective_smoothness = self.adaptive_smoothness(state, arr_prev, arr_curr, effective_smoothness, dt)
+        smoothed = arr_prev * effective_smoothness + arr_curr * (1 - effective_smoothness)
+        return [tuple(map(int, c)) for c in smoothed]
+
+    def adaptive_smoothness(self, state, arr_prev, arr_curr, effective_smoothness, dt=REFERENCE_FRAME_TIME):
+        """Per-LED smoothing factors: full smoothing where content is static, little where it moves"""
+        # Each LED's motion is its largest channel change, scaled to a reference-rate frame
+        # and lightly averaged over time so noise does not flicker
+        delta = np.abs(arr_curr - arr_prev).max(axis=1) * (REFERENCE_FRAME_TIME / max(dt, 1e-3))
+        motion = state['motion']
+        if motion is None or motion.shape != delta.shape:
+            motion = delta
+        else:
+            motion = motion + (delta - motion) * self.motion_weight(dt)
+        state['motion'] = motion
+        return (effective_smoothness * np.exp(-motion / ADAPTIVE_MOTION_SCALE))[:, None]
+
+    def motion_weight(self, dt):
+        """Weight of the newest change in the motion estimate after dt seconds (0.5 at the reference rate)"""
+        return 1.0 - 0.5 ** (dt / MOTION_HALF_LIFE)
+
+    def get_fused_kernels(self):
+        """fused_kernel module when sampling_mode is "numba" and Numba is installed, else None"""
+        # The compiled kernels compute the weighted mean only
+        if self.config_snapshot.get('sampling_mode') != "numba" or \
+                self.config_snapshot.get('zone_statistic', "mean") != "mean":
+            return None
+        if self.fused_kernels is None:
+            import fused_kernel
+            if fused_kernel.NUMBA_AVAILABLE:
+                fused_kernel.warm_up()
+                self.fused_kernels = fused_kernel
+            else:
+                # Reported through get_stats() and the status line
+                self.fused_kernels = False
+        return self.fused_kernels or None
+
+    def numba_missing(self):
+        """Whether sampling_mode "numba" fell back to numpy because Numba is not installed"""
+        return self.fused_kernels is False and self.config_snapshot.get('sampling_mode') == "numba"
+
+    def process_target_fused(self, kernels, img, target, state, timestamp, zone_cache=None):
+        """Sample, enhance and smooth one target in compiled loops; returns (N, 3) uint8 BGR colors"""
+        h, w = img.shape[:2]
+        num_leds = target['num_leds']
+        intensity = self.config_snapshot['color_intensity_percent'] / 100.0
+        brightness = self.config_snapshot['brightness_percent'] / 100.0
+
+        # LEDs not covered by a segment stay black; segments write disjoint LED ranges, so they
+        # can run on the sampling pool (the kernels release the GIL)
+        sampled = np.zeros((num_leds, 3), dtype=np.uint8)
+        if zone_cache is None:
+            zone_cache = {}
+        pool = self.get_sampling_pool()
+        futures = []
+        # Segments sampled here, for the zone cache: (key, first LED, count, reversed)
+        compiled = []
+        current_led = target['led_start_offset']
+        for edge_type, count, _, direction in target['led_segments']:
+            sampler = self.get_sampler(edge_type, count, h, w)
+            if sampler is None or count == 0 or current_led >= num_leds:
+                continue
+            key = (edge_type, count)
+            out = sampled[current_led:current_led + count]
+            reverse = direction == "reversed"
+            if key in zone_cache:
+                # Segments shared between targets are only sampled once per frame
+                self.place_segment(zone_cache[key], out, reverse)
+            elif 'run_starts' in sampler:
+                # Strips with excluded areas go through the numpy path
+                if pool:
+                    futures.append((key, pool.submit(self.sample_segment_into, img, sampler, out, reverse)))
+                else:
+                    zone_cache[key] = self.sample_segment_into(img, sampler, out, reverse)
+            else:
+                args = (img[sampler['strip_index']], np.asarray(sampler['weights']), sampler['side'] in ('top', 'bottom'),
+                        np.asarray(sampler['zone_starts']), np.asarray(sampler['zone_widths']).ravel(), sampled,
+                        current_led, reverse, intensity, brightness)
+                if pool:
+                    futures.append((None, pool.submit(kernels.sample_segment, *args)))
+                else:
+                    kernels.sample_segment(*args)
+                if len(out) == count:
+                    compiled.append((key, current_led, count, reverse))
+            current_led += count
+        for key, future in futures:
+            colors = future.result()
+            if key is not None:
+                zone_cache[key] = colors
+        for key, first_led, count, reverse in compiled:
+            colors = sampled[first_led:first_led + count]
+            zone_cache[key] = (colors[::-1] if reverse else colors).copy()
+        sampled = self.spatial_filter(sampled, target, state)
+
+        # Scene cuts and smoothing as in smooth_colors()
+        prev_sampled = state['prev_sampled']
+        state['prev_sampled'] = sampled
+        delta = None
+        if self.config_snapshot.get('scene_cut_percent', 0) > 0 and prev_sampled is not None \
+                and prev_sampled.shape == sampled.shape:
+            active = state['active']
+            delta = kernels.mean_abs_change(sampled, np.asarray(prev_sampled, dtype=np.uint8),
+                                            active.start, active.stop)
+        dt = self.frame_dt(state, timestamp)
+        cut_factor = self.cut_recovery_factor(state, delta, dt)
+
+        prev = state['prev_led_colors']
+        if prev is None or len(prev) != num_leds:
+            return sampled.copy()
+        prev = np.asarray(prev, dtype=np.uint8)
+
+        adaptive = bool(self.config_snapshot.get('adaptive_smoothing'))
+        motion = state['motion']
+        motion_valid = motion is not None and motion.shape == (num_leds,)
+        if not motion_valid:
+            motion = np.zeros(num_leds)
+        if adaptive:
+            state['motion'] = motion
+        led_colors = np.empty((num_leds, 3), dtype=np.uint8)
+        kernels.smooth(prev, sampled, self.frame_smoothness(dt) * cut_factor, adaptive, motion, motion_valid,
+                       self.motion_weight(dt), REFERENCE_FRAME_TIME / max(dt, 1e-3), ADAPTIVE_MOTION_SCALE,
+                       led_colors)
+        return led_colors
+
+    def process_frame(self, img, timestamp=None):
+        """Turn one captured image into smoothed LED colors for every target"""
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        self.update_content_rect(img, timestamp)
+
+        # One sampling pass shared by all targets
+        zone_cache = {}
+        frames = []
+        kernels = self.get_fused_kernels()
+        pool = self.get_sampling_pool()
+        for target, state in zip(self.config_snapshot['targets'], self.target_states):
+            if kernels:
+                led_colors = self.process_target_fused(kernels, img, target, state, timestamp, zone_cache)
+            else:
+                if pool:
+                    led_colors = self.get_led_colors_parallel(img, target, pool, zone_cache)
+                else:
+                    led_colors = self.get_led_colors_from_screen(img, target, zone_cache)
+                led_colors = self.spatial_filter(led_colors, target, state)
+                led_colors = self.smooth_colors(state['prev_led_colors'], led_colors, state, timestamp)
+            state['prev_led_colors'] = led_colors
+            frames.append(led_colors)
+        return frames
+
+    def publish_frames(self, frames, timestamp):
+        """Hand processed frames to the output thread for interpolation"""
+        with self.output_lock:
+            for led_colors, state in zip(frames, self.target_states):
+                arr = np.asarray(led_colors, dtype=np.float32).reshape(-1, 3)
+                if state['interp_frames'] is None or state['interp_frames'][0].shape != arr.shape:
+                    state['interp_frames'] = [arr.copy(), arr.copy()]
+                    state['interp_times'] = [timestamp, timestamp]
+                    state['interp_work'] = np.empty_like(arr)
+                    state['interp_out'] = np.empty(arr.shape, dtype=np.uint8)
+                    continue
+
+                # Recycle the older buffer for the new frame
+                older, newer = state['interp_frames']
+                np.copyto(older, arr)
+                state['interp_frames'] = [newer, older]
+                state['interp_times'] = [state['interp_times'][1], timestamp]
+
+    def interpolate_frames(self, now):
+        """Blend each target's two latest frames for output time now, in preallocated buffers"""
+        frames = []
+        with self.output_lock:
+            for state in self.target_states:
+                if state['interp_frames'] is None:
+                    return None
+                prev, latest = state['interp_frames']
+                prev_time, latest_time = state['interp_times']
+
+                # Move from the previous frame to the latest one over one capture interval
+                interval = latest_time - prev_time
+                alpha = min(max((now - latest_time) / interval, 0.0), 1.0) if interval > 0 else 1.0
+
+                work = state['interp_work']
+                np.subtract(latest, prev, out=work)
+                work *= alpha
+                work += prev
+                work += 0.5
+                np.copyto(state['interp_out'], work, casting='unsafe')
+                frames.append(state['interp_out'])
+        return frames
+
+    def output_worker(self):
+        """Send interpolated frames at output_rate_hz, independent of capture"""
+        next_tick = time.perf_counter()
+        while self.running:
+            try:
+                frames = self.interpolate_frames(time.perf_counter())
+                if frames is not None:
+                    self.send_frames(frames)
+                    if self.recorder:
+                        self.recorder.append([frame.copy() for frame in frames])
+            except Exception as e:
+                pass
+
+            output_rate = (self.config_snapshot.get('output_rate_hz') or DEFAULT_CAPTURE_RATE) * self.quality.get('rate_scale', 1.0)
+            next_tick = max(next_tick + 1.0 / output_rate, time.perf_counter() - 1.0 / output_rate)
+            sleep_time = next_tick - time.perf_counter()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+
+    def build_target_datagrams(self, led_colors, target, state):
+        """Build (packet, address) pairs for one target's frame"""
+        packets = build_wled_packets(target['protocol'], led_colors, sequence=state['sequence'])
+        state['sequence'] = (state['sequence'] + len(packets)) % 15
+        address = (target['wled_ip'], target['wled_port'])
+        return [(packet, address) for packet in packets]
+
+    def send_wled_drgb(self, led_colors, target, state):
+        """Send colors to one WLED target via UDP (DRGB, DNRGB or DDP)"""
+        try:
+            state['sender'].send(self.build_target_datagrams(led_colors, target, state))
+
+        except Exception as e:
+            pass
+
+    def send_frames(self, frames):
+        """Send one processed frame to every target"""
+        send_start = time.perf_counter()
+        syscalls_before = self.get_send_syscalls()
+        targets = self.config_snapshot['targets']
+
+        if self.frame_sender:
+            try:
+                datagrams = []
+                for led_colors, target, state in zip(frames, targets, self.target_states):
+                    datagrams.extend(self.build_target_datagrams(led_colors, target, state))
+                self.frame_sender.send(datagrams)
+            except Exception as e:
+                pass
+
+        elif self.send_pool is None:
+            for led_colors, target, state in zip(frames, targets, self.target_states):
+                self.send_wled_drgb(led_colors, target, state)
+
+        else:
+            futures = [self.send_pool.submit(self.send_wled_drgb, led_colors, target, state)
+                       for led_colors, target, state in zip(frames, targets, self.target_states)]
+            wait(futures)
+
+        self.stats['frames'] += 1
+        self.stats['send_time'] += time.perf_counter() - send_start
+        self.stats['send_syscalls'] += self.get_send_syscalls() - syscalls_before
+
+    def print_stats(self, frame_count, elapsed):
+        """Print frame rate and send-stage statistics on one status line"""
+        fps = frame_count / elapsed
+        sent_frames = max(1, self.stats['frames'])
+        send_us = self.stats['send_time'] / sent_frames * 1e6
+        syscalls = self.stats['send_syscalls'] / sent_frames
+        print(f"\rFPS: {fps:.1f}, Frame: {frame_count}, "
+              f"Send: {send_us:.0f}us {syscalls:.1f} syscalls/frame"
+              + (" (Numba not installed; sampling with numpy)" if self.numba_missing() else ""), end="")
+
+    def start_capture_pipeline(self, mode):
+        """Start a capture thread feeding a frame ring of full frames or edge strips"""
+        if self.frame_source:
+            frame_shape = self.frame_source.grab().shape
+        else:
+            frame_shape = (self.monitor_region[3], self.monitor_region[2], 4)
+        edge_depths = edge_strip_depths(self.sampling_depth_percent(), *frame_shape[:2]) if mode == "edges" else None
+        self.capture_ring = FrameRing(frame_shape, edge_depths=edge_depths, event=threading.Event())
+        self.capture_thread = threading.Thread(target=self.capture_worker, args=(self.capture_ring,), daemon=True)
+        self.capture_thread.start()
+
+    def stop_capture_pipeline(self):
+        """Stop the capture thread and release its frame ring"""
+        ring, self.capture_ring = self.capture_ring, None
+        if self.capture_thread:
+            self.capture_thread.join(timeout=1)
+            self.capture_thread = None
+        if ring:
+            ring.close()
+
+    def capture_worker(self, ring):
+        """Capture stage of the pipelined loop: grab into the frame ring at the capture rate"""
+        # The capture object lives in this thread, as mss expects
+        capture = self.frame_source or ScreenCapture(self.monitor_region)
+        try:
+            while self.running and self.capture_ring is ring:
+                frame_start = time.perf_counter()
+                try:
+                    if ring.edge_depths is not None and isinstance(capture, ScreenCapture):
+                        capture.grab_edges(ring.begin_write())
+                        ring.commit()
+                    else:
+                        img = capture.grab()
+                        ring.write(img, time.perf_counter())
+                except Exception as e:
+                    time.sleep(0.1)
+
+                sleep_time = self.frame_interval() - (time.perf_counter() - frame_start)
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
+        finally:
+            if isinstance(capture, ScreenCapture):
+                capture.close()
+
+    def grab_edge_frame(self, capture):
+        """Grab only the border strips into a reusable edge-only frame"""
+        h, w = self.monitor_region[3], self.monitor_region[2]
+        depths = edge_strip_depths(self.sampling_depth_percent(), h, w)
+        if self.edge_frame is None or (self.edge_frame.row_depth, self.edge_frame.col_depth) != depths:
+            self.edge_frame = EdgeStripFrame(h, w, *depths)
+        capture.grab_edges(self.edge_frame)
+        return self.edge_frame
+
+    def update_quality(self, busy_time):
+        """Feed the QoS controller one frame's busy time and apply any quality level change"""
+        if not self.config_snapshot.get('quality_control'):
+            if self.quality_controller:
+                self.quality_controller = None
+                self.set_quality({})
+            return
+        if self.quality_controller is None:
+            self.quality_controller = QualityController()
+        settings = self.quality_controller.record(busy_time, self.frame_interval(), time.perf_counter())
+        if settings is not None:
+            self.set_quality(settings)
+
+    def set_quality(self, settings):
+        """Switch to a quality level's overrides; samplers for the new stride and depth compile on demand"""
+        self.quality = dict(settings)
+
+    def ambilight_worker(self):
+        """Main ambilight processing loop"""
+        if not self.config_snapshot['targets']:
+            self.running = False
+            return
+
+        capture = None
+        try:
+            self.open_targets()
+            if not self.frame_source:
+                self.compile_layout(self.monitor_region[3], self.monitor_region[2])
+            self.get_fused_kernels()
+
+            # Pipelined capture runs in its own thread; the loop below then only processes the latest frame
+            pipeline = self.config_snapshot.get('capture_pipeline', "off")
+            sequence = 0
+            if pipeline in ("full", "edges"):
+                self.start_capture_pipeline(pipeline)
+            elif self.frame_source:
+                capture = self.frame_source
+            else:
+                capture = ScreenCapture(self.monitor_region)
+            frame_count = 0
+            start_time = time.time()
+            last_fps_print = start_time
+
+            # With an output rate set, sending moves to its own thread and interpolates between captures
+            interpolate = bool(self.config_snapshot.get('output_rate_hz'))
+            if interpolate:
+                self.output_thread = threading.Thread(target=self.output_worker, daemon=True)
+                self.output_thread.start()
+
+            while self.running:
+                try:
+                    frame_start = time.time()
+                    busy_start = time.perf_counter()
+                    self.apply_pending_config()
+
+                    if self.capture_ring:
+                        # Edge strips must stay deep enough for the current sampling depth, and the
+                        # lower quality levels switch a full-frame ring to edge strips
+                        ring = self.capture_ring
+                        mode = "edges" if self.quality.get('edge_capture') else pipeline
+                        edge_depths = edge_strip_depths(self.sampling_depth_percent(), *ring.frame_shape[:2]) \
+                            if mode == "edges" else None
+                        if ring.edge_depths != edge_depths:
+                            self.stop_capture_pipeline()
+                            self.start_capture_pipeline(mode)
+                            sequence = 0
+                            continue
+
+                        latest = ring.wait_latest(sequence, timeout=0.1)
+                        if latest is None:
+                            continue
+                        sequence, timestamp, img = latest
+                        busy_start = time.perf_counter()
+                        saved_state = self.save_smoothing_state()
+                        frames = self.process_frame(img, timestamp)
+                        # The frame was read in place; drop it, and what it did to the smoothing state,
+                        # if the capture thread lapped the ring meanwhile
+                        if not ring.is_current(sequence):
+                            self.restore_smoothing_state(saved_state)
+                            continue
+                    else:
+                        if self.quality.get('edge_capture') and isinstance(capture, ScreenCapture):
+                            img = self.grab_edge_frame(capture)
+                        else:
+                            img = capture.grab()
+                        timestamp = time.perf_counter()
+                        frames = self.process_frame(img, timestamp)
+                    self.frame_times.append(timestamp)
+                    if interpolate:
+                        self.publish_frames(frames, timestamp)
+                    else:
+                        self.send_frames(frames)
+                        if self.recorder:
+                            self.recorder.append(frames)
+                    self.update_quality(time.perf_counter() - busy_start)
+
+                    frame_count += 1
+
+                    now = time.time()
+                    if now - last_fps_print >= 3.0:
+                        self.print_stats(frame_count, now - start_time)
+                        last_fps_print = now
+
+                    # The capture thread paces the pipelined modes
+                    if self.capture_ring:
+                        continue
+                    frame_time = time.time() - frame_start
+                    sleep_time = max(0, self.frame_interval() - frame_time)
+
+                    if sleep_time > 0:
+                        time.sleep(sleep_time)
+
+                except Exception as e:
+                    time.sleep(0.1)
+
+        except Exception as e:
+            pass
+        finally:
+            self.running = False
+            if self.output_thread:
+                self.output_thread.join(timeout=1)
+                self.output_thread = None
+            self.stop_capture_pipeline()
+            self.close_sampling_pool()
+            if isinstance(capture, ScreenCapture):
+                capture.close()
+            self.stop_recording()
+            self.close_targets()
+            self.running = False
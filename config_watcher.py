@@ -0,0 +1,145 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify event mask: a finished write, or a file renamed or created into the directory
+# (editors and config deployment tools usually replace the file rather than rewrite it)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# Wait for a burst of events to settle before reading the file
+SETTLE_TIME = 0.05
+POLL_INTERVAL = 1.0
+
+
+def open_inotify(directory):
+    """inotify file descriptor watching directory, or None where inotify is unavailable"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def event_names(data):
+    """File names of the inotify events in one read() buffer"""
+    names = []
+    offset = 0
+    while offset + INOTIFY_EVENT.size <= len(data):
+        _, _, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+        offset += INOTIFY_EVENT.size
+        names.append(os.fsdecode(data[offset:offset + name_length].rstrip(b"\0")))
+        offset += name_length
+    return names
+
+
+class ConfigWatcher:
+    """Watch a JSON configuration file and call callback(config) whenever its contents change"""
+
+    def __init__(self, path, callback, poll_interval=POLL_INTERVAL, use_inotify=True):
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.config = None
+        self.mode = None
+
+    def start(self):
+        """Start watching in a background thread"""
+        self.config = self.read_config()
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop watching"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def read_config(self):
+        """Parsed file contents, or None while the file is missing or half written"""
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def check(self):
+        """Re-read the file and report it if it parses and differs from the last version"""
+        config = self.read_config()
+        if config is None or config == self.config:
+            return
+        self.config = config
+        try:
+            self.callback(config)
+        except Exception as e:
+            pass
+
+    def file_state(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def watch(self):
+        fd = open_inotify(os.path.dirname(self.path)) if self.use_inotify else None
+        if fd is None:
+            self.mode = "polling"
+            self.watch_polling()
+            return
+
+        self.mode = "inotify"
+        name = os.path.basename(self.path)
+        try:
+            while not self.stop_event.is_set():
+                # Wake up now and then to notice stop()
+                readable, _, _ = select.select([fd], [], [], 0.5)
+                if not readable:
+                    continue
+                names = []
+                deadline = time.monotonic() + SETTLE_TIME
+                while True:
+                    try:
+                        names.extend(event_names(os.read(fd, 65536)))
+                    except BlockingIOError:
+                        pass
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    select.select([fd], [], [], remaining)
+                if name in names:
+                    self.check()
+        finally:
+            os.close(fd)
+
+    def watch_polling(self):
+        """Fallback: compare the file's inode, modification time and size at a fixed interval"""
+        state = self.file_state()
+        while not self.stop_event.wait(self.poll_interval):
+            current = self.file_state()
+            if current != state:
+                state = current
+                self.check()
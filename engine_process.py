@@ -0,0 +1,138 @@
+import atexit
+import multiprocessing
+
+# Commands sent from the GUI to the engine process over a pipe, as (command, argument) tuples:
+#   settings          dict of changed settings
+#   reload            complete new configuration snapshot
+#   start_recording   path of the recording file
+#   stop_recording    -
+#   stats             -, answered with the engine's get_stats() dict
+#   stop              -
+
+
+def engine_process_main(conn, config_snapshot, monitor_region, frame_source=None):
+    """Run an engine and serve GUI commands until told to stop (runs in a child process)"""
+    if config_snapshot.get('sources'):
+        from multi_monitor import MultiMonitorEngine
+        engine = MultiMonitorEngine(config_snapshot, monitor_region)
+    else:
+        from ambilight_engine import AmbilightEngine
+        engine = AmbilightEngine(config_snapshot, monitor_region)
+    engine.frame_source = frame_source
+    engine.start()
+
+    try:
+        while engine.running:
+            if not conn.poll(0.1):
+                continue
+            try:
+                command, argument = conn.recv()
+            except EOFError:
+                break
+
+            if command == 'settings':
+                engine.update_settings(argument)
+            elif command == 'reload':
+                engine.reload_config(argument)
+            elif command == 'start_recording':
+                engine.start_recording(argument)
+            elif command == 'stop_recording':
+                engine.stop_recording()
+            elif command == 'stats':
+                conn.send(engine.get_stats())
+            elif command == 'stop':
+                break
+    finally:
+        engine.stop(timeout=2)
+        conn.close()
+
+
+class EngineProcess:
+    """AmbilightEngine look-alike that runs the engine in its own process, away from the GUI's GIL"""
+
+    def __init__(self, config_snapshot, monitor_region, frame_source=None):
+        self.config_snapshot = config_snapshot
+        self.monitor_region = monitor_region
+        self.frame_source = frame_source
+        self.process = None
+        self.conn = None
+        self.sent_settings = dict(config_snapshot)
+        # Stats are requested without waiting; the answer is picked up on the next call
+        self.last_stats = {}
+        self.stats_requested = False
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        """Start the engine process"""
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        # Not daemonic: a multi-monitor engine starts capture processes of its own. It is stopped
+        # explicitly, at the latest on interpreter exit (before multiprocessing joins its children).
+        self.process = context.Process(
+            target=engine_process_main,
+            args=(child_conn, self.config_snapshot, self.monitor_region, self.frame_source))
+        self.process.start()
+        child_conn.close()
+        atexit.register(self.stop)
+
+    def send_command(self, command, argument=None):
+        """Send one command; a dead engine process is not an error"""
+        if not self.running:
+            return False
+        try:
+            self.conn.send((command, argument))
+            return True
+        except (BrokenPipeError, EOFError, OSError):
+            return False
+
+    def update_settings(self, settings):
+        """Forward settings that changed since the last update"""
+        changed = {key: value for key, value in settings.items() if self.sent_settings.get(key) != value}
+        self.config_snapshot.update(settings)
+        if changed and self.send_command('settings', changed):
+            self.sent_settings.update(changed)
+
+    def reload_config(self, config_snapshot):
+        """Send a complete new configuration; the engine swaps it in between frames"""
+        self.config_snapshot = config_snapshot
+        if self.send_command('reload', config_snapshot):
+            self.sent_settings = dict(config_snapshot)
+
+    def get_stats(self):
+        """Latest statistics received from the engine process; never blocks the calling (GUI) thread"""
+        if not self.running:
+            return {}
+
+        try:
+            while self.conn.poll(0):
+                self.last_stats = self.conn.recv()
+                self.stats_requested = False
+        except (EOFError, OSError):
+            return {}
+        if not self.stats_requested and self.send_command('stats'):
+            self.stats_requested = True
+        return self.last_stats
+
+    def start_recording(self, path):
+        """Record every transmitted frame to path (written by the engine process)"""
+        self.send_command('start_recording', path)
+
+    def stop_recording(self):
+        """Stop recording and finalize the file"""
+        self.send_command('stop_recording')
+
+    def stop(self, timeout=1):
+        """Stop the engine and wait for its process to exit"""
+        if self.process is None:
+            return
+        atexit.unregister(self.stop)
+        self.send_command('stop')
+        self.process.join(timeout=timeout + 2)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.conn.close()
+        self.process = None
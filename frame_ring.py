@@ -0,0 +1,189 @@
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+# Shared block layout:
+#   header   int64 sequence of the latest complete frame (0 = none yet), padded to 64 bytes
+#   slots    per slot: int64 sequence (-1 while being written) + float64 timestamp
+#   data     one fixed-size region per slot, 64-byte aligned
+# Frames are written round-robin. A reader takes the latest complete frame and may work on
+# it in place; it only needs to check afterwards that the writer has not lapped the ring.
+HEADER_SIZE = 64
+SLOT_META_SIZE = 16
+ALIGNMENT = 64
+WRITING = -1
+POLL_INTERVAL = 0.0005
+
+
+def aligned(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def edge_strip_shapes(h, w, row_depth, col_depth, channels=4):
+    """Shapes of the four strips of an edge-only frame"""
+    return {
+        'top': (row_depth, w, channels),
+        'bottom': (row_depth, w, channels),
+        'left': (h, col_depth, channels),
+        'right': (h, col_depth, channels),
+    }
+
+
+def edge_strip_depths(depth_percent, h, w):
+    """Row and column depth that cover every sampler at the given color depth percentage"""
+    depth = depth_percent / 100.0
+    # Partial top/bottom segments take their depth from the width (see compile_edge_sampler)
+    row_depth = min(h, max(1, int(depth * h), int(depth * w)))
+    col_depth = min(w, max(1, int(depth * w)))
+    return row_depth, col_depth
+
+
+class EdgeStripFrame:
+    """Edge-only frame: the four border strips of an h x w image, indexable like the full image"""
+
+    def __init__(self, h, w, row_depth, col_depth, buffer=None, offset=0, channels=4):
+        self.shape = (h, w, channels)
+        self.row_depth = row_depth
+        self.col_depth = col_depth
+        self.nbytes = 0
+        self.strips = {}
+        for side, shape in edge_strip_shapes(h, w, row_depth, col_depth, channels).items():
+            if buffer is None:
+                self.strips[side] = np.zeros(shape, dtype=np.uint8)
+            else:
+                self.strips[side] = np.ndarray(shape, dtype=np.uint8, buffer=buffer, offset=offset + self.nbytes)
+            self.nbytes += int(np.prod(shape))
+
+    def __getitem__(self, index):
+        """Serve a sampler's (rows, columns) slice pair from the strip that contains it"""
+        rows, cols = index
+        h, w = self.shape[:2]
+        row_start, row_stop, row_step = rows.indices(h)
+        col_start, col_stop, col_step = cols.indices(w)
+        if row_stop <= self.row_depth:
+            return self.strips['top'][row_start:row_stop:row_step, col_start:col_stop:col_step]
+        if row_start >= h - self.row_depth:
+            offset = h - self.row_depth
+            return self.strips['bottom'][row_start - offset:row_stop - offset:row_step, col_start:col_stop:col_step]
+        if col_stop <= self.col_depth:
+            return self.strips['left'][row_start:row_stop:row_step, col_start:col_stop:col_step]
+        if col_start >= w - self.col_depth:
+            offset = w - self.col_depth
+            return self.strips['right'][row_start:row_stop:row_step, col_start - offset:col_stop - offset:col_step]
+        raise IndexError(f"{index} is not inside the edge strips")
+
+    def copy_from(self, img):
+        """Fill the strips from a full image"""
+        h, w = self.shape[:2]
+        np.copyto(self.strips['top'], img[:self.row_depth])
+        np.copyto(self.strips['bottom'], img[h - self.row_depth:])
+        np.copyto(self.strips['left'], img[:, :self.col_depth])
+        np.copyto(self.strips['right'], img[:, w - self.col_depth:])
+
+
+class FrameRing:
+    """Fixed ring of preallocated frame slots in shared memory with latest-frame semantics"""
+
+    def __init__(self, frame_shape, slots=3, edge_depths=None, name=None, event=None):
+        self.frame_shape = tuple(frame_shape)
+        self.edge_depths = edge_depths
+        self.num_slots = slots
+        self.event = event
+
+        if edge_depths is None:
+            self.slot_bytes = aligned(int(np.prod(self.frame_shape)))
+        else:
+            h, w, channels = self.frame_shape
+            self.slot_bytes = aligned(EdgeStripFrame(h, w, *edge_depths, buffer=None, channels=channels).nbytes)
+        self.data_offset = aligned(HEADER_SIZE + slots * SLOT_META_SIZE)
+
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner,
+                                              size=self.data_offset + slots * self.slot_bytes)
+        self.name = self.shm.name
+
+        buf = self.shm.buf
+        self.latest = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=0)
+        meta = np.ndarray((slots,), dtype=[('sequence', '<i8'), ('timestamp', '<f8')], buffer=buf, offset=HEADER_SIZE)
+        self.slot_sequences = meta['sequence']
+        self.slot_timestamps = meta['timestamp']
+        self.frames = [self.make_frame(buf, self.data_offset + i * self.slot_bytes) for i in range(slots)]
+        if self.owner:
+            self.latest[0] = 0
+            self.slot_sequences[:] = 0
+
+    def make_frame(self, buf, offset):
+        """Full-frame array or edge-strip view over one slot"""
+        if self.edge_depths is None:
+            return np.ndarray(self.frame_shape, dtype=np.uint8, buffer=buf, offset=offset)
+        h, w, channels = self.frame_shape
+        return EdgeStripFrame(h, w, *self.edge_depths, buffer=buf, offset=offset, channels=channels)
+
+    def begin_write(self):
+        """Slot to fill with the next frame; commit() publishes it"""
+        sequence = int(self.latest[0]) + 1
+        slot = sequence % self.num_slots
+        self.slot_sequences[slot] = WRITING
+        return self.frames[slot]
+
+    def commit(self, timestamp=None):
+        """Publish the frame written since begin_write()"""
+        sequence = int(self.latest[0]) + 1
+        slot = sequence % self.num_slots
+        self.slot_timestamps[slot] = time.perf_counter() if timestamp is None else timestamp
+        self.slot_sequences[slot] = sequence
+        self.latest[0] = sequence
+        if self.event is not None:
+            self.event.set()
+        return sequence
+
+    def write(self, img, timestamp=None):
+        """Copy a full image into the next slot and publish it"""
+        frame = self.begin_write()
+        if self.edge_depths is None:
+            np.copyto(frame, img)
+        else:
+            frame.copy_from(img)
+        return self.commit(timestamp)
+
+    def read_latest(self, after=0):
+        """(sequence, timestamp, frame) of the newest frame newer than after, or None"""
+        sequence = int(self.latest[0])
+        if sequence <= after:
+            return None
+        slot = sequence % self.num_slots
+        timestamp = float(self.slot_timestamps[slot])
+        if int(self.slot_sequences[slot]) != sequence:
+            return None  # lapped while we looked; the next call sees a newer frame
+        return sequence, timestamp, self.frames[slot]
+
+    def is_current(self, sequence):
+        """Whether the slot of sequence still holds that frame (i.e. reading it in place was safe)"""
+        return int(self.slot_sequences[sequence % self.num_slots]) == sequence
+
+    def wait_latest(self, after=0, timeout=None):
+        """Block until a frame newer than after is available"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            result = self.read_latest(after)
+            if result is not None:
+                return result
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                return None
+            if self.event is not None:
+                self.event.wait(remaining)
+                self.event.clear()
+            else:
+                time.sleep(POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining))
+
+    def close(self):
+        """Detach, and free the block if this side created it"""
+        self.frames = []
+        self.latest = self.slot_sequences = self.slot_timestamps = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a reader still holds a frame; the mapping goes away with it
+        if self.owner:
+            self.shm.unlink()
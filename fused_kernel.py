@@ -0,0 +1,130 @@
+import math
+import numpy as np
+
+# Optional compiled backend for the per-LED pipeline. The numpy code in ambilight_engine.py
+# is the reference; these loops reproduce it (to within one level of float rounding) without
+# intermediate arrays: each zone is reduced straight from the captured strip and enhanced in
+# registers, and smoothing runs as a single pass over the LEDs.
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    NUMBA_AVAILABLE = False
+
+# Added to zone averages before they are truncated to whole levels
+ROUNDING_GUARD = 1e-6
+
+
+def jit(func):
+    """Compile with Numba if it is installed (cached on disk, GIL released)"""
+    if numba is None:
+        return func
+    return numba.njit(cache=True, nogil=True)(func)
+
+
+@jit
+def sample_segment(strip, weights, along_rows, zone_starts, zone_widths, out, first_led, reverse,
+                   intensity, brightness):
+    """Reduce one segment's strip to zone colors, enhance them and write them to out[first_led:]"""
+    if along_rows:
+        length = strip.shape[1]
+    else:
+        length = strip.shape[0]
+    depth = weights.shape[0]
+    count = zone_starts.shape[0]
+    for zone in range(count):
+        led = first_led + (count - 1 - zone if reverse else zone)
+        if led >= out.shape[0]:
+            continue
+
+        # Same spans as np.add.reduceat: up to the next zone start, at least one pixel
+        start = zone_starts[zone]
+        end = zone_starts[zone + 1] if zone + 1 < count else length
+        if end <= start:
+            end = start + 1
+        b = 0.0
+        g = 0.0
+        r = 0.0
+        # Innermost loop along memory: across the zone for top/bottom, across the depth for left/right
+        if along_rows:
+            for d in range(depth):
+                row_b = 0
+                row_g = 0
+                row_r = 0
+                for x in range(start, end):
+                    row_b += strip[d, x, 0]
+                    row_g += strip[d, x, 1]
+                    row_r += strip[d, x, 2]
+                weight = weights[d]
+                b += weight * row_b
+                g += weight * row_g
+                r += weight * row_r
+        else:
+            for x in range(start, end):
+                for d in range(depth):
+                    weight = weights[d]
+                    b += weight * strip[x, d, 0]
+                    g += weight * strip[x, d, 1]
+                    r += weight * strip[x, d, 2]
+        # The weights sum to 1 only up to rounding; keep flat colors from dropping a level
+        width = zone_widths[zone]
+        b = b / width + ROUNDING_GUARD
+        g = g / width + ROUNDING_GUARD
+        r = r / width + ROUNDING_GUARD
+
+        # Saturation scaling at constant value, capped at full saturation (see enhance_colors)
+        if intensity != 1.0:
+            b = math.floor(b)
+            g = math.floor(g)
+            r = math.floor(r)
+            value = max(b, g, r)
+            spread = value - min(b, g, r)
+            scale = min(intensity, value / spread) if spread > 0 else intensity
+            b = np.rint(value - (value - b) * scale)
+            g = np.rint(value - (value - g) * scale)
+            r = np.rint(value - (value - r) * scale)
+
+        out[led, 0] = int(min(max(b * brightness, 0.0), 255.0))
+        out[led, 1] = int(min(max(g * brightness, 0.0), 255.0))
+        out[led, 2] = int(min(max(r * brightness, 0.0), 255.0))
+
+
+@jit
+def mean_abs_change(curr, prev, start, stop):
+    """Mean absolute channel change of LEDs start..stop (scene cut detection)"""
+    if stop <= start:
+        return 0.0
+    total = 0.0
+    for i in range(start, stop):
+        for c in range(3):
+            total += abs(float(curr[i, c]) - float(prev[i, c]))
+    return total / ((stop - start) * 3)
+
+
+@jit
+def smooth(prev, curr, smoothness, adaptive, motion, motion_valid, motion_weight, motion_scale, motion_falloff, out):
+    """Blend the new colors into the previous output, optionally with motion-adaptive smoothing"""
+    for i in range(curr.shape[0]):
+        factor = smoothness
+        if adaptive:
+            delta = 0.0
+            for c in range(3):
+                delta = max(delta, abs(float(curr[i, c]) - float(prev[i, c])))
+            delta *= motion_scale
+            motion[i] = motion[i] + (delta - motion[i]) * motion_weight if motion_valid else delta
+            factor = smoothness * math.exp(-motion[i] / motion_falloff)
+        for c in range(3):
+            out[i, c] = int(prev[i, c] * factor + curr[i, c] * (1.0 - factor))
+
+
+def warm_up():
+    """Compile the kernels now rather than on the first streamed frame"""
+    # Strips are views into the captured frame, hence the slicing
+    strip = np.zeros((4, 8, 4), dtype=np.uint8)[:2, :4]
+    colors = np.zeros((2, 3), dtype=np.uint8)
+    zone_starts = np.zeros(2, dtype=np.int64)
+    zone_widths = np.ones(2, dtype=np.int64)
+    sample_segment(strip, np.ones(2), True, zone_starts, zone_widths, colors, 0, False, 0.8, 1.0)
+    mean_abs_change(colors, colors, 0, 2)
+    smooth(colors, colors, 0.5, True, np.zeros(2), False, 0.5, 1.0, 24.0, np.empty_like(colors))
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import struct
+import zipfile
+import numpy as np
+
+# Bump when the compiled sampler format changes so old cache files are never reused
+LAYOUT_FORMAT_VERSION = 5
+
+SIDES = ['top', 'bottom', 'left', 'right']
+# Sampler entries stored in the meta array; all others are arrays saved as <name>_<index>
+SCALAR_FIELDS = ('side', 'strip_index', 'count')
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                                 'ambilight', 'layouts')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Zip local file header: signature, versions/flags/method/time/date/crc/sizes, then name and extra lengths
+ZIP_LOCAL_HEADER = struct.Struct("<4s22xHH")
+
+
+def layout_key(target, h, w, depth_percent, content_rect=None, stride=1, exclusions=None):
+    """Hash of everything a target's compiled samplers depend on"""
+    description = {
+        'version': LAYOUT_FORMAT_VERSION,
+        'led_segments': [list(segment) for segment in target['led_segments']],
+        'num_leds': target['num_leds'],
+        'led_start_offset': target['led_start_offset'],
+        'depth_percent': depth_percent,
+        'resolution': [h, w],
+        'content_rect': list(content_rect) if content_rect else None,
+        'stride': stride,
+        'exclusions': [list(rect) for rect in exclusions] if exclusions else None,
+    }
+    return hashlib.sha1(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def memmap_npz(path):
+    """Memory-map every array of an uncompressed .npz instead of reading it"""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed")
+            # The member's .npy data sits after its local header, name and extra field
+            f.seek(info.header_offset)
+            signature, name_length, extra_length = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+            if signature != b"PK\x03\x04":
+                raise ValueError(f"{path} is not a valid archive")
+            f.seek(info.header_offset + ZIP_LOCAL_HEADER.size + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                raise ValueError(f"unsupported .npy version {version} in {path}")
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', shape=shape,
+                                         order='F' if fortran_order else 'C', offset=f.tell())
+    return arrays
+
+
+def pack_samplers(samplers):
+    """Flatten a list of compiled samplers (None for unknown edges) into arrays for np.savez"""
+    arrays = {}
+    meta = np.full((len(samplers), 8), -1, dtype=np.int64)
+    for i, sampler in enumerate(samplers):
+        if sampler is None:
+            continue
+        rows, cols = sampler['strip_index']
+        meta[i] = (SIDES.index(sampler['side']), rows.start, rows.stop, rows.step or 1,
+                   cols.start, cols.stop, cols.step or 1, sampler['count'])
+        # Every other entry is an array; samplers with excluded areas carry extra ones
+        for name, value in sampler.items():
+            if name not in SCALAR_FIELDS:
+                arrays[f"{name}_{i}"] = value
+    arrays['meta'] = meta
+    return arrays
+
+
+def unpack_samplers(arrays):
+    """Rebuild compiled samplers from pack_samplers() arrays"""
+    fields = {}
+    for name in arrays:
+        if name != 'meta':
+            field, _, i = name.rpartition('_')
+            fields.setdefault(int(i), []).append(field)
+    samplers = []
+    for i, (side, row_start, row_stop, row_step, col_start, col_stop, col_step, count) in \
+            enumerate(np.asarray(arrays['meta'])):
+        if side < 0:
+            samplers.append(None)
+            continue
+        sampler = {
+            'side': SIDES[side],
+            'strip_index': (slice(int(row_start), int(row_stop), int(row_step)),
+                            slice(int(col_start), int(col_stop), int(col_step))),
+            'count': int(count),
+        }
+        for field in fields.get(i, []):
+            sampler[field] = arrays[f"{field}_{i}"]
+        samplers.append(sampler)
+    return samplers
+
+
+class LayoutCache:
+    """Directory of compiled sampling layouts, one uncompressed .npz per layout key"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key):
+        """Compiled samplers for key, memory-mapped, or None if not cached"""
+        path = self.path(key)
+        try:
+            samplers = unpack_samplers(memmap_npz(path))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            # Truncated or foreign file: drop it and compile afresh
+            self.misses += 1
+            self.remove(path)
+            return None
+        self.hits += 1
+        try:
+            os.utime(path)  # eviction is least recently used first
+        except OSError:
+            pass
+        return samplers
+
+    def store(self, key, samplers):
+        """Write samplers for key, then evict old layouts beyond the size limit"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(key)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                np.savez(f, **pack_samplers(samplers))
+            os.replace(temp_path, path)  # readers never see a partial file
+            self.evict()
+        except OSError:
+            pass
+
+    def entries(self):
+        """(last use, size, path) of every cached layout"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Delete least recently used layouts until the cache fits in max_bytes"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,185 @@
+import argparse
+import mmap
+import queue
+import struct
+import threading
+import time
+import numpy as np
+from ambilight_engine import build_wled_packets, WLED_PROTOCOLS
+from wled_transport import BatchedUDPSender
+
+# File layout:
+#   header   magic, version, target count, record stride, frame count, start time
+#   counts   one uint32 LED count per target
+#   records  fixed stride: float64 seconds since start + uint8 colors of every target
+# Colors are stored in engine (BGR) order, exactly as handed to build_wled_packets.
+RECORDING_MAGIC = b"AMBREC01"
+RECORDING_VERSION = 1
+HEADER_FORMAT = "<8sHHIQd"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+FRAME_COUNT_OFFSET = 16
+TIMESTAMP_SIZE = 8
+INITIAL_CAPACITY = 1024
+
+
+class LEDRecorder:
+    """Append transmitted LED frames to a memory-mapped recording file"""
+
+    def __init__(self, path, led_counts, max_pending=256):
+        self.path = path
+        self.led_counts = list(led_counts)
+        self.frame_bytes = sum(self.led_counts) * 3
+        self.stride = TIMESTAMP_SIZE + self.frame_bytes
+        self.data_offset = HEADER_SIZE + 4 * len(self.led_counts)
+
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self.start_time = time.perf_counter()
+
+        self.file = open(path, "w+b")
+        self.capacity = 0
+        self.mm = None
+        self.resize(INITIAL_CAPACITY)
+        self.mm[:self.data_offset] = struct.pack(
+            HEADER_FORMAT, RECORDING_MAGIC, RECORDING_VERSION, len(self.led_counts),
+            self.stride, 0, time.time()) + struct.pack(f"<{len(self.led_counts)}I", *self.led_counts)
+
+        # Frames are handed over through a bounded queue so the worker never waits on disk
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.writer_thread = threading.Thread(target=self.writer, daemon=True)
+        self.writer_thread.start()
+
+    def resize(self, capacity):
+        """Grow the file and remap it to hold capacity records"""
+        if self.mm is not None:
+            self.mm.close()
+        self.file.truncate(self.data_offset + capacity * self.stride)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        self.capacity = capacity
+
+    def append(self, frames, timestamp=None, block=False):
+        """Queue one frame (a list of per-target LED colors) for writing"""
+        if timestamp is None:
+            timestamp = time.perf_counter() - self.start_time
+        try:
+            self.pending.put((timestamp, frames), block=block)
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def writer(self):
+        """Drain queued frames into the memory map"""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            timestamp, frames = item
+
+            if self.frame_count >= self.capacity:
+                self.resize(self.capacity * 2)
+
+            offset = self.data_offset + self.frame_count * self.stride
+            self.mm[offset:offset + TIMESTAMP_SIZE] = struct.pack("<d", timestamp)
+            offset += TIMESTAMP_SIZE
+            for led_colors, count in zip(frames, self.led_counts):
+                payload = np.asarray(led_colors, dtype=np.uint8).reshape(-1, 3)[:count].tobytes()
+                self.mm[offset:offset + len(payload)] = payload
+                offset += count * 3
+
+            self.frame_count += 1
+            struct.pack_into("<Q", self.mm, FRAME_COUNT_OFFSET, self.frame_count)
+
+    def close(self):
+        """Flush pending frames and trim the file to the recorded length"""
+        self.pending.put(None)
+        self.writer_thread.join()
+        self.mm.flush()
+        self.mm.close()
+        self.file.truncate(self.data_offset + self.frame_count * self.stride)
+        self.file.close()
+
+
+class LEDRecording:
+    """Read-only view of a recording file"""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, num_targets, self.stride, self.frame_count, self.start_wall_time = \
+            struct.unpack_from(HEADER_FORMAT, self.mm, 0)
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            raise ValueError(f"{path} is not an LED recording")
+
+        self.led_counts = list(struct.unpack_from(f"<{num_targets}I", self.mm, HEADER_SIZE))
+        data_offset = HEADER_SIZE + 4 * num_targets
+
+        # A recording that was not closed cleanly may have fewer records than the header says
+        available = (len(self.mm) - data_offset) // self.stride
+        self.frame_count = min(self.frame_count, available)
+
+        record_dtype = np.dtype([('timestamp', '<f8'), ('colors', 'u1', (self.stride - TIMESTAMP_SIZE,))])
+        self.records = np.ndarray((self.frame_count,), dtype=record_dtype, buffer=self.mm, offset=data_offset)
+
+    def timestamps(self):
+        """Seconds since the start of the recording for every frame"""
+        return np.array(self.records['timestamp'])
+
+    def target_frame(self, index, target_index=0):
+        """LED colors of one target in one frame as an (N, 3) uint8 array"""
+        start = sum(self.led_counts[:target_index]) * 3
+        count = self.led_counts[target_index]
+        return self.records['colors'][index, start:start + count * 3].reshape(count, 3)
+
+    def close(self):
+        """Release the memory map"""
+        self.records = None
+        self.mm.close()
+        self.file.close()
+
+
+def replay(path, wled_ip, wled_port, protocol="drgb", target_index=0, speed=1.0, loop=False):
+    """Stream a recording back to a WLED target at its original timing"""
+    recording = LEDRecording(path)
+    sender = BatchedUDPSender()
+    address = (wled_ip, wled_port)
+    timestamps = recording.timestamps()
+    sequence = 0
+
+    try:
+        while True:
+            start = time.perf_counter()
+            for i in range(recording.frame_count):
+                delay = start + timestamps[i] / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                packets = build_wled_packets(protocol, recording.target_frame(i, target_index), sequence=sequence)
+                sequence = (sequence + len(packets)) % 15
+                sender.send([(packet, address) for packet in packets])
+            if not loop:
+                break
+    finally:
+        sender.close()
+        recording.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded LED stream to a WLED controller")
+    parser.add_argument("recording")
+    parser.add_argument("wled_ip")
+    parser.add_argument("--port", type=int, default=21324)
+    parser.add_argument("--protocol", choices=WLED_PROTOCOLS, default="drgb")
+    parser.add_argument("--target", type=int, default=0, help="index of the recorded target to replay")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--loop", action="store_true")
+    args = parser.parse_args()
+
+    recording = LEDRecording(args.recording)
+    duration = recording.timestamps()[-1] if recording.frame_count else 0.0
+    print(f"{recording.frame_count} frames, {duration:.1f}s, LED counts {recording.led_counts}")
+    recording.close()
+
+    replay(args.recording, args.wled_ip, args.port, args.protocol, args.target, args.speed, args.loop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from ambilight_engine import AmbilightEngine, ScreenCapture, DEFAULT_CAPTURE_RATE, EFFECT_DEFAULTS
+
+# Shared block per capture process:
+#   int64    sequence number (odd while a write is in progress)
+#   float64  capture time (time.perf_counter, which is system-wide monotonic)
+#   uint8    sampled LED colors of every source on that monitor, back to back, BGR
+SEQUENCE_OFFSET = 0
+TIMESTAMP_OFFSET = 8
+COLORS_OFFSET = 16
+
+# Settings forwarded to the capture processes when they change in the GUI
+WORKER_SETTINGS = list(EFFECT_DEFAULTS) + ['capture_rate_hz', 'sampling_mode', 'sampling_threads', 'exclusion_rects']
+
+
+def source_led_count(source):
+    """Number of LEDs a source samples"""
+    return sum(count for _, count, _, _ in source['led_segments'])
+
+
+def group_sources(sources):
+    """Group sources by monitor region so every region is captured by a single process"""
+    groups = {}
+    for source in sources:
+        groups.setdefault(source['monitor_region'], []).append(source)
+    return list(groups.items())
+
+
+class SharedColors:
+    """Latest sampled LED colors of one capture process, in shared memory"""
+
+    def __init__(self, num_leds, name=None):
+        size = COLORS_OFFSET + max(1, num_leds * 3)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.name = self.shm.name
+        self.sequence = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf, offset=SEQUENCE_OFFSET)
+        self.timestamp = np.ndarray((1,), dtype=np.float64, buffer=self.shm.buf, offset=TIMESTAMP_OFFSET)
+        self.colors = np.ndarray((num_leds, 3), dtype=np.uint8, buffer=self.shm.buf, offset=COLORS_OFFSET)
+        if self.owner:
+            self.sequence[0] = 0
+
+    def write(self, parts, timestamp):
+        """Publish one frame; parts are per-source (N, 3) color arrays"""
+        # Sequence lock: readers retry if the sequence was odd or changed while they copied
+        self.sequence[0] += 1
+        offset = 0
+        for part in parts:
+            self.colors[offset:offset + len(part)] = part
+            offset += len(part)
+        self.timestamp[0] = timestamp
+        self.sequence[0] += 1
+
+    def read(self, out):
+        """Copy the latest complete frame into out; returns (sequence, timestamp)"""
+        while True:
+            sequence = int(self.sequence[0])
+            if not sequence & 1:
+                np.copyto(out, self.colors)
+                timestamp = float(self.timestamp[0])
+                if int(self.sequence[0]) == sequence:
+                    return sequence, timestamp
+            # A write is in progress; let the writer run instead of spinning
+            time.sleep(0)
+
+    def close(self):
+        """Detach, and free the block if this side created it"""
+        self.sequence = self.timestamp = self.colors = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def capture_process(monitor_region, sources, settings, shm_name, settings_queue, frame_ready, stop_event):
+    """Capture one monitor region and sample its sources into shared memory (runs in a child process)"""
+    led_counts = [source_led_count(source) for source in sources]
+    shared = SharedColors(sum(led_counts), name=shm_name)
+
+    # Each source is sampled like a target of its own, starting at LED 0
+    targets = [{'name': f"source{i}", 'num_leds': count, 'led_start_offset': 0,
+                'led_segments': source['led_segments']} for i, (source, count) in enumerate(zip(sources, led_counts))]
+    engine = AmbilightEngine(dict(settings, targets=targets), monitor_region)
+    capture = ScreenCapture(monitor_region)
+
+    try:
+        while not stop_event.is_set():
+            frame_start = time.perf_counter()
+            try:
+                try:
+                    while True:
+                        engine.config_snapshot.update(settings_queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+                img = capture.grab()
+                timestamp = time.perf_counter()
+                engine.update_content_rect(img, timestamp)
+                zone_cache = {}
+                pool = engine.get_sampling_pool()
+                if pool:
+                    parts = [engine.get_led_colors_parallel(img, target, pool) for target in targets]
+                else:
+                    parts = [engine.get_led_colors_from_screen(img, target, zone_cache) for target in targets]
+                parts = [np.asarray(part, dtype=np.uint8).reshape(-1, 3) for part in parts]
+                shared.write(parts, timestamp)
+                frame_ready.set()
+            except Exception as e:
+                time.sleep(0.1)
+
+            target_frame_time = 1.0 / (engine.config_snapshot.get('capture_rate_hz') or DEFAULT_CAPTURE_RATE)
+            sleep_time = target_frame_time - (time.perf_counter() - frame_start)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+    finally:
+        engine.close_sampling_pool()
+        capture.close()
+        shared.close()
+
+
+class MultiMonitorEngine(AmbilightEngine):
+    """Capture several monitor regions in parallel processes and combine them into the LED outputs"""
+
+    def __init__(self, config_snapshot, monitor_region):
+        super().__init__(config_snapshot, monitor_region)
+        self.workers = []
+
+    def capture_sources(self):
+        """Every target's own segments on the main region, plus the configured extra sources"""
+        sources = [{'monitor_region': tuple(self.monitor_region), 'target': i,
+                    'led_start_offset': target['led_start_offset'], 'led_segments': target['led_segments']}
+                   for i, target in enumerate(self.config_snapshot['targets'])]
+        return sources + list(self.config_snapshot.get('sources', []))
+
+    def current_settings(self):
+        """Settings the capture processes need for sampling"""
+        return {key: self.config_snapshot.get(key) for key in WORKER_SETTINGS}
+
+    def region_settings(self, settings, monitor_region):
+        """Settings for the capture process of one region; exclusions are drawn on the main region only"""
+        if monitor_region == tuple(self.monitor_region):
+            return settings
+        return dict(settings, exclusion_rects=())
+
+    def start_workers(self):
+        """Create one shared block and one capture process per monitor region"""
+        # Spawned rather than forked so each process opens its own display connection
+        context = multiprocessing.get_context("spawn")
+        self.frame_ready = context.Event()
+        self.stop_event = context.Event()
+        settings = self.current_settings()
+
+        for monitor_region, sources in group_sources(self.capture_sources()):
+            led_counts = [source_led_count(source) for source in sources]
+            shared = SharedColors(sum(led_counts))
+            settings_queue = context.Queue()
+            process = context.Process(
+                target=capture_process, daemon=True,
+                args=(monitor_region, sources, self.region_settings(settings, monitor_region), shared.name, settings_queue, self.frame_ready, self.stop_event))
+            try:
+                process.start()
+            except Exception as e:
+                settings_queue.close()
+                shared.close()
+                raise
+            self.workers.append({
+                'process': process,
+                'monitor_region': monitor_region,
+                'shared': shared,
+                'settings_queue': settings_queue,
+                'sources': sources,
+                'led_counts': led_counts,
+                'colors': np.zeros((sum(led_counts), 3), dtype=np.uint8),
+                'sequence': 0,
+            })
+        return settings
+
+    def stop_workers(self):
+        """Stop the capture processes and free their shared memory"""
+        if self.workers:
+            self.stop_event.set()
+        for worker in self.workers:
+            worker['process'].join(timeout=2)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+            worker['settings_queue'].close()
+            worker['shared'].close()
+        self.workers = []
+
+    def combine_frame(self):
+        """Read every process's latest colors and place them at their targets' LED positions"""
+        targets = self.config_snapshot['targets']
+        outputs = [np.zeros((target['num_leds'], 3), dtype=np.uint8) for target in targets]
+        timestamp = None
+        for worker in self.workers:
+            sequence, worker_time = worker['shared'].read(worker['colors'])
+            if sequence == 0:
+                continue
+            worker['sequence'] = sequence
+            timestamp = worker_time if timestamp is None else max(timestamp, worker_time)
+
+            offset = 0
+            for source, count in zip(worker['sources'], worker['led_counts']):
+                output = outputs[source['target']]
+                start = source['led_start_offset']
+                end = min(len(output), start + count)
+                if end > start:
+                    output[start:end] = worker['colors'][offset:offset + end - start]
+                offset += count
+        return outputs, timestamp
+
+    def ambilight_worker(self):
+        """Coordinate the capture processes and send the combined frames"""
+        if not self.config_snapshot['targets']:
+            self.running = False
+            return
+
+        try:
+            self.open_targets()
+            settings = self.start_workers()
+            frame_count = 0
+            start_time = time.time()
+            last_fps_print = start_time
+
+            interpolate = bool(self.config_snapshot.get('output_rate_hz'))
+            if interpolate:
+                self.output_thread = threading.Thread(target=self.output_worker, daemon=True)
+                self.output_thread.start()
+
+            first_update = None
+            while self.running:
+                try:
+                    # Woken by whichever capture process finishes a frame first
+                    if not self.frame_ready.wait(timeout=0.1):
+                        continue
+                    self.frame_ready.clear()
+
+                    # Wait for every region to deliver, but no longer than one capture interval
+                    target_frame_time = 1.0 / (self.config_snapshot.get('capture_rate_hz') or DEFAULT_CAPTURE_RATE)
+                    if first_update is None:
+                        first_update = time.perf_counter()
+                    if (not all(worker['shared'].sequence[0] != worker['sequence'] for worker in self.workers)
+                            and time.perf_counter() - first_update < target_frame_time):
+                        continue
+                    first_update = None
+
+                    # A reloaded layout needs capture processes sampling the new segments
+                    if self.apply_pending_config():
+                        self.stop_workers()
+                        settings = self.start_workers()
+                        continue
+
+                    current = self.current_settings()
+                    if current != settings:
+                        for worker in self.workers:
+                            worker['settings_queue'].put(self.region_settings(current, worker['monitor_region']))
+                        settings = current
+
+                    outputs, timestamp = self.combine_frame()
+                    if timestamp is None:
+                        continue
+
+                    frames = []
+                    for led_colors, target, state in zip(outputs, self.config_snapshot['targets'], self.target_states):
+                        # Sources from several monitors are blurred together once they share a strip
+                        led_colors = self.spatial_filter(led_colors, target, state)
+                        led_colors = self.smooth_colors(state['prev_led_colors'], led_colors, state, timestamp)
+                        state['prev_led_colors'] = led_colors
+                        frames.append(led_colors)
+
+                    self.frame_times.append(time.perf_counter())
+                    if interpolate:
+                        self.publish_frames(frames, timestamp)
+                    else:
+                        self.send_frames(frames)
+                        if self.recorder:
+                            self.recorder.append(frames)
+
+                    frame_count += 1
+                    now = time.time()
+                    if now - last_fps_print >= 3.0:
+                        self.print_stats(frame_count, now - start_time)
+                        last_fps_print = now
+
+                except Exception as e:
+                    time.sleep(0.1)
+
+        except Exception as e:
+            pass
+        finally:
+            self.running = False
+            if self.output_thread:
+                self.output_thread.join(timeout=1)
+                self.output_thread = None
+            self.stop_workers()
+            self.stop_recording()
+            self.close_targets()
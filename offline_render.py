@@ -0,0 +1,108 @@
+import argparse
+import json
+import time
+import numpy as np
+import cv2
+from ambilight_engine import AmbilightEngine, make_config_snapshot
+from led_recording import LEDRecorder, LEDRecording
+
+
+def render_video(config, video_path, output_path, max_frames=None):
+    """Run every video frame through the LED pipeline and record the result"""
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open video {video_path}")
+
+    video_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    engine = AmbilightEngine(make_config_snapshot(config), (0, 0, width, height))
+    engine.open_targets(send=False)
+    recorder = LEDRecorder(output_path, [target['num_leds'] for target in engine.config_snapshot['targets']])
+
+    frame_count = 0
+    process_time = 0.0
+    start = time.perf_counter()
+    try:
+        while max_frames is None or frame_count < max_frames:
+            ok, img = capture.read()
+            if not ok:
+                break
+
+            # Decoded frames are BGR, the same channel order the sampler reads from mss
+            process_start = time.perf_counter()
+            frames = engine.process_frame(img, timestamp=frame_count / video_fps)
+            process_time += time.perf_counter() - process_start
+
+            # Timestamps come from the video clock so the output is deterministic
+            recorder.append(frames, timestamp=frame_count / video_fps, block=True)
+            frame_count += 1
+    finally:
+        capture.release()
+        recorder.close()
+        engine.close_targets()
+
+    total_time = time.perf_counter() - start
+    return {
+        'frames': frame_count,
+        'resolution': (width, height),
+        'process_fps': frame_count / process_time if process_time else 0.0,
+        'total_fps': frame_count / total_time if total_time else 0.0,
+        'process_ms': process_time / max(1, frame_count) * 1000,
+    }
+
+
+def compare_recordings(path_a, path_b):
+    """Compare the LED colors of two recordings, ignoring timestamps"""
+    a = LEDRecording(path_a)
+    b = LEDRecording(path_b)
+    try:
+        if a.led_counts != b.led_counts or a.frame_count != b.frame_count:
+            return {'match': False, 'reason': f"layout differs: {a.led_counts} x {a.frame_count} "
+                                              f"vs {b.led_counts} x {b.frame_count}"}
+        diff = np.abs(a.records['colors'].astype(np.int16) - b.records['colors'].astype(np.int16))
+        max_diff = int(diff.max()) if diff.size else 0
+        return {
+            'match': max_diff == 0,
+            'max_diff': max_diff,
+            'differing_frames': int(np.count_nonzero(diff.max(axis=1))) if diff.size else 0,
+        }
+    finally:
+        a.close()
+        b.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a video file to an LED stream without a display")
+    parser.add_argument("config", help="configuration JSON saved from the GUI")
+    parser.add_argument("video")
+    parser.add_argument("-o", "--output", default="render.ledrec")
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--compare", metavar="GOLDEN", help="recording to diff the output against")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    result = render_video(config, args.video, args.output, args.max_frames)
+    width, height = result['resolution']
+    print(f"{result['frames']} frames at {width}x{height}")
+    print(f"Processing: {result['process_fps']:.1f} frames/s ({result['process_ms']:.2f} ms/frame)")
+    print(f"Including decode and write: {result['total_fps']:.1f} frames/s")
+
+    if args.compare:
+        comparison = compare_recordings(args.output, args.compare)
+        if 'reason' in comparison:
+            print(f"Output differs from {args.compare}: {comparison['reason']}")
+        elif comparison['match']:
+            print(f"Output matches {args.compare}")
+        else:
+            print(f"Output differs from {args.compare}: max difference {comparison['max_diff']} "
+                  f"in {comparison['differing_frames']} frames")
+        if not comparison['match']:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
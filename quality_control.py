@@ -0,0 +1,101 @@
+from collections import deque
+
+# Quality levels, from full quality down. Each one overrides how the engine samples and paces frames:
+#   sample_stride   sample every n-th pixel along and across the edge strips (prefilter downscale)
+#   depth_scale     fraction of the configured sampling depth
+#   edge_capture    grab only the border strips instead of the full frame
+#   rate_scale      fraction of the configured capture and output rates
+QUALITY_LEVELS = [
+    {},
+    {'sample_stride': 2},
+    {'sample_stride': 2, 'depth_scale': 0.5},
+    {'sample_stride': 4, 'depth_scale': 0.5, 'edge_capture': True},
+    {'sample_stride': 4, 'depth_scale': 0.5, 'edge_capture': True, 'rate_scale': 0.5},
+]
+
+# Load is the busy time per frame as a fraction of the frame budget, averaged over a window.
+# Step down when it stays above DEGRADE_LOAD; step up once the next level up is expected to stay
+# below UPGRADE_LOAD for UPGRADE_HOLD seconds. Falling back down soon after stepping up doubles
+# the hold time, so a box on the edge does not flip back and forth.
+QOS_WINDOW = 30
+DEGRADE_LOAD = 0.9
+UPGRADE_LOAD = 0.5
+UPGRADE_HOLD = 5.0
+MAX_UPGRADE_HOLD = 80.0
+QOS_LOG_SIZE = 100
+
+
+class QualityController:
+    """Pick a quality level that holds the target frame rate from measured per-frame busy times"""
+
+    def __init__(self, levels=QUALITY_LEVELS):
+        self.levels = levels
+        self.level = 0
+        self.loads = deque(maxlen=QOS_WINDOW)
+        self.headroom_since = None
+        self.upgrade_hold = UPGRADE_HOLD
+        self.last_upgrade = None
+        self.downgrades = 0
+        self.upgrades = 0
+        self.level_seconds = [0.0] * len(levels)
+        self.level_since = None
+        self.log = deque(maxlen=QOS_LOG_SIZE)
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def record(self, busy_time, frame_budget, now):
+        """Add one frame's busy time; returns the new level's settings when the level changes, else None"""
+        if self.level_since is None:
+            self.level_since = now
+        self.loads.append(busy_time / frame_budget)
+        if len(self.loads) < QOS_WINDOW:
+            return None
+        load = sum(self.loads) / len(self.loads)
+
+        if load > DEGRADE_LOAD and self.level < len(self.levels) - 1:
+            if self.last_upgrade is not None and now - self.last_upgrade < self.upgrade_hold:
+                self.upgrade_hold = min(self.upgrade_hold * 2, MAX_UPGRADE_HOLD)
+            self.downgrades += 1
+            return self.change(self.level + 1, load, now)
+
+        # A lower rate scale stretches the frame budget; the level above has the shorter one
+        expected = load
+        if self.level > 0:
+            expected *= self.settings.get('rate_scale', 1.0) / self.levels[self.level - 1].get('rate_scale', 1.0)
+        if self.level > 0 and expected < UPGRADE_LOAD:
+            if self.headroom_since is None:
+                self.headroom_since = now
+            elif now - self.headroom_since >= self.upgrade_hold:
+                self.last_upgrade = now
+                self.upgrades += 1
+                return self.change(self.level - 1, load, now)
+        else:
+            self.headroom_since = None
+        return None
+
+    def change(self, level, load, now):
+        """Switch to level, log the change and return the level's settings"""
+        old_level = self.level
+        self.level_seconds[old_level] += now - self.level_since
+        self.level_since = now
+        self.level = level
+        self.loads.clear()
+        self.headroom_since = None
+        self.log.append((now, old_level, level, load))
+        return self.settings
+
+    def get_stats(self, now):
+        """Current level, how often and how long quality was reduced, and the log of level changes"""
+        level_seconds = list(self.level_seconds)
+        if self.level_since is not None:
+            level_seconds[self.level] += now - self.level_since
+        return {
+            'quality_level': self.level,
+            'quality_downgrades': self.downgrades,
+            'quality_upgrades': self.upgrades,
+            'degraded_seconds': sum(level_seconds[1:]),
+            # Every change, oldest first: (time, old level, new level, load that triggered it)
+            'quality_log': list(self.log),
+        }
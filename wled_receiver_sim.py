@@ -0,0 +1,330 @@
+import argparse
+import socket
+import threading
+import time
+import numpy as np
+
+# WLED realtime UDP protocol bytes (first byte of the datagram)
+PROTOCOL_DRGB = 2
+PROTOCOL_DNRGB = 4
+DDP_VERSION_MASK = 0xC0
+DDP_VERSION_1 = 0x40
+DDP_PUSH = 0x01
+DDP_HEADER_SIZE = 10
+
+# DDP carries no timeout byte; WLED applies its default realtime timeout
+WLED_DEFAULT_TIMEOUT = 2.5
+
+# Frame IDs are encoded 4 bits per channel so sampling round-off cannot corrupt them
+FRAME_ID_BITS = 12
+FRAME_ID_MODULO = 1 << FRAME_ID_BITS
+
+
+def encode_frame_id(frame_id):
+    """Color (B, G, R) that carries frame_id through the sampling pipeline"""
+    frame_id %= FRAME_ID_MODULO
+    return tuple(((frame_id >> shift) & 0x0F) * 16 + 8 for shift in (0, 4, 8))
+
+
+def decode_frame_id(rgb):
+    """Recover the frame ID from a received (R, G, B) LED color"""
+    r, g, b = (int(c) for c in rgb)
+    return (b // 16) | ((g // 16) << 4) | ((r // 16) << 8)
+
+
+class SyntheticFrameSource:
+    """Capture stand-in producing flat frames stamped with a frame ID"""
+
+    def __init__(self, width=640, height=360):
+        self.width = width
+        self.height = height
+        self.frame_id = 0
+        self.capture_times = {}
+        self.img = np.zeros((height, width, 4), dtype=np.uint8)
+
+    def grab(self):
+        """Return the next frame and remember when it was captured"""
+        self.frame_id = (self.frame_id + 1) % FRAME_ID_MODULO
+        self.img[..., :3] = encode_frame_id(self.frame_id)
+        self.capture_times[self.frame_id] = time.perf_counter()
+        return self.img
+
+
+class WLEDReceiverSimulator:
+    """Local stand-in for a WLED controller's realtime UDP receiver"""
+
+    def __init__(self, host="127.0.0.1", port=21324, num_leds=0, frame_id_led=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+
+        self.leds = np.zeros((num_leds, 3), dtype=np.uint8)
+        self.num_leds_expected = num_leds or None
+        self.frame_id_led = frame_id_led
+        self.capture_times = None
+
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+        # Realtime mode state: WLED drops back to its own effects after the timeout byte expires
+        self.realtime_active = False
+        self.realtime_deadline = None
+
+    def reset_stats(self):
+        """Clear all counters"""
+        with self.lock:
+            self.packets = 0
+            self.bytes = 0
+            self.frame_times = []
+            self.latencies = []
+            self.lost_packets = 0
+            self.lost_frames = 0
+            self.timeouts = 0
+            self.protocols = {}
+            self.last_ddp_sequence = None
+            self.last_frame_id = None
+
+    def start(self):
+        """Listen in a background thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.receive_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop listening and close the socket"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+        self.sock.close()
+
+    def receive_loop(self):
+        """Receive and decode datagrams until stopped"""
+        self.sock.settimeout(0.05)
+        while self.running:
+            try:
+                packet = self.sock.recv(65535)
+            except socket.timeout:
+                with self.lock:
+                    self.check_timeout(time.perf_counter())
+                continue
+            except OSError:
+                break
+            now = time.perf_counter()
+            with self.lock:
+                self.check_timeout(now)
+                self.handle_packet(packet, now)
+
+    def check_timeout(self, now):
+        """Leave realtime mode once the sender's timeout has expired"""
+        if self.realtime_active and self.realtime_deadline is not None and now > self.realtime_deadline:
+            self.realtime_active = False
+            self.timeouts += 1
+            self.leds[:] = 0
+
+    def ensure_leds(self, count):
+        """Grow the LED buffer to hold at least count LEDs"""
+        if count > len(self.leds):
+            leds = np.zeros((count, 3), dtype=np.uint8)
+            leds[:len(self.leds)] = self.leds
+            self.leds = leds
+
+    def enter_realtime(self, timeout, now):
+        """Apply the realtime timeout byte (255 means never time out)"""
+        self.realtime_active = True
+        self.realtime_deadline = None if timeout == 255 else now + timeout
+
+    def handle_packet(self, packet, now):
+        """Decode one datagram into the LED buffer"""
+        if len(packet) < 2:
+            return
+        self.packets += 1
+        self.bytes += len(packet)
+
+        if packet[0] & DDP_VERSION_MASK == DDP_VERSION_1 and len(packet) >= DDP_HEADER_SIZE:
+            self.count_protocol("ddp")
+            sequence = packet[1] & 0x0F
+            if sequence and self.last_ddp_sequence is not None:
+                self.lost_packets += (sequence - self.last_ddp_sequence - 1) % 15
+            if sequence:
+                self.last_ddp_sequence = sequence
+            offset = int.from_bytes(packet[4:8], 'big') // 3
+            length = int.from_bytes(packet[8:10], 'big')
+            self.write_leds(offset, packet[DDP_HEADER_SIZE:DDP_HEADER_SIZE + length])
+            self.enter_realtime(WLED_DEFAULT_TIMEOUT, now)
+            if packet[0] & DDP_PUSH:
+                self.complete_frame(now)
+
+        elif packet[0] == PROTOCOL_DRGB:
+            self.count_protocol("drgb")
+            self.enter_realtime(packet[1], now)
+            self.write_leds(0, packet[2:])
+            self.complete_frame(now)
+
+        elif packet[0] == PROTOCOL_DNRGB and len(packet) >= 4:
+            self.count_protocol("dnrgb")
+            self.enter_realtime(packet[1], now)
+            start = (packet[2] << 8) | packet[3]
+            data = packet[4:]
+            self.write_leds(start, data)
+            # DNRGB has no frame marker; the chunk that reaches the end of the strip completes a frame
+            if self.num_leds_expected is None or start + len(data) // 3 >= self.num_leds_expected:
+                self.complete_frame(now)
+
+        else:
+            self.count_protocol("unknown")
+
+    def count_protocol(self, name):
+        """Count packets per protocol"""
+        self.protocols[name] = self.protocols.get(name, 0) + 1
+
+    def write_leds(self, start, data):
+        """Copy RGB bytes into the LED buffer starting at LED start"""
+        count = len(data) // 3
+        self.ensure_leds(start + count)
+        self.leds[start:start + count] = np.frombuffer(data[:count * 3], dtype=np.uint8).reshape(count, 3)
+
+    def complete_frame(self, now):
+        """Record arrival of a full frame and, if stamped, its end-to-end latency"""
+        self.frame_times.append(now)
+        if self.frame_id_led is None or self.frame_id_led >= len(self.leds):
+            return
+
+        frame_id = decode_frame_id(self.leds[self.frame_id_led])
+        if self.last_frame_id is not None:
+            gap = (frame_id - self.last_frame_id) % FRAME_ID_MODULO
+            if gap > 1:
+                self.lost_frames += gap - 1
+        self.last_frame_id = frame_id
+
+        if self.capture_times is not None:
+            captured = self.capture_times.get(frame_id)
+            if captured is not None:
+                self.latencies.append(now - captured)
+
+    def get_stats(self):
+        """Packet, loss, interval, jitter and latency statistics"""
+        with self.lock:
+            intervals = np.diff(self.frame_times) * 1000 if len(self.frame_times) > 1 else np.zeros(0)
+            latencies = np.array(self.latencies) * 1000
+            stats = {
+                'packets': self.packets,
+                'bytes': self.bytes,
+                'frames': len(self.frame_times),
+                'protocols': dict(self.protocols),
+                'lost_packets': self.lost_packets,
+                'lost_frames': self.lost_frames,
+                'timeouts': self.timeouts,
+                'realtime_active': self.realtime_active,
+            }
+
+        if len(intervals):
+            stats['interval_ms'] = summarize(intervals)
+            # Jitter as the mean absolute change between consecutive intervals (RFC 3550 style)
+            stats['jitter_ms'] = float(np.mean(np.abs(np.diff(intervals)))) if len(intervals) > 1 else 0.0
+        if len(latencies):
+            stats['latency_ms'] = summarize(latencies)
+        return stats
+
+
+def summarize(values):
+    """Mean, standard deviation and percentiles of an array"""
+    return {
+        'mean': float(np.mean(values)),
+        'std': float(np.std(values)),
+        'min': float(np.min(values)),
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(np.max(values)),
+    }
+
+
+def format_stats(stats):
+    """Human readable multi-line report"""
+    lines = [
+        f"Packets: {stats['packets']} ({stats['bytes']} bytes), frames: {stats['frames']}, "
+        f"protocols: {stats['protocols']}",
+        f"Lost packets: {stats['lost_packets']}, lost frames: {stats['lost_frames']}, "
+        f"realtime timeouts: {stats['timeouts']}",
+    ]
+    for key, label in (('interval_ms', 'Frame interval'), ('latency_ms', 'Capture-to-wire latency')):
+        if key in stats:
+            s = stats[key]
+            lines.append(f"{label} (ms): mean {s['mean']:.2f} std {s['std']:.2f} p50 {s['p50']:.2f} "
+                         f"p95 {s['p95']:.2f} p99 {s['p99']:.2f} max {s['max']:.2f}")
+    if 'jitter_ms' in stats:
+        lines.append(f"Jitter (ms): {stats['jitter_ms']:.3f}")
+    return "\n".join(lines)
+
+
+def measure_latency(duration=5.0, num_leds=240, protocol="drgb", num_targets=1):
+    """Run the real engine against the simulator with a frame-stamping capture source"""
+    from ambilight_engine import AmbilightEngine, make_config_snapshot
+
+    receivers = [WLEDReceiverSimulator(port=0, num_leds=num_leds, frame_id_led=0) for _ in range(num_targets)]
+    source = SyntheticFrameSource()
+
+    per_edge = num_leds // 4
+    segments = [(edge, per_edge, edge, "normal") for edge in ("top", "right", "bottom", "left")]
+    targets = [{
+        'wled_ip': receiver.address[0], 'wled_port': receiver.address[1], 'protocol': protocol,
+        'num_leds': num_leds, 'led_start_offset': 0, 'led_segments': segments,
+    } for receiver in receivers]
+    config = dict(targets[0], wled_protocol=protocol, targets=targets[1:],
+                  brightness_percent=100, color_intensity_percent=100, smoothness_percent=0)
+
+    engine = AmbilightEngine(make_config_snapshot(config), (0, 0, source.width, source.height))
+    engine.frame_source = source
+    for receiver in receivers:
+        receiver.capture_times = source.capture_times
+        receiver.num_leds_expected = num_leds
+        receiver.start()
+
+    engine.start()
+    time.sleep(duration)
+    engine.stop()
+    time.sleep(0.1)
+
+    results = []
+    for receiver in receivers:
+        receiver.stop()
+        results.append(receiver.get_stats())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated WLED realtime receiver")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=21324)
+    parser.add_argument("--latency-test", action="store_true",
+                        help="drive the engine with a synthetic capture source and report end-to-end latency")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--leds", type=int, default=240)
+    parser.add_argument("--protocol", default="drgb")
+    parser.add_argument("--targets", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.latency_test:
+        for i, stats in enumerate(measure_latency(args.duration, args.leds, args.protocol, args.targets)):
+            print(f"== Target {i + 1} ==")
+            print(format_stats(stats))
+        return
+
+    receiver = WLEDReceiverSimulator(args.host, args.port)
+    receiver.start()
+    print(f"Listening on {receiver.address[0]}:{receiver.address[1]} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(format_stats(receiver.get_stats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.stop()
+
+
+if __name__ == "__main__":
+    main()
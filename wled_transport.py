@@ -0,0 +1,136 @@
+import ctypes
+import ctypes.util
+import os
+import socket
+import struct
+import sys
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_sendmmsg():
+    """Return libc's sendmmsg, or None where it is not available"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+_sendmmsg = _load_sendmmsg()
+SENDMMSG_AVAILABLE = _sendmmsg is not None
+
+
+class BatchedUDPSender:
+    """Send a frame's worth of UDP datagrams, one sendto each or (use_sendmmsg) batched into sendmmsg calls"""
+
+    def __init__(self, use_sendmmsg=False):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sendmmsg = _sendmmsg if use_sendmmsg else None
+        self.syscalls = 0
+        self.sockaddrs = {}
+
+        # Cached sendmmsg message layout, see build_layout()
+        self.layout = None
+        self.slab = None
+        self.slab_view = None
+        self.iovecs = None
+        self.messages = None
+
+    def get_sockaddr(self, address):
+        """Pack (host, port) into a sockaddr_in, resolving the host once"""
+        sockaddr = self.sockaddrs.get(address)
+        if sockaddr is None:
+            host, port = address
+            ip = socket.inet_aton(socket.gethostbyname(host))
+            raw = struct.pack("=H", socket.AF_INET) + struct.pack("!H", port) + ip + bytes(8)
+            sockaddr = ctypes.create_string_buffer(raw, len(raw))
+            self.sockaddrs[address] = sockaddr
+        return sockaddr
+
+    def build_layout(self, layout):
+        """Preallocate one payload slab and the mmsghdr array for a frame layout"""
+        count = len(layout)
+        self.slab = ctypes.create_string_buffer(max(1, sum(length for length, _ in layout)))
+        self.slab_view = memoryview(self.slab).cast("B")
+        self.iovecs = (_IOVec * count)()
+        self.messages = (_MMsgHdr * count)()
+
+        base = ctypes.addressof(self.slab)
+        offset = 0
+        for i, (length, address) in enumerate(layout):
+            self.iovecs[i].iov_base = base + offset
+            self.iovecs[i].iov_len = length
+            offset += length
+
+            sockaddr = self.get_sockaddr(address)
+            hdr = self.messages[i].msg_hdr
+            hdr.msg_name = ctypes.cast(sockaddr, ctypes.c_void_p)
+            hdr.msg_namelen = len(sockaddr)
+            hdr.msg_iov = ctypes.pointer(self.iovecs[i])
+            hdr.msg_iovlen = 1
+
+        self.layout = layout
+
+    def send(self, datagrams):
+        """Send a list of (packet, (host, port)) pairs"""
+        if not datagrams:
+            return
+
+        if self.sendmmsg is None or len(datagrams) == 1:
+            for packet, address in datagrams:
+                self.sock.sendto(packet, address)
+            self.syscalls += len(datagrams)
+            return
+
+        # Frames usually keep the same packet sizes and destinations, so the
+        # message headers are built once and only the payload is copied in
+        layout = tuple((len(packet), address) for packet, address in datagrams)
+        if layout != self.layout:
+            self.build_layout(layout)
+
+        slab = self.slab_view
+        offset = 0
+        for packet, _ in datagrams:
+            slab[offset:offset + len(packet)] = packet
+            offset += len(packet)
+
+        # The kernel may accept fewer messages than requested; resume from there
+        count = len(datagrams)
+        sent = 0
+        fd = self.sock.fileno()
+        base = ctypes.addressof(self.messages)
+        while sent < count:
+            result = self.sendmmsg(fd, base + sent * ctypes.sizeof(_MMsgHdr), count - sent, 0)
+            self.syscalls += 1
+            if result < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            sent += result
+
+    def close(self):
+        """Close the underlying socket"""
+        self.sock.close()